@@ -0,0 +1,201 @@
+# Batch Grading - whole files graded page by page outside a single upload
+#
+# Shared by the batch / resumable upload endpoints, the watch-folder
+# service and the command-line grader, so a sheet is graded the same way
+# whichever door it came in by: every page of a PDF, TIFF, JPG or PNG
+# goes through pdf_pipeline and LJKProcessor.process_ljk (template
+# routing, quality gate, per-template thresholds) and is stored as a
+# result exactly like an uploaded sheet. Each page yields one line - the
+# process-ljk response plus "page", or {"page", "success": false,
+# "reason", "message"} for a rejected / failed page.
+
+import logging
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple
+
+import cv2
+
+import grading_cache
+import metrics
+import pdf_pipeline
+import tiff_pages
+from image_store import ImageStore, file_sha256
+from ljk_processor import LJKProcessor
+from pdf_utils import get_pdf_page_count, is_pdf_file
+from quality import SheetRejected
+from exam_cache import CompiledExam, ExamCache
+from storage import StorageService
+from templates import Template, TemplateRegistry
+
+logger = logging.getLogger("ljk.batch")
+
+GRADED = "graded"
+REJECTED = "rejected"
+FAILED = "failed"
+
+
+class ExamNotFound(LookupError):
+    pass
+
+
+class TemplateUnavailable(LookupError):
+    pass
+
+
+def result_response(result: Dict, **flags) -> Dict:
+    """process-ljk response body for a stored result"""
+    return {
+        "success": True,
+        "result_id": result['result_id'],
+        "score": result['score'],
+        "details": result['details'],
+        "marked_image_url": result['processed_image_path'],
+        **flags
+    }
+
+
+def outcome(line: Dict) -> str:
+    """GRADED / REJECTED / FAILED for a page line"""
+    if line["success"]:
+        return GRADED
+    return FAILED if line["reason"] == "error" else REJECTED
+
+
+def page_count(path: Path) -> int:
+    """Pages of a PDF or TIFF (1 for an image); raises if it cannot be opened"""
+    if tiff_pages.is_tiff_file(path):
+        return tiff_pages.page_count(path)
+    if is_pdf_file(str(path)):
+        return get_pdf_page_count(str(path))
+    return 1
+
+
+class BatchGrader:
+    """Grade files page by page and store their results"""
+
+    def __init__(
+        self,
+        storage: Optional[StorageService] = None,
+        templates: Optional[TemplateRegistry] = None,
+        processor: Optional[LJKProcessor] = None,
+        images: Optional[ImageStore] = None,
+        exams: Optional[ExamCache] = None
+    ):
+        self.storage = storage or StorageService()
+        self.templates = templates or TemplateRegistry()
+        self.processor = processor or LJKProcessor(self.templates)
+        self.images = images or ImageStore()
+        self.exams = exams or ExamCache(self.storage)
+
+    def exam_and_template(self, exam_id: str) -> Tuple[CompiledExam, Template]:
+        """The exam (cached, key compiled) and its template"""
+        compiled = self.exams.get(exam_id)
+        if compiled is None:
+            raise ExamNotFound(f"Exam not found: {exam_id}")
+        template = self.templates.find(compiled.exam.get('template_id'))
+        if template is None:
+            raise TemplateUnavailable(f"Template not available: {compiled.exam.get('template_id')}")
+        return compiled, template
+
+    def put_image(self, image) -> str:
+        """Encode an image as JPG into the image store"""
+        ok, encoded = cv2.imencode('.jpg', image)
+        if not ok:
+            raise Exception("Failed to encode image")
+        return self.images.put_bytes(encoded.tobytes(), '.jpg')
+
+    def result_record(self, exam_id: str, result: Dict, image_blob: str, processed_blob: str, **fields) -> Dict:
+        """Stored result of a graded sheet; fields: student / source details"""
+        return {
+            'exam_id': exam_id,
+            'student_name': None,
+            'student_number': None,
+            'answers': result['answers'],
+            'unanswered': result['unanswered'],
+            'score': result['score'],
+            'details': result['details'],
+            'filled_threshold': result['filled_threshold'],
+            'confidence': result['confidence'],
+            'template_id': result['template_id'],
+            'template_version': result['template_version'],
+            'template_match': result['template_match'],
+            'quality': result['quality'],
+            'pipeline_version': grading_cache.PIPELINE_VERSION,
+            **fields,
+            'image_blob': image_blob,
+            'processed_blob': processed_blob,
+            'image_path': self.images.url(image_blob),
+            'processed_image_path': self.images.url(processed_blob)
+        }
+
+    def grade_file(
+        self,
+        exam_id: str,
+        compiled: CompiledExam,
+        template: Template,
+        path: Path,
+        sha256: Optional[str] = None,
+        store: bool = True,
+        workers: Optional[int] = None,
+        **fields
+    ) -> Iterator[Dict]:
+        """
+        Grade every page of a PDF / TIFF / image file, yielding one line
+        per page in page order. The file is left in place.
+
+        store=False grades without writing results or images (the line
+        then has no result_id / marked image URL).
+        fields are added to every stored result (e.g. source_file).
+        Raises if the file itself cannot be opened or rendered.
+        """
+        path = Path(path)
+        sha256 = sha256 or file_sha256(path)
+        exam = compiled.exam
+        single_image = not (is_pdf_file(str(path)) or tiff_pages.is_tiff_file(path))
+
+        def grade(page_num, raster):
+            return self.processor.process_ljk(
+                str(path),
+                compiled.key_vec,
+                exam['active_questions'],
+                filled_threshold=exam.get('filled_threshold'),
+                scoring=exam.get('scoring'),
+                template=template,
+                image=raster
+            )
+
+        def page_line(page: pdf_pipeline.PageResult) -> Dict:
+            number = page.page + 1
+            if page.error is None:
+                result = page.result
+                metrics.SHEETS_GRADED.inc(outcome='success')
+                if not store:
+                    return {"page": number, "success": True, "score": result['score'],
+                            "details": result['details'], "template_id": result['template_id']}
+                if single_image:
+                    # The scan itself, not a re-encoded copy
+                    image_blob = self.images.put_bytes(path.read_bytes(), path.suffix)
+                else:
+                    image_blob = self.put_image(page.image)
+                result_data = self.result_record(
+                    exam_id, result, image_blob, self.put_image(result['marked_image']),
+                    image_sha256=sha256,
+                    source_page=number,
+                    key_version=compiled.key_version,
+                    **fields
+                )
+                self.storage.save_result(result_data, intensities=result['intensities'])
+                return {"page": number, **result_response(result_data)}
+            if isinstance(page.error, SheetRejected):
+                metrics.SHEETS_GRADED.inc(outcome='rejected')
+                metrics.SHEETS_REJECTED.inc(reason=page.error.reason)
+                logger.warning("Page %d rejected for exam %s: %s", number, exam_id, page.error,
+                               extra={'reason': page.error.reason})
+                return {"page": number, "success": False, "reason": page.error.reason,
+                        "message": str(page.error), **page.error.details}
+            metrics.SHEETS_GRADED.inc(outcome='error')
+            logger.error("Grading failed for page %d of exam %s: %s", number, exam_id, page.error)
+            return {"page": number, "success": False, "reason": "error", "message": str(page.error)}
+
+        for page in pdf_pipeline.grade_pages(path, grade, sha256=sha256, workers=workers):
+            yield page_line(page)
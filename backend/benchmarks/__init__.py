@@ -0,0 +1,2 @@
+# Offline benchmark, load-test and regression tools for the grading pipeline.
+# Run from the backend directory, e.g. `python -m benchmarks.bench_pipeline`.
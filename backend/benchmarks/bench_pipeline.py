@@ -0,0 +1,263 @@
+"""
+Stage-level microbenchmarks for the grading pipeline
+
+Times each stage in isolation on fixed fixture sheets (inputs of a stage
+are prepared once from the previous stage), writes pytest-benchmark style
+JSON and compares against a stored baseline.
+
+Usage (from backend/):
+    python -m benchmarks.bench_pipeline                      # run + print
+    python -m benchmarks.bench_pipeline --save-baseline      # store baseline.json
+    python -m benchmarks.bench_pipeline --compare --tolerance 0.25
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List
+
+import cv2
+import imutils
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import config
+from core.ljk_manual_roi import (
+    threshold_answer_region,
+    filter_bubble_contours,
+    organize_bubbles_into_columns
+)
+from grading import sample_intensities, decide_answers, to_uint8
+from ljk_processor import LJKProcessor
+from render_cache import render_page
+from scoring import compile_answer_key, score_sheet
+from storage import StorageService
+
+BENCH_DIR = Path(__file__).resolve().parent
+BASELINE_PATH = BENCH_DIR / "baseline.json"
+
+FIXTURES_DIR = BENCH_DIR / "fixtures"  # Outside data/: image GC must never touch them
+FIXTURE_IMAGES = [
+    FIXTURES_DIR / "ljk_smp1darangdan_test1.jpg",
+    FIXTURES_DIR / "ljk_smp1darangdan_test2.jpg",
+]
+FIXTURE_PDF = config.ROOT_DIR / "file pdf" / "ljk_smp1darangdan.pdf"
+ACTIVE_QUESTIONS = 60
+
+
+def _stats(times: List[float]) -> Dict:
+    return {
+        'min': min(times),
+        'max': max(times),
+        'mean': statistics.fmean(times),
+        'median': statistics.median(times),
+        'stddev': statistics.stdev(times) if len(times) > 1 else 0.0,
+        'rounds': len(times),
+        'ops': 1.0 / statistics.fmean(times) if statistics.fmean(times) > 0 else 0.0,
+    }
+
+
+def run_benchmark(fn: Callable, rounds: int, warmup: int) -> Dict:
+    """Call fn warmup + rounds times, return timing stats of the measured rounds"""
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return _stats(times)
+
+
+def prepare_sheet(image_path: Path, processor: LJKProcessor) -> Dict:
+    """Run the pipeline once and keep every intermediate as stage input"""
+    roi = processor.roi_config
+    x1, y1, x2, y2 = roi['x1'], roi['y1'], roi['x2'], roi['y2']
+
+    ctx = {'path': str(image_path)}
+    ctx['encoded'] = np.fromfile(str(image_path), dtype=np.uint8)
+    ctx['image'] = cv2.imread(str(image_path))
+    ctx['gray'] = cv2.cvtColor(ctx['image'], cv2.COLOR_BGR2GRAY)
+    ctx['region'] = ctx['gray'][y1:y2, x1:x2]
+    ctx['thresh'] = threshold_answer_region(ctx['region'])
+    cnts = cv2.findContours(ctx['thresh'], cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    ctx['bubbles'] = filter_bubble_contours(imutils.grab_contours(cnts), x1, y1)
+    ctx['column_rows'] = organize_bubbles_into_columns(ctx['bubbles'])
+    ctx['rows'] = processor.collect_rows(ctx['column_rows'])
+    ctx['intensities'] = sample_intensities(ctx['gray'], ctx['rows'])
+
+    key_vec = np.random.default_rng(0).integers(0, 5, ACTIVE_QUESTIONS).astype(np.int8)
+    ctx['answer_key'] = {q: int(k) for q, k in enumerate(key_vec)}
+    ctx['key_vec'] = compile_answer_key(ctx['answer_key'], ACTIVE_QUESTIONS)
+
+    decided = decide_answers(ctx['intensities'], config.FILLED_THRESHOLD)
+    n_read = min(len(ctx['rows']), ACTIVE_QUESTIONS)
+    ctx['answer_vector'] = np.full(ACTIVE_QUESTIONS, -1, dtype=np.int8)
+    ctx['answer_vector'][:n_read] = decided[:n_read]
+    ctx['read_mask'] = np.arange(ACTIVE_QUESTIONS) < n_read
+    ctx['fields'] = score_sheet(ctx['answer_vector'], ctx['read_mask'], ctx['key_vec'])
+
+    ctx['marked'] = processor.mark_image(
+        ctx['image'], ctx['column_rows'], ctx['fields']['answers'],
+        ctx['fields']['unanswered'], ctx['key_vec'], ACTIVE_QUESTIONS, ctx['gray']
+    )
+    return ctx
+
+
+def sheet_stages(ctx: Dict, processor: LJKProcessor, storage: StorageService) -> Dict[str, Callable]:
+    """Stage name -> zero-argument callable for one prepared sheet"""
+    roi = processor.roi_config
+    x1, y1 = roi['x1'], roi['y1']
+
+    def contours():
+        cnts = cv2.findContours(ctx['thresh'], cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        return filter_bubble_contours(imutils.grab_contours(cnts), x1, y1)
+
+    def scoring():
+        decided = decide_answers(ctx['intensities'], config.FILLED_THRESHOLD)
+        return score_sheet(ctx['answer_vector'], ctx['read_mask'], ctx['key_vec']), decided
+
+    def persist():
+        result_data = {
+            'exam_id': 'exam_bench',
+            'answers': ctx['fields']['answers'],
+            'unanswered': ctx['fields']['unanswered'],
+            'score': ctx['fields']['score'],
+            'details': ctx['fields']['details'],
+        }
+        return storage.save_result(result_data, intensities=to_uint8(ctx['intensities']))
+
+    return {
+        'decode': lambda: cv2.imdecode(ctx['encoded'], cv2.IMREAD_COLOR),
+        'blur_threshold': lambda: threshold_answer_region(ctx['region']),
+        'contours': contours,
+        'organize': lambda: organize_bubbles_into_columns(ctx['bubbles']),
+        'sample': lambda: sample_intensities(ctx['gray'], ctx['rows']),
+        'scoring': scoring,
+        'mark_image': lambda: processor.mark_image(
+            ctx['image'], ctx['column_rows'], ctx['fields']['answers'],
+            ctx['fields']['unanswered'], ctx['key_vec'], ACTIVE_QUESTIONS, ctx['gray']
+        ),
+        'jpeg_encode': lambda: cv2.imencode('.jpg', ctx['marked']),
+        'persist': persist,
+    }
+
+
+def run_suite(rounds: int, warmup: int, images: List[Path], pdf: Path) -> Dict:
+    """Run every stage on every fixture; returns pytest-benchmark style report"""
+    benchmarks = []
+
+    with contextlib.redirect_stdout(io.StringIO()), tempfile.TemporaryDirectory() as tmp:
+        processor = LJKProcessor()
+        if not processor.roi_config:
+            raise RuntimeError("ROI configuration not found")
+
+        storage = StorageService()
+        storage.results_dir = Path(tmp)
+
+        for image_path in images:
+            ctx = prepare_sheet(image_path, processor)
+            for stage, fn in sheet_stages(ctx, processor, storage).items():
+                benchmarks.append({
+                    'name': f"{stage}[{image_path.name}]",
+                    'group': stage,
+                    'stats': run_benchmark(fn, rounds, warmup),
+                })
+
+        if pdf.exists():
+            benchmarks.append({
+                'name': f"pdf_render[{pdf.name}]",
+                'group': 'pdf_render',
+                # Cache off: time the rasterization every cache miss pays
+                'stats': run_benchmark(lambda: render_page(pdf, 0, dpi=200, use_cache=False), rounds, warmup),
+            })
+
+    return {
+        'machine_info': {
+            'node': platform.node(),
+            'python_version': platform.python_version(),
+            'machine': platform.machine(),
+            'cpu_count': os.cpu_count(),
+            'opencv': cv2.__version__,
+            'numpy': np.__version__,
+        },
+        'datetime': datetime.now().isoformat(),
+        'benchmarks': benchmarks,
+    }
+
+
+def compare(report: Dict, baseline: Dict, tolerance: float) -> List[Dict]:
+    """Benchmarks whose median grew more than tolerance over the baseline"""
+    base = {b['name']: b['stats'] for b in baseline.get('benchmarks', [])}
+    regressions = []
+    for bench in report['benchmarks']:
+        if bench['name'] not in base:
+            continue
+        ratio = bench['stats']['median'] / max(base[bench['name']]['median'], 1e-9)
+        bench['baseline_ratio'] = ratio
+        if ratio > 1 + tolerance:
+            regressions.append({'name': bench['name'], 'ratio': ratio})
+    return regressions
+
+
+def print_report(report: Dict):
+    print(f"{'benchmark':<60} {'median ms':>10} {'min ms':>10} {'vs base':>8}")
+    print("-" * 92)
+    for bench in report['benchmarks']:
+        stats = bench['stats']
+        ratio = bench.get('baseline_ratio')
+        ratio_str = f"{ratio:.2f}x" if ratio is not None else "-"
+        print(f"{bench['name'][:60]:<60} {stats['median']*1000:>10.3f} {stats['min']*1000:>10.3f} {ratio_str:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Grading pipeline stage benchmarks")
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--images", nargs="*", type=Path, default=FIXTURE_IMAGES)
+    parser.add_argument("--pdf", type=Path, default=FIXTURE_PDF)
+    parser.add_argument("--json", type=Path, help="Write report JSON to this file")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="Store this run as the baseline")
+    parser.add_argument("--compare", action="store_true", help="Fail if slower than the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed median slowdown (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    report = run_suite(args.rounds, args.warmup, args.images, args.pdf)
+
+    regressions = []
+    if args.compare:
+        if not args.baseline.exists():
+            print(f"⚠️  No baseline at {args.baseline}; run with --save-baseline first")
+        else:
+            with open(args.baseline, 'r') as f:
+                regressions = compare(report, json.load(f), args.tolerance)
+
+    print_report(report)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\n✓ Baseline saved to: {args.baseline}")
+
+    if regressions:
+        print(f"\n❌ {len(regressions)} stage(s) slower than baseline by more than {args.tolerance:.0%}:")
+        for r in regressions:
+            print(f"   {r['name']}: {r['ratio']:.2f}x")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,359 @@
+"""
+End-to-end load test for the API
+
+Replays a corpus of sheets against /api/process-ljk, the results and the
+export endpoints at a fixed concurrency and reports throughput, latency
+percentiles (p50/p95/p99), error rate and server RSS over time.
+
+By default the app runs in-process (httpx ASGITransport) on a throw-away
+data directory, which behaves like one uvicorn worker. With --url it hits
+a running server instead; pass --pid to sample that server's RSS.
+The corpus is replayed, so the in-process app runs with the grading cache
+off unless --cache is given (to measure re-upload hits instead).
+
+Usage (from backend/):
+    python -m benchmarks.load_test --requests 200 --concurrency 8
+    python -m benchmarks.load_test --corpus ../data/synthetic/class_a --mix process=6,results=2,result=2,export=1
+    python -m benchmarks.load_test --url http://localhost:8000 --pid 12345 --duration 60 --concurrency 16
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+import numpy as np
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+ROOT_DIR = BACKEND_DIR.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+# config is imported only after LJK_DATA_DIR is set (in-process mode)
+DEFAULT_CORPUS = [
+    BACKEND_DIR / "benchmarks" / "fixtures" / "ljk_smp1darangdan_test1.jpg",
+    BACKEND_DIR / "benchmarks" / "fixtures" / "ljk_smp1darangdan_test2.jpg",
+]
+SHEET_EXTENSIONS = {".jpg", ".jpeg", ".png", ".pdf"}
+DEFAULT_MIX = "process=6,results=2,result=2,export=1"
+ACTIVE_QUESTIONS = 60
+
+
+def load_corpus(paths: List[Path]) -> List[Path]:
+    """Sheet files from the given files / directories"""
+    files = []
+    for path in paths:
+        if path.is_dir():
+            files.extend(sorted(p for p in path.iterdir() if p.suffix.lower() in SHEET_EXTENSIONS))
+        elif path.suffix.lower() in SHEET_EXTENSIONS:
+            files.append(path)
+    return files
+
+
+def parse_mix(mix: str) -> Dict[str, int]:
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        weights[name.strip()] = int(weight or 1)
+    unknown = set(weights) - set(OPERATIONS)
+    if unknown:
+        raise ValueError(f"Unknown operations in mix: {sorted(unknown)}")
+    return weights
+
+
+def read_rss_mb(pid: Optional[int] = None) -> Optional[float]:
+    """Resident set size from /proc (Linux only)"""
+    try:
+        with open(f"/proc/{pid or 'self'}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def percentiles(latencies: List[float]) -> Dict:
+    if not latencies:
+        return {'p50': 0.0, 'p95': 0.0, 'p99': 0.0, 'max': 0.0}
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {
+        'p50': round(float(p50), 1),
+        'p95': round(float(p95), 1),
+        'p99': round(float(p99), 1),
+        'max': round(max(latencies), 1),
+    }
+
+
+class LoadTest:
+    """Shared state of one run: exam under test, known results, samples"""
+
+    def __init__(self, client: httpx.AsyncClient, corpus: List[Path], exam_id: str):
+        self.client = client
+        self.corpus = [(p.name, p.read_bytes()) for p in corpus]
+        self.exam_id = exam_id
+        self.result_ids: List[str] = []
+        self.samples: List[Dict] = []
+        self._next_sheet = 0
+
+    async def op_process(self) -> httpx.Response:
+        name, data = self.corpus[self._next_sheet % len(self.corpus)]
+        self._next_sheet += 1
+        response = await self.client.post(
+            "/api/process-ljk",
+            data={'exam_id': self.exam_id, 'student_name': f"Load {self._next_sheet}"},
+            files={'file': (name, data)},
+        )
+        if response.status_code == 200:
+            self.result_ids.append(response.json()['result_id'])
+        return response
+
+    async def op_results(self) -> httpx.Response:
+        return await self.client.get(f"/api/exams/{self.exam_id}/results")
+
+    async def op_result(self) -> httpx.Response:
+        if not self.result_ids:
+            return await self.op_process()
+        return await self.client.get(f"/api/results/{random.choice(self.result_ids)}")
+
+    async def op_export(self) -> httpx.Response:
+        return await self.client.get(f"/api/exams/{self.exam_id}/export/excel")
+
+    async def run_one(self, op: str, started: float):
+        t0 = time.perf_counter()
+        try:
+            response = await getattr(self, f"op_{op}")()
+            status = response.status_code
+        except httpx.HTTPError as e:
+            status = type(e).__name__
+        self.samples.append({
+            'op': op,
+            'status': status,
+            'latency_ms': (time.perf_counter() - t0) * 1000,
+            'at': time.perf_counter() - started,
+        })
+
+
+OPERATIONS = ('process', 'results', 'result', 'export')
+
+
+async def create_exam(client: httpx.AsyncClient, seed: int) -> str:
+    rng = random.Random(seed)
+    response = await client.post("/api/exams", json={
+        'title': "Load test",
+        'date': time.strftime("%Y-%m-%d"),
+        'subject': "Load test",
+        'class': "LT",
+        'active_questions': ACTIVE_QUESTIONS,
+        'answer_key': {str(q): rng.randrange(5) for q in range(ACTIVE_QUESTIONS)},
+    })
+    response.raise_for_status()
+    return response.json()['exam_id']
+
+
+def sample_rss(pid: Optional[int], started: float, interval: float, timeline: List, stop: threading.Event):
+    """
+    RSS sampler on its own thread - grading blocks the event loop in
+    the in-process mode, an asyncio task would miss the peaks
+    """
+    while True:
+        rss = read_rss_mb(pid)
+        if rss is not None:
+            timeline.append((round(time.perf_counter() - started, 2), round(rss, 1)))
+        if stop.wait(interval):
+            break
+
+
+async def run_load(
+    client: httpx.AsyncClient,
+    corpus: List[Path],
+    mix: Dict[str, int],
+    concurrency: int,
+    total_requests: Optional[int],
+    duration: Optional[float],
+    pid: Optional[int],
+    sample_interval: float,
+    seed: int,
+    keep: bool
+) -> Dict:
+    random.seed(seed)
+    exam_id = await create_exam(client, seed)
+    test = LoadTest(client, corpus, exam_id)
+
+    ops = list(mix)
+    weights = [mix[op] for op in ops]
+    issued = 0
+    started = time.perf_counter()
+    deadline = started + duration if duration else None
+
+    def next_op() -> Optional[str]:
+        nonlocal issued
+        if total_requests is not None and issued >= total_requests:
+            return None
+        if deadline is not None and time.perf_counter() >= deadline:
+            return None
+        issued += 1
+        return random.choices(ops, weights)[0]
+
+    async def worker():
+        while (op := next_op()) is not None:
+            await test.run_one(op, started)
+
+    timeline: List = []
+    stop = threading.Event()
+    sampler = threading.Thread(
+        target=sample_rss, args=(pid, started, sample_interval, timeline, stop), daemon=True
+    )
+    sampler.start()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    sampler.join()
+
+    if not keep:
+        await client.delete(f"/api/exams/{exam_id}")
+
+    return summarize(test.samples, elapsed, concurrency, timeline)
+
+
+def summarize(samples: List[Dict], elapsed: float, concurrency: int, timeline: List) -> Dict:
+    def block(rows):
+        errors = [r for r in rows if not (isinstance(r['status'], int) and r['status'] < 400)]
+        return {
+            'requests': len(rows),
+            'errors': len(errors),
+            'error_rate': round(len(errors) / len(rows), 4) if rows else 0.0,
+            'throughput_rps': round(len(rows) / elapsed, 2) if elapsed else 0.0,
+            'latency_ms': percentiles([r['latency_ms'] for r in rows]),
+        }
+
+    by_op = {}
+    for op in OPERATIONS:
+        rows = [s for s in samples if s['op'] == op]
+        if rows:
+            by_op[op] = block(rows)
+
+    statuses = {}
+    for s in samples:
+        statuses[str(s['status'])] = statuses.get(str(s['status']), 0) + 1
+
+    rss = [mb for _, mb in timeline]
+    return {
+        'concurrency': concurrency,
+        'duration_s': round(elapsed, 2),
+        'overall': block(samples),
+        'operations': by_op,
+        'status_codes': statuses,
+        'rss_mb': {
+            'start': rss[0] if rss else None,
+            'peak': max(rss) if rss else None,
+            'end': rss[-1] if rss else None,
+            'timeline': timeline,
+        },
+    }
+
+
+def print_report(report: Dict):
+    overall = report['overall']
+    print(f"\n{'=' * 78}")
+    print(f"LOAD TEST  concurrency={report['concurrency']}  duration={report['duration_s']}s  "
+          f"requests={overall['requests']}  throughput={overall['throughput_rps']} req/s")
+    print(f"{'=' * 78}")
+    print(f"{'operation':<10} {'count':>7} {'err%':>7} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for op, s in list(report['operations'].items()) + [('ALL', overall)]:
+        lat = s['latency_ms']
+        print(f"{op:<10} {s['requests']:>7} {s['error_rate'] * 100:>6.1f}% {s['throughput_rps']:>8.2f} "
+              f"{lat['p50']:>9} {lat['p95']:>9} {lat['p99']:>9} {lat['max']:>9}")
+    print(f"\nStatus codes: {report['status_codes']}")
+
+    rss = report['rss_mb']
+    if rss['timeline']:
+        print(f"Server RSS: start {rss['start']} MB, peak {rss['peak']} MB, end {rss['end']} MB "
+              f"({len(rss['timeline'])} samples)")
+    else:
+        print("Server RSS: not sampled (pass --pid for a remote server)")
+
+
+async def main_async(args) -> Dict:
+    corpus = load_corpus(args.corpus or DEFAULT_CORPUS)
+    if not corpus:
+        raise SystemExit("No sheets found in corpus")
+    mix = parse_mix(args.mix)
+    timeout = httpx.Timeout(args.timeout)
+
+    if args.url:
+        async with httpx.AsyncClient(base_url=args.url, timeout=timeout) as client:
+            return await run_load(client, corpus, mix, args.concurrency, args.requests,
+                                  args.duration, args.pid, args.sample_interval, args.seed, args.keep)
+
+    # In-process: isolated data dir with the real template/ROI, cwd moved
+    # there so debug images do not land in the repo
+    work_dir = Path(tempfile.mkdtemp(prefix="ljk_load_"))
+    shutil.copytree(ROOT_DIR / "data" / "images" / "templates", work_dir / "images" / "templates")
+    os.environ["LJK_DATA_DIR"] = str(work_dir)
+    os.environ.setdefault("LJK_LOG_LEVEL", "INFO" if args.verbose else "WARNING")
+    os.environ["LJK_GRADING_CACHE"] = "1" if args.cache else "0"
+    cwd = os.getcwd()
+    os.chdir(work_dir)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()) if not args.verbose else contextlib.nullcontext():
+            from main import app
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=timeout) as client:
+                return await run_load(client, corpus, mix, args.concurrency, args.requests,
+                                      args.duration, None, args.sample_interval, args.seed, args.keep)
+    finally:
+        os.chdir(cwd)
+        if not args.keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+        else:
+            print(f"Data kept in: {work_dir}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end API load test")
+    parser.add_argument("--url", help="Base URL of a running server (default: in-process app)")
+    parser.add_argument("--pid", type=int, help="Server PID for RSS sampling with --url")
+    parser.add_argument("--corpus", type=Path, nargs="+", help="Sheet files or directories")
+    parser.add_argument("--mix", default=DEFAULT_MIX,
+                        help=f"Weighted operations out of {','.join(OPERATIONS)} (default: {DEFAULT_MIX})")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--requests", type=int, help="Total requests (default: 100 unless --duration)")
+    parser.add_argument("--duration", type=float, help="Run for this many seconds")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Per-request timeout (s)")
+    parser.add_argument("--sample-interval", type=float, default=0.5, help="RSS sampling interval (s)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--keep", action="store_true", help="Keep the test exam and its data")
+    parser.add_argument("--verbose", action="store_true", help="Show server output (in-process)")
+    parser.add_argument("--cache", action="store_true",
+                        help="Keep the grading cache on (in-process); replayed sheets become cache hits")
+    parser.add_argument("--json", type=Path, help="Write the report as JSON")
+    args = parser.parse_args()
+
+    if args.requests is None and args.duration is None:
+        args.requests = 100
+    try:
+        parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+
+    report = asyncio.run(main_async(args))
+    print_report(report)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"\n✓ Report written to: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,330 @@
+"""
+Golden-corpus regression runner - grading accuracy and stage timing
+
+Grades every sheet of benchmarks/golden/manifest.json through
+LJKProcessor.process_ljk - the path uploads take: template routing, the
+quality gate and per-template thresholds - with the chosen detection
+backend, then compares the answers with the expected vectors. It reports
+per-sheet accuracy, missed bubbles and wall time per grading stage (as
+timed by metrics.stage). Real scans carry their expected answers in the
+manifest; synthetic entries are rendered from a fixed seed and use the
+generator's ground truth; one rendered at another DPI than the templates'
+is graded as a PDF upload of it would be. A sheet the quality gate
+rejects scores 0.
+
+Exits non-zero when a sheet falls below its minimum accuracy, or with
+--compare when accuracy drops or a stage gets slower than --tolerance
+relative to the stored baseline.
+
+Usage (from backend/):
+    python -m benchmarks.regression
+    python -m benchmarks.regression --backend parallel --threshold 170
+    python -m benchmarks.regression --save-baseline
+    python -m benchmarks.regression --compare --tolerance 0.25
+    python -m benchmarks.regression --update-expected   # after a reviewed change only
+"""
+import argparse
+import contextlib
+import io
+import json
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import config
+import metrics
+from benchmarks.synthetic import BASE_DPI, prepare_template, generate_class, write_pdf
+from grading import decide_answers, CHOICES, MISSING_INTENSITY
+from ljk_processor import LJKProcessor
+from quality import SheetRejected
+from render_cache import render_page
+from scoring import compile_answer_key
+
+GOLDEN_DIR = Path(__file__).resolve().parent / "golden"
+MANIFEST_PATH = GOLDEN_DIR / "manifest.json"
+BASELINE_PATH = GOLDEN_DIR / "baseline.json"
+BACKENDS = ("serial", "parallel")
+STAGES = ('quality', 'detect', 'organize', 'sample', 'score', 'mark')  # metrics.stage names in process_ljk
+
+
+def as_uploaded_pdf(image: np.ndarray, dpi: int) -> np.ndarray:
+    """A sheet scanned at dpi, as a PDF upload renders it (gray, at the templates' DPI)"""
+    _, jpg = cv2.imencode('.jpg', image)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "sheet.pdf"
+        write_pdf([(jpg.tobytes(), image.shape[1], image.shape[0])], path, dpi)
+        return render_page(path, 0, use_cache=False)
+
+
+def load_sheet(entry: Dict, template_cache: Dict) -> Tuple[np.ndarray, List[int], float]:
+    """Decoded sheet (BGR; PDFs gray), expected answers and load time (s) of one manifest entry"""
+    start = time.perf_counter()
+    if 'synthetic' in entry:
+        params = dict(entry['synthetic'])
+        seed = params.pop('seed', 0)
+        if 'template' not in template_cache:
+            template_cache['template'] = prepare_template()
+        blank, grid = template_cache['template']
+        image, truth = next(generate_class(blank, grid, 1, seed=seed, **params))
+        if params.get('dpi', BASE_DPI) != BASE_DPI:
+            image = as_uploaded_pdf(image, params['dpi'])
+        expected = [truth['answers'][q] for q in range(len(truth['answers']))]
+        return image, expected, 0.0
+
+    path = config.ROOT_DIR / entry['path']
+    if path.suffix.lower() == '.pdf':
+        # Rendered as uploads are (gray), uncached so 'load' times the rasterization
+        image = render_page(path, entry.get('page', 0), dpi=entry.get('dpi', 200), use_cache=False)
+    else:
+        image = cv2.imread(str(path))
+    if image is None:
+        raise ValueError(f"Cannot read sheet: {path}")
+    return image, entry.get('expected', []), time.perf_counter() - start
+
+
+def grade_timed(
+    name: str,
+    image: np.ndarray,
+    processor: LJKProcessor,
+    backend: str,
+    threshold: Optional[float],
+    active_questions: int
+) -> Tuple[Dict, Dict[str, float]]:
+    """
+    Grade a decoded sheet with process_ljk, timing each stage.
+
+    Returns (process_ljk result, stage seconds). Raises SheetRejected.
+    """
+    before = {stage: metrics.STAGE_DURATION.total(stage=stage) for stage in STAGES}
+    try:
+        result = processor.process_ljk(
+            name,
+            compile_answer_key({}, active_questions),
+            active_questions,
+            parallel=backend == "parallel",
+            filled_threshold=threshold,
+            image=image
+        )
+    finally:
+        times = {stage: metrics.STAGE_DURATION.total(stage=stage) - t for stage, t in before.items()}
+    return result, {stage: t for stage, t in times.items() if t > 0}
+
+
+def evaluate(decided: np.ndarray, intensities: np.ndarray, expected: List[int]) -> Dict:
+    """Accuracy and error breakdown of one sheet against its expected answers"""
+    n = len(expected)
+    got = np.full(n, -1, dtype=np.int8)
+    read = min(n, len(decided))
+    got[:read] = decided[:read]
+    want = np.asarray(expected, dtype=np.int8)
+
+    detected = int((intensities[:n] < MISSING_INTENSITY).sum())
+    mismatched = np.flatnonzero(got != want)
+    return {
+        'questions': n,
+        'accuracy': round(float((got == want).mean()) if n else 1.0, 4),
+        'missed_bubbles': n * CHOICES - detected,
+        'missed_marks': int(((want >= 0) & (got < 0)).sum()),
+        'false_marks': int(((want < 0) & (got >= 0)).sum()),
+        'wrong_choice': int(((want >= 0) & (got >= 0) & (got != want)).sum()),
+        'mismatched_questions': (mismatched + 1).tolist(),
+    }
+
+
+def run_corpus(
+    manifest: Dict,
+    backend: str,
+    threshold: Optional[float],
+    rounds: int,
+    strips: Optional[int] = None
+) -> Dict:
+    """Grade every manifest sheet; stage times are medians over rounds"""
+    sheets = []
+    template_cache = {}
+    if strips:
+        config.COLUMN_STRIPS = strips
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        processor = LJKProcessor()
+        if processor.templates.find() is None:
+            raise RuntimeError("ROI configuration not found")
+
+        for entry in manifest['sheets']:
+            image, expected, load_s = load_sheet(entry, template_cache)
+            active_questions = len(expected) or config.MAX_QUESTIONS
+
+            runs = []
+            rejected = None
+            for _ in range(max(1, rounds)):
+                try:
+                    runs.append(grade_timed(entry['name'], image, processor, backend, threshold, active_questions))
+                except SheetRejected as e:
+                    rejected = e
+                    break
+
+            stages = {'load': load_s} if load_s else {}
+            if rejected is None:
+                result = runs[-1][0]
+                for stage in runs[0][1]:
+                    stages[stage] = statistics.median(r[1].get(stage, 0.0) for r in runs)
+                intensities = result['intensities']
+                decided = decide_answers(intensities, result['filled_threshold'])
+                graded = {
+                    'template_id': result['template_id'],
+                    'filled_threshold': result['filled_threshold'],
+                    **evaluate(decided, intensities, expected),
+                }
+            else:
+                decided = np.empty(0, dtype=np.int8)
+                graded = {
+                    'template_id': None,
+                    'filled_threshold': None,
+                    **evaluate(decided, np.empty((0, CHOICES), dtype=np.uint8), expected),
+                    'accuracy': 0.0,
+                    'rejected': rejected.reason,
+                }
+            stages_ms = {k: round(v * 1000, 3) for k, v in stages.items()}
+
+            sheets.append({
+                'name': entry['name'],
+                'min_accuracy': entry.get('min_accuracy', manifest.get('min_accuracy', 1.0)),
+                **graded,
+                'answers': decided.tolist(),
+                'stages_ms': stages_ms,
+                'total_ms': round(sum(stages_ms.values()), 3),
+            })
+
+    return {
+        'backend': backend,
+        'threshold': threshold,
+        'strips': strips,
+        'rounds': rounds,
+        'opencv': cv2.__version__,
+        'sheets': sheets,
+    }
+
+
+def check(report: Dict, baseline: Optional[Dict], tolerance: float, min_stage_ms: float) -> List[str]:
+    """Failure messages: accuracy floors, and regressions against the baseline"""
+    failures = []
+    for sheet in report['sheets']:
+        if sheet['questions'] == 0:
+            failures.append(f"{sheet['name']}: no expected answers in the manifest")
+        elif sheet.get('rejected') and sheet['min_accuracy'] > 0:
+            failures.append(f"{sheet['name']}: rejected by the quality gate ({sheet['rejected']})")
+        elif sheet['accuracy'] < sheet['min_accuracy']:
+            failures.append(
+                f"{sheet['name']}: accuracy {sheet['accuracy']:.2%} below {sheet['min_accuracy']:.2%} "
+                f"(questions {sheet['mismatched_questions']})"
+            )
+
+    if not baseline:
+        return failures
+
+    base = {s['name']: s for s in baseline.get('sheets', [])}
+    for sheet in report['sheets']:
+        ref = base.get(sheet['name'])
+        if not ref:
+            continue
+        if sheet['accuracy'] < ref['accuracy']:
+            failures.append(f"{sheet['name']}: accuracy dropped {ref['accuracy']:.2%} -> {sheet['accuracy']:.2%}")
+        if sheet['missed_bubbles'] > ref['missed_bubbles']:
+            failures.append(f"{sheet['name']}: missed bubbles {ref['missed_bubbles']} -> {sheet['missed_bubbles']}")
+        for stage, ms in sheet['stages_ms'].items():
+            ref_ms = ref['stages_ms'].get(stage)
+            # Sub-millisecond stages are too noisy to gate on
+            if ref_ms is None or max(ms, ref_ms) < min_stage_ms:
+                continue
+            if ms > ref_ms * (1 + tolerance):
+                failures.append(f"{sheet['name']}: {stage} {ref_ms:.2f} -> {ms:.2f} ms ({ms / ref_ms:.2f}x)")
+    return failures
+
+
+def print_report(report: Dict):
+    threshold = report['threshold'] if report['threshold'] is not None else "template"
+    print(f"\nbackend={report['backend']} threshold={threshold} rounds={report['rounds']}")
+    print(f"{'sheet':<28} {'template':<12} {'accuracy':>9} {'missed':>7} {'miss/false/wrong':>17} {'total ms':>9}  stages (ms)")
+    print("-" * 123)
+    for s in report['sheets']:
+        errors = f"{s['missed_marks']}/{s['false_marks']}/{s['wrong_choice']}"
+        template = s['template_id'] or f"({s['rejected']})"
+        stages = " ".join(f"{k}={v:.1f}" for k, v in s['stages_ms'].items())
+        print(
+            f"{s['name'][:28]:<28} {template[:12]:<12} {s['accuracy']:>8.2%} {s['missed_bubbles']:>7} "
+            f"{errors:>17} {s['total_ms']:>9.1f}  {stages}"
+        )
+
+
+def update_expected(manifest: Dict, report: Dict):
+    """Store the current answers as expected for real scans (not synthetic)"""
+    answers = {s['name']: s['answers'] for s in report['sheets']}
+    for entry in manifest['sheets']:
+        if 'synthetic' not in entry:
+            entry['expected'] = answers[entry['name']]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Golden-corpus grading regression")
+    parser.add_argument("--manifest", type=Path, default=MANIFEST_PATH)
+    parser.add_argument("--backend", choices=BACKENDS, default="serial")
+    parser.add_argument("--threshold", type=float, help="Filled threshold (default: the template's)")
+    parser.add_argument("--strips", type=int, help="Column strips for the parallel backend")
+    parser.add_argument("--rounds", type=int, default=5, help="Timing rounds per sheet (median)")
+    parser.add_argument("--json", type=Path, help="Write report JSON to this file")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="Store this run as the baseline")
+    parser.add_argument("--compare", action="store_true", help="Fail on regressions against the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed stage slowdown (0.25 = 25%%)")
+    parser.add_argument("--min-stage-ms", type=float, default=1.0, help="Ignore timing of faster stages")
+    parser.add_argument("--update-expected", action="store_true",
+                        help="Rewrite expected answers of real scans from this run")
+    args = parser.parse_args()
+
+    with open(args.manifest, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+
+    report = run_corpus(manifest, args.backend, args.threshold, args.rounds, args.strips)
+    print_report(report)
+
+    if args.update_expected:
+        update_expected(manifest, report)
+        with open(args.manifest, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+        print(f"\n✓ Expected answers updated in: {args.manifest} - review the diff before committing")
+        return
+
+    baseline = None
+    if args.compare:
+        if not args.baseline.exists():
+            print(f"⚠️  No baseline at {args.baseline}; run with --save-baseline first")
+        else:
+            with open(args.baseline, 'r') as f:
+                baseline = json.load(f)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\n✓ Baseline saved to: {args.baseline}")
+
+    failures = check(report, baseline, args.tolerance, args.min_stage_ms)
+    if failures:
+        print(f"\n❌ {len(failures)} regression(s):")
+        for failure in failures:
+            print(f"   {failure}")
+        sys.exit(1)
+    print("\n✓ No regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+"""
+Synthetic LJK sheet generator with ground truth
+
+Takes the bubble grid detected on a real template scan (ROI from
+roi_config.json), repaints every bubble as empty on that scan so the printed
+layout stays realistic, then fills answers with configurable pencil
+darkness, double marks, noise, blur, rotation, shift and DPI.
+
+Usage (from backend/):
+    python -m benchmarks.synthetic --count 40 --out ../data/synthetic/class_a
+    python -m benchmarks.synthetic --count 40 --format pdf --noise 6 --rotate 0.8 --shift 6
+    python -m benchmarks.synthetic --layout 3x20 --count 5 --out ...  # grid laid out in the ROI
+"""
+import argparse
+import contextlib
+import io
+import json
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import config
+from column_parallel import detect_bubbles_parallel
+from core.ljk_manual_roi import organize_bubbles_into_columns
+
+BASE_DPI = 200  # Resolution the ROI / template scans are calibrated for
+DEFAULT_TEMPLATE = Path(__file__).resolve().parent / "fixtures" / "ljk_smp1darangdan_test1.jpg"
+PAPER = 245
+INK = 70
+
+Box = Tuple[int, int, int, int]  # x, y, w, h
+
+
+def load_roi(path: Optional[Path] = None) -> Dict:
+    path = path or config.TEMPLATES_DIR / "roi_config.json"
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def detect_template_grid(template: np.ndarray, roi: Dict) -> List[List[Box]]:
+    """Bubble boxes per question (question order, 5 per row) from a real scan"""
+    bubbles = detect_bubbles_parallel(template, roi)[0]
+    if not bubbles:
+        raise ValueError("No bubbles detected on template")
+    with contextlib.redirect_stdout(io.StringIO()):
+        column_rows = organize_bubbles_into_columns(bubbles)
+
+    grid = []
+    for rows in column_rows:
+        for row in rows:
+            if len(row) == 5:
+                grid.append([(b['x'], b['y'], b['w'], b['h']) for b in row])
+    return grid
+
+
+def layout_grid(roi: Dict, columns: int, rows: int, bubble: int = 40) -> List[List[Box]]:
+    """Evenly spaced columns x rows grid inside the ROI (column-major question order)"""
+    col_w = roi['width'] / columns
+    row_h = roi['height'] / rows
+    step = bubble * 1.3
+    if 5 * step > col_w or bubble > row_h:
+        raise ValueError(
+            f"{columns}x{rows} grid with {bubble}px bubbles does not fit a "
+            f"{roi['width']}x{roi['height']} ROI"
+        )
+
+    grid = []
+    for c in range(columns):
+        x0 = roi['x1'] + c * col_w + (col_w - 5 * step) / 2
+        for r in range(rows):
+            y = int(roi['y1'] + r * row_h + (row_h - bubble) / 2)
+            grid.append([(int(x0 + j * step), y, bubble, bubble) for j in range(5)])
+    return grid
+
+
+def blank_sheet(base: np.ndarray, grid: List[List[Box]]) -> np.ndarray:
+    """Erase existing marks: repaint every bubble as an empty printed bubble"""
+    page = base.copy()
+    for row in grid:
+        for j, (x, y, w, h) in enumerate(row):
+            cv2.rectangle(page, (x - 2, y - 2), (x + w + 2, y + h + 2), (PAPER,) * 3, -1)
+            center = (x + w // 2, y + h // 2)
+            cv2.circle(page, center, min(w, h) // 2 - 1, (INK,) * 3, 2, cv2.LINE_AA)
+            cv2.putText(page, "ABCDE"[j], (center[0] - 5, center[1] + 5),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.45, (120,) * 3, 1, cv2.LINE_AA)
+    return page
+
+
+def random_answers(
+    rng: np.random.Generator,
+    questions: int,
+    blank_rate: float,
+    key: Optional[np.ndarray] = None,
+    accuracy: float = 0.7
+) -> np.ndarray:
+    """Answer vector (-1 = blank); follows key with probability accuracy if given"""
+    answers = rng.integers(0, 5, questions)
+    if key is not None:
+        follow = rng.random(questions) < accuracy
+        answers = np.where(follow, key[:questions], answers)
+    answers[rng.random(questions) < blank_rate] = -1
+    return answers.astype(np.int8)
+
+
+def fill_bubble(page: np.ndarray, box: Box, darkness: int, rng: np.random.Generator):
+    """Pencil fill: dark disc with grain, slightly irregular radius"""
+    x, y, w, h = box
+    radius = max(2, int(min(w, h) / 2 - 3 + rng.integers(-1, 2)))
+    mask = np.zeros(page.shape[:2], dtype=np.uint8)
+    cv2.circle(mask, (x + w // 2, y + h // 2), radius, 255, -1, cv2.LINE_AA)
+    grain = rng.normal(darkness, 12, size=page.shape[:2]).clip(0, 255)
+    sel = mask > 0
+    for c in range(3):
+        page[..., c][sel] = np.minimum(page[..., c][sel], grain[sel]).astype(np.uint8)
+
+
+def render_sheet(
+    blank: np.ndarray,
+    grid: List[List[Box]],
+    answers: np.ndarray,
+    rng: np.random.Generator,
+    darkness: int = 80,
+    darkness_jitter: int = 15,
+    multi_rate: float = 0.0,
+    noise: float = 0.0,
+    blur: int = 0,
+    rotate: float = 0.0,
+    shift: int = 0,
+    dpi: int = BASE_DPI
+) -> Tuple[np.ndarray, Dict]:
+    """Render one sheet; returns image and its ground-truth record"""
+    page = blank.copy()
+    multi = []
+
+    for q, ans in enumerate(answers.tolist()):
+        if ans < 0:
+            continue
+        row = grid[q]
+        fill_bubble(page, row[ans], int(darkness + rng.integers(-darkness_jitter, darkness_jitter + 1)), rng)
+        if multi_rate and rng.random() < multi_rate:
+            other = int((ans + rng.integers(1, 5)) % 5)
+            fill_bubble(page, row[other], int(darkness + rng.integers(-darkness_jitter, darkness_jitter + 1)), rng)
+            multi.append(q)
+
+    h, w = page.shape[:2]
+    angle = float(rng.uniform(-rotate, rotate)) if rotate else 0.0
+    dx, dy = (int(v) for v in rng.integers(-shift, shift + 1, 2)) if shift else (0, 0)
+    if angle or dx or dy:
+        m = cv2.getRotationMatrix2D((w / 2, h / 2), angle, 1.0)
+        m[:, 2] += (dx, dy)
+        page = cv2.warpAffine(page, m, (w, h), borderValue=(PAPER,) * 3)
+
+    if blur:
+        k = blur | 1
+        page = cv2.GaussianBlur(page, (k, k), 0)
+    if noise:
+        page = np.clip(page + rng.normal(0, noise, page.shape), 0, 255).astype(np.uint8)
+    if dpi != BASE_DPI:
+        scale = dpi / BASE_DPI
+        page = cv2.resize(page, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+
+    truth = {
+        'answers': {int(q): int(a) for q, a in enumerate(answers.tolist())},
+        'multi_marks': multi,
+        'rotation_deg': round(angle, 3),
+        'shift_px': [dx, dy],
+    }
+    return page, truth
+
+
+def prepare_template(
+    template: Path = DEFAULT_TEMPLATE,
+    roi: Optional[Dict] = None,
+    layout: Optional[Tuple[int, int]] = None,
+    bubble: int = 40
+) -> Tuple[np.ndarray, List[List[Box]]]:
+    """Blank page and bubble grid all synthetic sheets are rendered from"""
+    roi = roi or load_roi()
+    base = cv2.imread(str(template))
+    if base is None:
+        raise ValueError(f"Cannot read template: {template}")
+    grid = layout_grid(roi, *layout, bubble=bubble) if layout else detect_template_grid(base, roi)
+    return blank_sheet(base, grid), grid
+
+
+def generate_class(
+    blank: np.ndarray,
+    grid: List[List[Box]],
+    count: int,
+    seed: int = 0,
+    questions: Optional[int] = None,
+    blank_rate: float = 0.1,
+    key: Optional[np.ndarray] = None,
+    accuracy: float = 0.7,
+    **render_args
+):
+    """Yield (image, truth) for count synthetic students, one at a time"""
+    rng = np.random.default_rng(seed)
+    questions = min(questions or len(grid), len(grid))
+    for _ in range(count):
+        answers = random_answers(rng, questions, blank_rate, key, accuracy)
+        yield render_sheet(blank, grid, answers, rng, **render_args)
+
+
+def write_pdf(pages: List[Tuple[bytes, int, int]], path: Path, dpi: int):
+    """Multi-page PDF from (jpeg, width, height) pages, page size from DPI"""
+    import fitz  # PyMuPDF
+
+    doc = fitz.open()
+    for jpg, w, h in pages:
+        page = doc.new_page(width=w * 72 / dpi, height=h * 72 / dpi)
+        page.insert_image(page.rect, stream=jpg)
+    doc.save(str(path))
+    doc.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic LJK sheets with ground truth")
+    parser.add_argument("--count", type=int, default=30)
+    parser.add_argument("--out", type=Path, required=True)
+    parser.add_argument("--format", choices=["jpg", "pdf"], default="jpg")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--template", type=Path, default=DEFAULT_TEMPLATE,
+                        help="Real scan used for page background and bubble grid")
+    parser.add_argument("--layout", help="COLSxROWS grid laid out in the ROI instead of the detected one")
+    parser.add_argument("--bubble", type=int, default=40, help="Bubble size for --layout (px)")
+    parser.add_argument("--questions", type=int, help="Number of questions to fill")
+    parser.add_argument("--blank-rate", type=float, default=0.1)
+    parser.add_argument("--multi-rate", type=float, default=0.0, help="Share of questions with a double mark")
+    parser.add_argument("--key", type=Path, help="Exam JSON; answers follow its key with --accuracy")
+    parser.add_argument("--accuracy", type=float, default=0.7)
+    parser.add_argument("--darkness", type=int, default=80, help="Pencil gray level (lower = darker)")
+    parser.add_argument("--noise", type=float, default=0.0, help="Gaussian noise sigma")
+    parser.add_argument("--blur", type=int, default=0, help="Gaussian blur kernel size")
+    parser.add_argument("--rotate", type=float, default=0.0, help="Max rotation in degrees")
+    parser.add_argument("--shift", type=int, default=0, help="Max shift in pixels")
+    parser.add_argument("--dpi", type=int, default=BASE_DPI)
+    parser.add_argument("--quality", type=int, default=92, help="JPEG quality")
+    args = parser.parse_args()
+
+    key = None
+    if args.key:
+        with open(args.key, 'r', encoding='utf-8') as f:
+            exam = json.load(f)
+        key_len = max(int(k) for k in exam['answer_key']) + 1
+        key = np.zeros(max(key_len, config.MAX_QUESTIONS), dtype=np.int8)
+        for q, a in exam['answer_key'].items():
+            key[int(q)] = a
+
+    layout = tuple(int(v) for v in args.layout.lower().split("x")) if args.layout else None
+
+    try:
+        blank, grid = prepare_template(args.template, layout=layout, bubble=args.bubble)
+    except ValueError as e:
+        parser.error(str(e))
+
+    args.out.mkdir(parents=True, exist_ok=True)
+    sheets = generate_class(
+        blank, grid, args.count, seed=args.seed,
+        questions=args.questions, blank_rate=args.blank_rate,
+        key=key, accuracy=args.accuracy, darkness=args.darkness,
+        multi_rate=args.multi_rate, noise=args.noise, blur=args.blur,
+        rotate=args.rotate, shift=args.shift, dpi=args.dpi
+    )
+
+    truth_records = []
+    pdf_pages = []
+    for i, (image, truth) in enumerate(sheets, start=1):
+        _, jpg = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, args.quality])
+        if args.format == "jpg":
+            name = f"synthetic_{i:04d}.jpg"
+            (args.out / name).write_bytes(jpg.tobytes())
+            truth_records.append({'file': name, **truth})
+        else:
+            pdf_pages.append((jpg.tobytes(), image.shape[1], image.shape[0]))
+            truth_records.append({'file': "synthetic_class.pdf", 'page': i, **truth})
+
+    if args.format == "pdf":
+        write_pdf(pdf_pages, args.out / "synthetic_class.pdf", args.dpi)
+
+    ground_truth = {
+        'generator': 'benchmarks.synthetic',
+        'params': {k: (str(v) if isinstance(v, Path) else v) for k, v in vars(args).items()},
+        'sheets': truth_records,
+    }
+    with open(args.out / "ground_truth.json", 'w', encoding='utf-8') as f:
+        json.dump(ground_truth, f, indent=2)
+
+    print(f"✓ Generated {len(truth_records)} synthetic sheets in: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
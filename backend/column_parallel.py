@@ -0,0 +1,136 @@
+# Intra-sheet parallelism - deteksi bubble per strip kolom
+#
+# ROI jawaban dipotong vertikal menjadi beberapa strip (dengan overlap),
+# lalu threshold + contour + sampling intensitas tiap strip dijalankan di
+# thread pool. OpenCV melepas GIL, jadi strip benar-benar berjalan paralel.
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import imutils
+import numpy as np
+
+from core.ljk_manual_roi import threshold_answer_region, filter_bubble_contours
+import config
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def thread_budget() -> int:
+    """CPU threads available to one process when running PROCESS_WORKERS processes"""
+    cpus = os.cpu_count() or 1
+    return max(1, cpus // max(1, config.PROCESS_WORKERS))
+
+
+def column_workers() -> int:
+    """Number of strip threads, capped by the per-process thread budget"""
+    return max(1, min(config.COLUMN_STRIPS, thread_budget()))
+
+
+def configure_opencv_threads() -> int:
+    """
+    Set cv2.setNumThreads so strip threads x OpenCV threads x processes
+    does not exceed the CPU count. Returns the value applied.
+    """
+    budget = thread_budget()
+    if config.PARALLEL_COLUMNS:
+        budget = max(1, budget // column_workers())
+    cv2.setNumThreads(budget)
+    return budget
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=column_workers(),
+            thread_name_prefix="ljk-strip"
+        )
+    return _executor
+
+
+def plan_strips(roi_width: int, strips: int, overlap: int) -> List[Tuple[int, int, int, int]]:
+    """
+    Split ROI width into strips.
+
+    Returns list of (crop_start, crop_end, own_start, own_end) in ROI-local X.
+    A bubble belongs to the strip whose [own_start, own_end) contains its center,
+    so bubbles in the overlap are never counted twice.
+    """
+    strips = max(1, strips)
+    edges = np.linspace(0, roi_width, strips + 1).astype(int)
+    plan = []
+    for i in range(strips):
+        own_start, own_end = int(edges[i]), int(edges[i + 1])
+        plan.append((
+            max(0, own_start - overlap),
+            min(roi_width, own_end + overlap),
+            own_start,
+            own_end
+        ))
+    return plan
+
+
+def _process_strip(
+    gray: np.ndarray,
+    roi: Dict,
+    strip: Tuple[int, int, int, int]
+) -> Tuple[List[Dict], np.ndarray]:
+    """Threshold, detect and sample bubbles for a single strip"""
+    x1, y1, y2 = roi['x1'], roi['y1'], roi['y2']
+    crop_start, crop_end, own_start, own_end = strip
+
+    region = gray[y1:y2, x1 + crop_start:x1 + crop_end]
+    thresh = threshold_answer_region(region)
+
+    cnts = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    cnts = imutils.grab_contours(cnts)
+
+    bubbles = []
+    for b in filter_bubble_contours(cnts, x1, y1, local_dx=crop_start):
+        center_x = b['x_local'] + b['w'] / 2
+        if not (own_start <= center_x < own_end):
+            continue
+
+        # Sample intensity here so the mean runs on the strip thread too
+        patch = gray[b['y']:b['y'] + b['h'], b['x']:b['x'] + b['w']]
+        if patch.size > 0:
+            b['intensity'] = float(np.mean(patch))
+        bubbles.append(b)
+
+    owned = thresh[:, own_start - crop_start:own_end - crop_start]
+    return bubbles, owned
+
+
+def detect_bubbles_parallel(
+    image: np.ndarray,
+    roi: Dict,
+    strips: Optional[int] = None,
+    overlap: Optional[int] = None
+) -> Tuple[List[Dict], np.ndarray, np.ndarray, Dict]:
+    """
+    Parallel counterpart of find_answer_bubbles_manual_roi.
+
+    Takes the already decoded image and returns the same
+    (bubbles, image, thresh, roi) tuple. Bubbles carry a precomputed
+    'intensity' so the processor does not sample them again.
+    """
+    strips = strips or config.COLUMN_STRIPS
+    overlap = config.COLUMN_STRIP_OVERLAP if overlap is None else overlap
+
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    roi_width = roi['x2'] - roi['x1']
+    plan = plan_strips(roi_width, strips, overlap)
+
+    if column_workers() > 1 and len(plan) > 1:
+        parts = list(_get_executor().map(lambda s: _process_strip(gray, roi, s), plan))
+    else:
+        parts = [_process_strip(gray, roi, s) for s in plan]
+
+    # Merge strips left to right; organize_bubbles_into_columns restores question order
+    bubbles = [b for strip_bubbles, _ in parts for b in strip_bubbles]
+    thresh = np.hstack([owned for _, owned in parts])
+
+    return bubbles, image, thresh, roi
@@ -5,7 +5,7 @@ from pathlib import Path
 # Base paths
 BASE_DIR = Path(__file__).resolve().parent
 ROOT_DIR = BASE_DIR.parent
-DATA_DIR = ROOT_DIR / "data"
+DATA_DIR = Path(os.getenv("LJK_DATA_DIR", str(ROOT_DIR / "data")))  # Override for isolated runs (load tests)
 
 # Data directories
 EXAMS_DIR = DATA_DIR / "exams"
@@ -14,15 +14,68 @@ IMAGES_DIR = DATA_DIR / "images"
 TEMPLATES_DIR = IMAGES_DIR / "templates"
 UPLOADS_DIR = IMAGES_DIR / "uploads"
 PROCESSED_DIR = IMAGES_DIR / "processed"
+BLOBS_DIR = IMAGES_DIR / "blobs"  # Content-addressed scans and marked images (image_store.py)
 EXPORTS_DIR = DATA_DIR / "exports"
+PROFILES_DIR = DATA_DIR / "profiles"
+GRADING_CACHE_DIR = DATA_DIR / "cache" / "grading"
+RENDER_CACHE_DIR = DATA_DIR / "cache" / "render"
 
 # Ensure directories exist
-for directory in [EXAMS_DIR, RESULTS_DIR, TEMPLATES_DIR, UPLOADS_DIR, PROCESSED_DIR, EXPORTS_DIR]:
+for directory in [EXAMS_DIR, RESULTS_DIR, TEMPLATES_DIR, UPLOADS_DIR, PROCESSED_DIR, BLOBS_DIR, EXPORTS_DIR]:
     directory.mkdir(parents=True, exist_ok=True)
 
 # LJK Settings
 MAX_QUESTIONS = 180
-FILLED_THRESHOLD = 205  # Bubble intensity threshold (lower = darker = filled)
+FILLED_THRESHOLD = 150  # Darkest bubble below this = filled (empty bubbles read ~203-208)
+MARK_DELTA = 25  # A bubble this much darker than the row's empty baseline shows a visible mark
+REVIEW_CONFIDENCE = 0.5  # Questions below this confidence go to the manual review queue
+TEMPLATE_MATCH_MIN = float(os.getenv("LJK_TEMPLATE_MATCH_MIN", "0.5"))  # Fingerprint correlation; same layout ~0.9, other layouts < 0.2
+
+# Quality gate: cheap pre-checks that reject unreadable sheets before grading (see quality.py)
+QUALITY_GATE = os.getenv("LJK_QUALITY_GATE", "1") == "1"
+QUALITY_MIN_INK = 0.005  # Dark pixel fraction; a printed form is ~0.06-0.08, a blank page 0
+QUALITY_MIN_SHARPNESS = 50.0  # Laplacian variance of the ROI; sharp scans ~26000, detection fails below ~25
+QUALITY_MAX_ASPECT_DELTA = 0.05  # Page aspect vs the template reference scan
+QUALITY_MIN_BUBBLE_RATIO = 0.9  # Detected / expected bubbles
+
+# Intra-sheet parallelism: split the ROI into column strips processed on a thread pool
+PARALLEL_COLUMNS = os.getenv("LJK_PARALLEL_COLUMNS", "0") == "1"
+COLUMN_STRIPS = 6  # One strip per answer column on the 180-question layout
+COLUMN_STRIP_OVERLAP = 48  # Pixels; must exceed half the max bubble width + blur margin
+PROCESS_WORKERS = int(os.getenv("LJK_PROCESS_WORKERS", "1"))  # Grading processes sharing this host
+
+# Logging: structured JSON lines on stderr via a background queue listener
+LOG_LEVEL = os.getenv("LJK_LOG_LEVEL", "INFO")  # DEBUG adds per-question intensity traces
+LOG_FORMAT = os.getenv("LJK_LOG_FORMAT", "json")  # "json" or "text"
+DEBUG_IMAGES = os.getenv("LJK_DEBUG_IMAGES", "0") == "1"  # Write ROI/threshold/bubble images to debug_output/
+
+# Grading cache: re-uploads of the same scan reuse the stored result (grading_cache.py)
+GRADING_CACHE = os.getenv("LJK_GRADING_CACHE", "1") == "1"
+IDEMPOTENCY_TTL = 24 * 3600  # Seconds an Idempotency-Key replays its first response
+
+# PDF rendering: pages are rasterized at the DPI the templates' ROI is measured in,
+# as grayscale, and cached on disk by (PDF hash, page, DPI, colorspace, clip) (render_cache.py)
+PDF_RENDER_DPI = int(os.getenv("LJK_PDF_RENDER_DPI", "200"))
+RENDER_CACHE = os.getenv("LJK_RENDER_CACHE", "1") == "1"
+RENDER_CACHE_MAX_BYTES = int(os.getenv("LJK_RENDER_CACHE_MB", "512")) * 1024 * 1024  # LRU budget; a page is ~0.2 MB
+PDF_PIPELINE_QUEUE = 2  # Rendered pages waiting for grading (multi-page PDFs, pdf_pipeline.py)
+PDF_PIPELINE_WORKERS = int(os.getenv("LJK_PDF_PIPELINE_WORKERS", "1"))  # Pages graded concurrently
+# Renderer processes for multi-page PDFs; 0 = render in-thread (no overlap on a single core anyway)
+PDF_RENDER_PROCESSES = int(os.getenv("LJK_PDF_RENDER_PROCESSES", "1" if (os.cpu_count() or 1) > 1 else "0"))
+
+# Image store GC: unreferenced images younger than this are kept (uploads still being graded)
+IMAGE_GC_GRACE = int(os.getenv("LJK_IMAGE_GC_GRACE", "3600"))
+
+# Watch folders (watch_folder.py): scanner hot folders, one subfolder per exam
+WATCH_DIRS = [Path(p) for p in os.getenv("LJK_WATCH_DIRS", "").split(os.pathsep) if p]
+WATCH_SETTLE = float(os.getenv("LJK_WATCH_SETTLE", "3"))  # Seconds a file must keep its size / mtime before grading
+WATCH_POLL_INTERVAL = float(os.getenv("LJK_WATCH_POLL_INTERVAL", "5"))  # Rescan period; inotify (watchdog) wakes it earlier
+WATCH_CONCURRENCY = int(os.getenv("LJK_WATCH_CONCURRENCY", "2"))  # Files graded at once
+
+# Profiling: admins send X-LJK-Profile + X-LJK-Admin-Token; a sample rate > 0 profiles random requests
+PROFILE_ADMIN_TOKEN = os.getenv("LJK_ADMIN_TOKEN")  # Unset = on-demand profiling and profile API disabled
+PROFILE_SAMPLE_RATE = float(os.getenv("LJK_PROFILE_SAMPLE_RATE", "0"))
+PROFILE_KEEP = 200  # Newest profiles kept on disk
 
 # API Settings
 API_PREFIX = "/api"
@@ -33,4 +86,10 @@ CORS_ORIGINS = [
 
 # Upload limits
 MAX_UPLOAD_SIZE = 10 * 1024 * 1024  # 10MB
-ALLOWED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".pdf"}
+
+# Resumable uploads (uploads.ResumableUploads): large class PDFs / TIFFs sent in chunks
+RESUMABLE_DIR = UPLOADS_DIR / ".resumable"
+MAX_RESUMABLE_SIZE = int(os.getenv("LJK_MAX_RESUMABLE_MB", "1024")) * 1024 * 1024
+RESUMABLE_CHUNK_SIZE = 8 * 1024 * 1024  # Suggested to clients; any chunk size is accepted
+RESUMABLE_TTL = 24 * 3600  # Seconds an unfinished upload is kept since its last chunk
+ALLOWED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".pdf", ".tif", ".tiff"}
@@ -7,11 +7,14 @@ import imutils
 from imutils import contours as imutils_contours
 import os
 import json
+import logging
 try:
     from answer_key_auto import ANSWER_KEY
 except ImportError:
     from answer_key import ANSWER_KEY
 
+logger = logging.getLogger("ljk.core")
+
 
 class ROISelector:
     """
@@ -152,30 +155,10 @@ def load_roi_config(filename="roii_config.json"):
     return None
 
 
-def find_answer_bubbles_manual_roi(image_path, roi):
+def threshold_answer_region(answer_region):
     """
-    Mencari bubble jawaban di area ROI yang dipilih manual
+    Blur + adaptive threshold area jawaban (grayscale) menjadi citra biner
     """
-    # Load image
-    image = cv2.imread(image_path)
-    if image is None:
-        print(f"Error: Tidak bisa membaca {image_path}")
-        return None
-    
-    height, width = image.shape[:2]
-    print(f"Ukuran gambar: {width} x {height}")
-    
-    # Convert to grayscale
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    
-    # Crop ke ROI yang dipilih
-    x1, y1, x2, y2 = roi['x1'], roi['y1'], roi['x2'], roi['y2']
-    answer_region = gray[y1:y2, x1:x2]
-    image_region = image[y1:y2, x1:x2]
-    
-    print(f"Area jawaban (ROI): {answer_region.shape} - {roi['width']}x{roi['height']} pixels")
-    
-    # Apply preprocessing
     blurred = cv2.GaussianBlur(answer_region, (5, 5), 0)
     
     # Gunakan adaptive threshold
@@ -188,28 +171,16 @@ def find_answer_bubbles_manual_roi(image_path, roi):
     # thresh = cv2.morphologyEx(thresh, cv2.MORPH_CLOSE, kernel)
     # thresh = cv2.morphologyEx(thresh, cv2.MORPH_OPEN, kernel)
     
-    # Save debug images
-    output_dir = "debug_output"
-    os.makedirs(output_dir, exist_ok=True)
-    
-    # Gambar ROI pada original image
-    debug_roi = image.copy()
-    cv2.rectangle(debug_roi, (x1, y1), (x2, y2), (0, 255, 0), 3)
-    cv2.putText(debug_roi, "ROI - Area JAWABAN", (x1, y1-10),
-                cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
-    
-    cv2.imwrite(os.path.join(output_dir, "1_roi_selected.jpg"), debug_roi)
-    cv2.imwrite(os.path.join(output_dir, "2_answer_region.jpg"), answer_region)
-    cv2.imwrite(os.path.join(output_dir, "3_threshold.jpg"), thresh)
-    
-    # Find contours
-    cnts = cv2.findContours(thresh.copy(), cv2.RETR_EXTERNAL,
-                            cv2.CHAIN_APPROX_SIMPLE)
-    cnts = imutils.grab_contours(cnts)
-    
-    print(f"Total contours ditemukan: {len(cnts)}")
+    return thresh
+
+
+def filter_bubble_contours(cnts, x1, y1, local_dx=0):
+    """
+    Filter contour menjadi bubble berdasarkan ukuran dan aspect ratio
     
-    # Filter bubble
+    x1, y1   : posisi ROI di gambar asli
+    local_dx : offset X contour terhadap ROI (dipakai saat ROI dipotong per strip)
+    """
     bubbles = []
     
     for c in cnts:
@@ -221,6 +192,9 @@ def find_answer_bubbles_manual_roi(image_path, roi):
         # Updated to support larger bubbles (35-50 pixels for high-res scans)
         if (35 <= w <= 50 and 35 <= h <= 50 and 
             0.70 <= ar <= 1.30 and area >= 1000):
+            if local_dx:
+                x += local_dx
+                c = c + np.array([local_dx, 0], dtype=c.dtype)
             # Adjust koordinat ke gambar asli
             bubbles.append({
                 'contour': c,
@@ -234,21 +208,82 @@ def find_answer_bubbles_manual_roi(image_path, roi):
                 'ar': ar
             })
     
-    print(f"Bubble terdeteksi setelah filter: {len(bubbles)}")
+    return bubbles
+
+
+def find_answer_bubbles_manual_roi(image_path, roi, save_debug=True, image=None):
+    """
+    Mencari bubble jawaban di area ROI yang dipilih manual
+    
+    save_debug: tulis gambar debug ke debug_output/ (dimatikan di server,
+                lihat config.DEBUG_IMAGES)
+    image: gambar BGR yang sudah di-decode (dan diputar tegak);
+           jika None dibaca dari image_path
+    """
+    # Load image
+    if image is None:
+        image = cv2.imread(image_path)
+    if image is None:
+        logger.error("Tidak bisa membaca %s", image_path)
+        return None
     
-    if len(bubbles) > 0:
-        widths = [b['w'] for b in bubbles]
-        heights = [b['h'] for b in bubbles]
-        print(f"Ukuran bubble - Lebar: {min(widths)}-{max(widths)}, Tinggi: {min(heights)}-{max(heights)}")
+    height, width = image.shape[:2]
+    logger.debug("Ukuran gambar: %d x %d", width, height)
     
-    # Visualisasi bubble
-    debug_image = image.copy()
-    for b in bubbles:
-        cv2.rectangle(debug_image, (b['x'], b['y']), 
-                     (b['x']+b['w'], b['y']+b['h']), (0, 255, 0), 2)
+    # Convert to grayscale
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
     
-    cv2.imwrite(os.path.join(output_dir, "4_bubbles_detected.jpg"), debug_image)
-    print(f"✓ Debug images disimpan di: {output_dir}/")
+    # Crop ke ROI yang dipilih
+    x1, y1, x2, y2 = roi['x1'], roi['y1'], roi['x2'], roi['y2']
+    answer_region = gray[y1:y2, x1:x2]
+    image_region = image[y1:y2, x1:x2]
+    
+    logger.debug("Area jawaban (ROI): %s - %sx%s pixels", answer_region.shape, roi['width'], roi['height'])
+    
+    # Apply preprocessing + adaptive threshold
+    thresh = threshold_answer_region(answer_region)
+    
+    # Save debug images
+    output_dir = "debug_output"
+    if save_debug:
+        os.makedirs(output_dir, exist_ok=True)
+        
+        # Gambar ROI pada original image
+        debug_roi = image.copy()
+        cv2.rectangle(debug_roi, (x1, y1), (x2, y2), (0, 255, 0), 3)
+        cv2.putText(debug_roi, "ROI - Area JAWABAN", (x1, y1-10),
+                    cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
+        
+        cv2.imwrite(os.path.join(output_dir, "1_roi_selected.jpg"), debug_roi)
+        cv2.imwrite(os.path.join(output_dir, "2_answer_region.jpg"), answer_region)
+        cv2.imwrite(os.path.join(output_dir, "3_threshold.jpg"), thresh)
+    
+    # Find contours
+    cnts = cv2.findContours(thresh.copy(), cv2.RETR_EXTERNAL,
+                            cv2.CHAIN_APPROX_SIMPLE)
+    cnts = imutils.grab_contours(cnts)
+    
+    logger.debug("Total contours ditemukan: %d", len(cnts))
+    
+    # Filter bubble
+    bubbles = filter_bubble_contours(cnts, x1, y1)
+    
+    logger.debug("Bubble terdeteksi setelah filter: %d", len(bubbles))
+    
+    if len(bubbles) > 0 and logger.isEnabledFor(logging.DEBUG):
+        widths = [b['w'] for b in bubbles]
+        heights = [b['h'] for b in bubbles]
+        logger.debug("Ukuran bubble - Lebar: %d-%d, Tinggi: %d-%d", min(widths), max(widths), min(heights), max(heights))
+    
+    if save_debug:
+        # Visualisasi bubble
+        debug_image = image.copy()
+        for b in bubbles:
+            cv2.rectangle(debug_image, (b['x'], b['y']), 
+                         (b['x']+b['w'], b['y']+b['h']), (0, 255, 0), 2)
+        
+        cv2.imwrite(os.path.join(output_dir, "4_bubbles_detected.jpg"), debug_image)
+        logger.info("Debug images disimpan di: %s/", output_dir)
     
     return bubbles, image, thresh, roi
 
@@ -299,8 +334,9 @@ def organize_bubbles_into_columns(bubbles):
         center = sum(temp_group) / len(temp_group)
         col_centers.append(center)
     
-    print(f"Pusat kolom terdeteksi: {len(col_centers)} kolom")
-    print(f"Posisi X pusat: {[int(c) for c in col_centers]}")
+    logger.debug("Pusat kolom terdeteksi: %d kolom", len(col_centers))
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Posisi X pusat: %s", [int(c) for c in col_centers])
     
     # Assign bubble ke kolom terdekat
     column_bubbles = [[] for _ in range(len(col_centers))]
@@ -351,12 +387,11 @@ def organize_bubbles_into_columns(bubbles):
         
         column_rows.append(rows)
         
-        # Print info
-        if rows:
+        # Log info
+        if logger.isEnabledFor(logging.DEBUG):
             bubble_counts = [len(r) for r in rows[:5]]  # 5 baris pertama
-            print(f"  Kolom {col_idx+1}: {len(rows)} soal, bubble/soal: {bubble_counts}... (skip: {skipped_rows})")
-        else:
-            print(f"  Kolom {col_idx+1}: 0 soal (skip: {skipped_rows})")
+            logger.debug("Kolom %d: %d soal, bubble/soal: %s... (skip: %d)",
+                         col_idx + 1, len(rows), bubble_counts, skipped_rows)
     
     return column_rows
 
@@ -493,7 +528,11 @@ def process_ljk_180_manual(image_path, roi, answer_key=None):
     }
 
 
+# Demo interaktif satu file (pilih ROI dengan mouse). Untuk menilai banyak
+# file tanpa GUI / web server: python -m ljk grade --exam <exam_id> <path>
 def main():
+    logging.basicConfig(level=logging.DEBUG, format="%(message)s")
+    
     # Template untuk memilih ROI
     template_path = "images/Ljk_contoh.jpg"
     
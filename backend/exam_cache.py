@@ -0,0 +1,84 @@
+# Exam Cache - exams kept in memory with their answer key compiled
+#
+# Every upload used to open and parse the exam JSON, and every sheet
+# rebuilt the answer key dict. The cache keeps each exam together with
+# its key compiled to an int8 vector over the active questions
+# (scoring.compile_answer_key, -1 = no key) and its key_version. An entry
+# is revalidated with one stat() of the exam file: a new mtime, size or
+# inode - the exam was rewritten, possibly by another worker process -
+# reloads it, a missing file drops it. Updates and deletes in this
+# process invalidate the entry directly.
+#
+# Entries are shared between requests: treat exam and key_vec as read-only.
+
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from regrade import key_version
+from scoring import compile_answer_key
+from storage import StorageService
+
+
+class CompiledExam:
+    """An exam with its answer key as an int8 vector"""
+
+    __slots__ = ('exam', 'key_vec', 'key_version', 'stamp')
+
+    def __init__(self, exam: Dict, stamp: Tuple[int, int, int]):
+        self.exam = exam
+        self.key_vec = compile_answer_key(exam['answer_key'], exam['active_questions'])
+        self.key_vec.setflags(write=False)
+        self.key_version = key_version(exam)
+        self.stamp = stamp
+
+    @property
+    def active_questions(self) -> int:
+        return self.exam['active_questions']
+
+    def key_letters(self) -> List[str]:
+        """Answer key letter per active question ('?' = no key)"""
+        return ['ABCDE'[k] if k >= 0 else '?' for k in self.key_vec.tolist()]
+
+
+class ExamCache:
+    """exam_id -> CompiledExam, revalidated by the exam file's stat()"""
+
+    def __init__(self, storage: Optional[StorageService] = None):
+        self.storage = storage or StorageService()
+        self._entries: Dict[str, CompiledExam] = {}
+        self._lock = threading.Lock()
+
+    def _stamp(self, exam_id: str) -> Optional[Tuple[int, int, int]]:
+        try:
+            st = (Path(self.storage.exams_dir) / f"{exam_id}.json").stat()
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size, st.st_ino
+
+    def get(self, exam_id: str) -> Optional[CompiledExam]:
+        stamp = self._stamp(exam_id)
+        if stamp is None:
+            self.invalidate(exam_id)
+            return None
+        entry = self._entries.get(exam_id)
+        if entry is not None and entry.stamp == stamp:
+            return entry
+
+        exam = self.storage.load_exam(exam_id)
+        if not exam:
+            self.invalidate(exam_id)
+            return None
+        # Stamp from before the read: a write racing with it reloads next time
+        entry = CompiledExam(exam, stamp)
+        with self._lock:
+            self._entries[exam_id] = entry
+        return entry
+
+    def invalidate(self, exam_id: str):
+        with self._lock:
+            self._entries.pop(exam_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
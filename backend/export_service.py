@@ -5,19 +5,27 @@ from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
 from openpyxl.utils import get_column_letter
 from datetime import datetime
 from pathlib import Path
+import logging
+import numpy as np
 import config
+from exam_cache import CompiledExam, ExamCache
+from scoring import answers_to_vector
+
+logger = logging.getLogger("ljk.export")
 
 class ExportService:
     """Export exam results to Excel"""
     
-    def __init__(self, storage):
+    def __init__(self, storage, exams: ExamCache = None):
         self.storage = storage
+        self.exams = exams or ExamCache(storage)
     
     def export_to_excel(self, exam_id: str) -> Path:
         """Export exam results to Excel file"""
-        exam = self.storage.load_exam(exam_id)
-        if not exam:
+        compiled = self.exams.get(exam_id)
+        if compiled is None:
             raise Exception("Exam not found")
+        exam = compiled.exam
         
         results = self.storage.list_results_by_exam(exam_id)
         stats = self.storage.get_exam_statistics(exam_id)
@@ -31,7 +39,7 @@ class ExportService:
         # Create sheets
         self._create_summary_sheet(wb, exam, stats)
         self._create_scores_sheet(wb, exam, results)
-        self._create_details_sheet(wb, exam, results)
+        self._create_details_sheet(wb, compiled, results)
         
         # Save file
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -44,7 +52,7 @@ class ExportService:
             
             # Save with explicit engine
             wb.save(str(file_path))
-            print(f"✓ Excel exported to: {file_path}")
+            logger.info("Excel exported to: %s", file_path)
             
             # Verify file exists and has size
             if file_path.exists() and file_path.stat().st_size > 0:
@@ -53,7 +61,7 @@ class ExportService:
                 raise Exception("Excel file was not created properly")
                 
         except Exception as e:
-            print(f"Error saving Excel: {e}")
+            logger.error("Error saving Excel: %s", e)
             raise Exception(f"Failed to save Excel file: {str(e)}")
     
     def _create_summary_sheet(self, wb, exam, stats):
@@ -118,12 +126,12 @@ class ExportService:
             nilai_siswa = round(result['score']['percentage'], 2)
             
             ws.cell(row=idx, column=1, value=idx-1)
-            ws.cell(row=idx, column=2, value=result.get('student_name', 'N/A'))
-            ws.cell(row=idx, column=3, value=result.get('student_number', 'N/A'))
+            ws.cell(row=idx, column=2, value=self._display_name(result, idx-1))
+            ws.cell(row=idx, column=3, value=result.get('student_number') or 'N/A')
             ws.cell(row=idx, column=4, value=result['score']['correct'])
             ws.cell(row=idx, column=5, value=result['score']['wrong'])
             ws.cell(row=idx, column=6, value=result['score']['unanswered'])
-            ws.cell(row=idx, column=7, value=result['score']['correct'])
+            ws.cell(row=idx, column=7, value=result['score'].get('total_points', result['score']['correct']))
             ws.cell(row=idx, column=8, value=nilai_siswa)
             ws.cell(row=idx, column=9, value=self._get_predicate(result['score']['percentage']))
         
@@ -131,7 +139,7 @@ class ExportService:
         for col in range(1, 10):
             ws.column_dimensions[get_column_letter(col)].width = 15
     
-    def _create_details_sheet(self, wb, exam, results):
+    def _create_details_sheet(self, wb, compiled: CompiledExam, results):
         """Sheet 3: Detail Per Soal"""
         ws = wb.create_sheet("Detail Per Soal")
         
@@ -141,30 +149,45 @@ class ExportService:
         
         # Student columns
         for idx, result in enumerate(results, start=3):
-            student_name = result.get('student_name', f'Siswa {idx-2}')
-            ws.cell(row=1, column=idx, value=student_name[:15])
+            ws.cell(row=1, column=idx, value=self._display_name(result, idx-2)[:15])
+        
+        # Answers of all students as one (N, Q) matrix, read per question
+        active_questions = compiled.active_questions
+        answers = np.full((len(results), active_questions), -1, dtype=np.int8)
+        for i, result in enumerate(results):
+            answers[i] = answers_to_vector(result['answers'], active_questions)
+        key_letters = compiled.key_letters()
+        correct_fill = PatternFill(start_color="C6EFCE", end_color="C6EFCE", fill_type="solid")  # Green
+        wrong_fill = PatternFill(start_color="FFC7CE", end_color="FFC7CE", fill_type="solid")  # Red
         
         # Data per question
-        for q_num in range(exam['active_questions']):
+        for q_num, (key_idx, column) in enumerate(zip(compiled.key_vec.tolist(), answers.T.tolist())):
             ws.cell(row=q_num+2, column=1, value=q_num+1)
             
             # Answer key
-            key_idx = exam['answer_key'].get(str(q_num), -1)
-            key_letter = chr(65 + key_idx) if key_idx >= 0 else '?'
-            ws.cell(row=q_num+2, column=2, value=key_letter)
+            ws.cell(row=q_num+2, column=2, value=key_letters[q_num])
             
             # Student answers
-            for idx, result in enumerate(results, start=3):
-                ans_idx = result['answers'].get(str(q_num), -1)
+            for idx, ans_idx in enumerate(column, start=3):
                 ans_letter = chr(65 + ans_idx) if ans_idx >= 0 else '-'
                 
                 cell = ws.cell(row=q_num+2, column=idx, value=ans_letter)
                 
                 # Color code
                 if ans_idx == key_idx and ans_idx >= 0:
-                    cell.fill = PatternFill(start_color="C6EFCE", end_color="C6EFCE", fill_type="solid")  # Green
+                    cell.fill = correct_fill
                 elif ans_idx != -1:
-                    cell.fill = PatternFill(start_color="FFC7CE", end_color="FFC7CE", fill_type="solid")  # Red
+                    cell.fill = wrong_fill
+    
+    @staticmethod
+    def _display_name(result, number: int) -> str:
+        """Student name; batch-graded sheets have none and show their file and page"""
+        if result.get('student_name'):
+            return result['student_name']
+        if result.get('source_file'):
+            page = result.get('source_page')
+            return f"{result['source_file']} hlm. {page}" if page else result['source_file']
+        return f"Siswa {number}"
     
     def _get_predicate(self, percentage: float) -> str:
         """Convert percentage to grade predicate"""
@@ -0,0 +1,191 @@
+# Answer decision from per-bubble intensity matrices
+#
+# Intensity matrix: shape (questions, 5), mean gray value per bubble A-E.
+# Lower = darker = filled. Works on a single sheet (Q, 5) or a whole exam
+# stacked as (N, Q, 5).
+
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+import config
+
+CHOICES = 5
+MISSING_INTENSITY = 255  # Bubble not detected (padded row) - never counts as filled
+
+# Review flags (bitmask)
+FLAG_MULTI_MARK = 1  # Two or more bubbles below the filled threshold
+FLAG_ERASURE = 2     # Answered, but another bubble is visibly marked (erased / changed answer)
+FLAG_FAINT = 4       # Unanswered, but the darkest bubble is visibly marked (light pencil)
+FLAG_NAMES = {
+    FLAG_MULTI_MARK: 'multi_mark',
+    FLAG_ERASURE: 'erasure',
+    FLAG_FAINT: 'faint',
+}
+
+
+def sample_intensities(gray: np.ndarray, rows: List[List[Dict]]) -> np.ndarray:
+    """
+    Mean intensity of every bubble, rows in question order.
+
+    Bubbles that already carry an 'intensity' (sampled on a strip thread)
+    are reused. Missing / dummy bubbles get MISSING_INTENSITY.
+    """
+    matrix = np.full((len(rows), CHOICES), MISSING_INTENSITY, dtype=np.float32)
+
+    for q, row in enumerate(rows):
+        for j, bubble in enumerate(row[:CHOICES]):
+            if 'intensity' in bubble:
+                matrix[q, j] = bubble['intensity']
+                continue
+
+            x, y, w, h = bubble['x'], bubble['y'], bubble['w'], bubble['h']
+            roi_bubble = gray[y:y+h, x:x+w]
+            if roi_bubble.size == 0:
+                continue
+            matrix[q, j] = np.mean(roi_bubble)
+
+    return matrix
+
+
+def to_uint8(intensities: np.ndarray) -> np.ndarray:
+    """
+    Compact storage form. Values are floored, so for any integer threshold T
+    `stored < T` gives exactly the same decision as the float value.
+    """
+    return np.clip(np.floor(intensities), 0, 255).astype(np.uint8)
+
+
+def decide_answers(intensities: np.ndarray, threshold: float) -> np.ndarray:
+    """
+    Pick the darkest bubble per question if it is below threshold.
+
+    Returns int8 array with the answer index (0-4) or -1 for unanswered,
+    shape intensities.shape[:-1].
+    """
+    darkest = np.argmin(intensities, axis=-1).astype(np.int8)
+    filled = np.min(intensities, axis=-1) < threshold
+    return np.where(filled, darkest, np.int8(-1)).astype(np.int8)
+
+
+def stack_matrices(matrices: List[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Stack per-sheet matrices of different lengths into (N, Qmax, 5).
+
+    Returns the stacked matrix (padded with MISSING_INTENSITY) and the
+    number of rows actually read per sheet.
+    """
+    rows_read = np.array([m.shape[0] for m in matrices], dtype=np.int32)
+    q_max = int(rows_read.max()) if len(matrices) else 0
+
+    stacked = np.full((len(matrices), q_max, CHOICES), MISSING_INTENSITY, dtype=np.uint8)
+    for i, m in enumerate(matrices):
+        stacked[i, :m.shape[0]] = m
+
+    return stacked, rows_read
+
+
+
+def answer_matrix(stacked: np.ndarray, rows_read: np.ndarray, threshold, active_questions: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Decide a stacked (N, Q, 5) exam into (N, active_questions) answers
+    and a read mask (question was actually read from the sheet).
+
+    threshold may be a scalar or a per-sheet array of shape (N,).
+    """
+    threshold = np.asarray(threshold, dtype=np.float32)
+    if threshold.ndim == 1:
+        # Compared with the per-question minimum, shape (N, Q)
+        threshold = threshold[:, None]
+    decided = decide_answers(stacked, threshold)
+
+    q_cols = min(active_questions, stacked.shape[1])
+    answers = np.full((stacked.shape[0], active_questions), -1, dtype=np.int8)
+    answers[:, :q_cols] = decided[:, :q_cols]
+    read_mask = np.zeros(answers.shape, dtype=bool)
+    read_mask[:, :q_cols] = np.arange(q_cols) < rows_read[:, None]
+
+    return answers, read_mask
+
+
+def question_confidence(
+    intensities: np.ndarray,
+    threshold: float,
+    mark_delta: Optional[float] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Per-question confidence (0-1) and review flags.
+
+    The row's empty baseline is its median bubble (3rd darkest), which is
+    an unmarked bubble even with two marks in the row.
+
+    - answered:   gap between darkest and second darkest relative to the
+                  baseline, capped by how far the darkest is below threshold
+    - unanswered: how far the darkest bubble is above threshold relative
+                  to the baseline (a clean blank row is ~1)
+    """
+    if mark_delta is None:
+        mark_delta = config.MARK_DELTA
+
+    ordered = np.sort(intensities.astype(np.float32), axis=-1)
+    d1, d2, baseline = ordered[..., 0], ordered[..., 1], ordered[..., 2]
+
+    answered = d1 < threshold
+    contrast = np.maximum(baseline - d1, 1.0)
+
+    gap_ratio = np.clip((d2 - d1) / contrast, 0.0, 1.0)
+    margin_ratio = np.clip((threshold - d1) / mark_delta, 0.0, 1.0)
+    blank_ratio = np.clip((d1 - threshold) / np.maximum(baseline - threshold, 1.0), 0.0, 1.0)
+    confidence = np.where(answered, np.minimum(gap_ratio, margin_ratio), blank_ratio)
+
+    flags = np.zeros(d1.shape, dtype=np.uint8)
+    flags |= np.where((intensities < threshold).sum(axis=-1) >= 2, FLAG_MULTI_MARK, 0).astype(np.uint8)
+    second_marked = (d2 >= threshold) & (d2 < baseline - mark_delta)
+    flags |= np.where(answered & second_marked, FLAG_ERASURE, 0).astype(np.uint8)
+    flags |= np.where(~answered & (d1 < baseline - mark_delta), FLAG_FAINT, 0).astype(np.uint8)
+
+    return confidence.astype(np.float32), flags
+
+
+def flag_names(flags: int) -> List[str]:
+    return [name for bit, name in FLAG_NAMES.items() if flags & bit]
+
+
+def sheet_confidence(
+    intensities: np.ndarray,
+    threshold: float,
+    active_questions: int,
+    review_below: Optional[float] = None
+) -> Dict:
+    """
+    Confidence summary of one sheet, stored with the result.
+
+    Only questions below review_below or carrying a flag are listed, so the
+    review queue grows with doubtful answers, not with class size.
+    """
+    if review_below is None:
+        review_below = config.REVIEW_CONFIDENCE
+
+    rows = intensities[:active_questions]
+    if len(rows) == 0:
+        return {'score': 0.0, 'min': 0.0, 'review': []}
+
+    confidence, flags = question_confidence(rows, threshold)
+    doubtful = np.flatnonzero((confidence < review_below) | (flags != 0))
+
+    review = []
+    for q in doubtful.tolist():
+        row = rows[q]
+        review.append({
+            'question_num': q + 1,
+            'confidence': round(float(confidence[q]), 3),
+            'flags': flag_names(int(flags[q])),
+            'candidates': [chr(65 + j) for j in np.flatnonzero(row < threshold).tolist()],
+            'intensities': row.astype(int).tolist()
+        })
+
+    return {
+        'score': round(float(confidence.mean()), 3),
+        'min': round(float(confidence.min()), 3),
+        'review': review
+    }
@@ -0,0 +1,110 @@
+# Grading Cache - idempotent re-uploads
+#
+# Index (exam_id, image SHA-256) -> result_id, one small JSON file per
+# entry under config.GRADING_CACHE_DIR so every worker process sees it.
+# A stored result is reused when it was produced by the current version
+# of its template and PIPELINE_VERSION. If only the exam's answer key or
+# scoring changed (key_version), it is re-scored from the stored answers
+# without decoding the image; otherwise the sheet is graded again into
+# the same result.
+#
+# Idempotency-Key: a client retry key -> (exam_id, result_id), kept for
+# config.IDEMPOTENCY_TTL seconds, answered before the upload is read.
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+import config
+
+# Bump when detection / decision changes the answers read from a scan:
+# results of older pipelines are graded again on re-upload
+PIPELINE_VERSION = 1
+
+FRESH = "hit"
+RESCORE = "rescore"
+STALE = "stale"
+
+
+class GradingCache:
+    """Result index by image hash + Idempotency-Key replay store"""
+
+    def __init__(self, cache_dir: Optional[Path] = None):
+        self.cache_dir = Path(cache_dir or config.GRADING_CACHE_DIR)
+
+    def _entry_path(self, exam_id: str, sha256: str) -> Path:
+        return self.cache_dir / "images" / Path(exam_id).name / f"{sha256}.json"
+
+    def _idempotency_path(self, key: str) -> Path:
+        # Client keys are arbitrary strings: hash them into a file name
+        return self.cache_dir / "idempotency" / f"{hashlib.sha256(key.encode()).hexdigest()}.json"
+
+    @staticmethod
+    def _read(path: Path) -> Optional[Dict]:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _write(path: Path, data: Dict):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, path)
+        except Exception:
+            Path(tmp_path).unlink(missing_ok=True)
+            raise
+
+    # ============ IMAGE HASH INDEX ============
+
+    def lookup(self, exam_id: str, sha256: str) -> Optional[str]:
+        """result_id previously graded from this image for this exam"""
+        entry = self._read(self._entry_path(exam_id, sha256))
+        return entry.get('result_id') if entry else None
+
+    def store(self, exam_id: str, sha256: str, result_id: str):
+        self._write(self._entry_path(exam_id, sha256), {'result_id': result_id})
+
+    def forget(self, exam_id: str, sha256: str):
+        self._entry_path(exam_id, sha256).unlink(missing_ok=True)
+
+    # ============ IDEMPOTENCY KEYS ============
+
+    def lookup_idempotency(self, key: str) -> Optional[Dict]:
+        """{'exam_id', 'result_id', 'created'} of an earlier request, None if unknown or expired"""
+        path = self._idempotency_path(key)
+        entry = self._read(path)
+        if entry and time.time() - entry.get('created', 0) > config.IDEMPOTENCY_TTL:
+            path.unlink(missing_ok=True)
+            return None
+        return entry
+
+    def store_idempotency(self, key: str, exam_id: str, result_id: str):
+        self._write(self._idempotency_path(key), {
+            'exam_id': exam_id,
+            'result_id': result_id,
+            'created': time.time(),
+        })
+
+
+def freshness(result: Dict, exam_key_version: str, templates) -> str:
+    """
+    FRESH: reusable as is; RESCORE: only the answer key / scoring changed;
+    STALE: template or pipeline changed (or the result predates versioning)
+    """
+    template = templates.find(result.get('template_id'))
+    if (
+        template is None
+        or result.get('template_version') != template.version
+        or result.get('pipeline_version') != PIPELINE_VERSION
+    ):
+        return STALE
+    return FRESH if result.get('key_version') == exam_key_version else RESCORE
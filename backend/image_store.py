@@ -0,0 +1,208 @@
+"""
+Image store - content-addressed blobs with deduplication and GC
+
+Uploaded scans and marked images are stored once per content hash under
+sharded directories (config.BLOBS_DIR/ab/cd/abcd...jpg), so identical
+uploads share one file and no directory grows past a few hundred entries.
+Results reference their blobs (image_blob / processed_blob). Garbage
+collection deletes every blob no result references, plus stray files of
+the old flat layout (uploads/, processed/), upload temp files and PDF
+page folders, once older than a grace period, and abandoned resumable
+uploads.
+
+Usage:
+    python image_store.py gc --dry-run
+    python image_store.py gc --grace-minutes 10
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+import config
+from uploads import ResumableUploads
+
+logger = logging.getLogger("ljk.images")
+
+BLOB_URL_PREFIX = "/blobs"
+TEMP_PDF_PAGES_PREFIX = "temp_pdf_pages"
+EXTENSION_ALIASES = {'.jpeg': '.jpg'}  # Same content, same blob
+
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ImageStore:
+    """Blobs named by SHA-256 under two levels of 256-way sharding"""
+
+    def __init__(self, blobs_dir: Optional[Path] = None):
+        self.blobs_dir = Path(blobs_dir or config.BLOBS_DIR)
+
+    def blob_name(self, sha256: str, ext: str) -> str:
+        """Relative blob path: ab/cd/abcd....jpg"""
+        ext = ext.lower()
+        ext = EXTENSION_ALIASES.get(ext, ext)
+        return f"{sha256[:2]}/{sha256[2:4]}/{sha256}{ext}"
+
+    def path(self, blob: str) -> Path:
+        return self.blobs_dir / blob
+
+    def url(self, blob: str) -> str:
+        return f"{BLOB_URL_PREFIX}/{blob}"
+
+    def put_file(self, source: Path, ext: str, sha256: Optional[str] = None) -> str:
+        """
+        Move a file into the store (source is consumed). If the blob
+        already exists the source is dropped instead: same content, one copy.
+        """
+        source = Path(source)
+        blob = self.blob_name(sha256 or file_sha256(source), ext)
+        target = self.path(blob)
+        if target.exists():
+            source.unlink(missing_ok=True)
+            os.utime(target)  # fresh again for the GC grace period
+            return blob
+        target.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(source, target)
+        return blob
+
+    def put_bytes(self, data: bytes, ext: str) -> str:
+        """Store encoded image bytes (e.g. cv2.imencode output)"""
+        blob = self.blob_name(hashlib.sha256(data).hexdigest(), ext)
+        target = self.path(blob)
+        if target.exists():
+            os.utime(target)
+            return blob
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = target.with_name(f".{target.name}.{os.getpid()}.tmp")
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, target)
+        return blob
+
+    def iter_blobs(self):
+        for shard in self.blobs_dir.glob("??/??"):
+            for path in shard.iterdir():
+                if path.is_file():
+                    yield path
+
+
+def result_files(result: Dict, store: Optional[ImageStore] = None) -> List[Path]:
+    """Image files of a result on disk (blobs, or flat files of older results)"""
+    store = store or ImageStore()
+    files = []
+    for blob_key, url_key in (('image_blob', 'image_path'), ('processed_blob', 'processed_image_path')):
+        if result.get(blob_key):
+            files.append(store.path(result[blob_key]))
+            continue
+        url = result.get(url_key) or ''
+        for prefix, directory in (('/uploads/', config.UPLOADS_DIR), ('/processed/', config.PROCESSED_DIR)):
+            if url.startswith(prefix):
+                files.append(directory / url[len(prefix):])
+    return [f for f in files if f.exists()]
+
+
+def referenced_files(results_dir: Optional[Path] = None, store: Optional[ImageStore] = None) -> Set[Path]:
+    """Every image file referenced by a stored result"""
+    results_dir = Path(results_dir or config.RESULTS_DIR)
+    store = store or ImageStore()
+    referenced = set()
+    for result_file in results_dir.glob("*.json"):
+        try:
+            with open(result_file, 'r', encoding='utf-8') as f:
+                result = json.load(f)
+        except (OSError, ValueError):
+            continue
+        referenced.update(p.resolve() for p in result_files(result, store))
+    return referenced
+
+
+def collect_garbage(
+    store: Optional[ImageStore] = None,
+    grace_seconds: Optional[float] = None,
+    dry_run: bool = False
+) -> Dict:
+    """
+    Delete unreferenced images older than grace_seconds: blobs, flat
+    uploads / processed files, upload temp files and PDF page folders.
+    The grace period keeps images of requests still being graded.
+    """
+    store = store or ImageStore()
+    grace_seconds = config.IMAGE_GC_GRACE if grace_seconds is None else grace_seconds
+    cutoff = time.time() - grace_seconds
+    referenced = referenced_files(store=store)
+
+    candidates = list(store.iter_blobs())
+    for directory in (config.UPLOADS_DIR, config.PROCESSED_DIR):
+        candidates.extend(p for p in directory.iterdir() if p.is_file())
+
+    report = {'dry_run': dry_run, 'referenced': len(referenced), 'deleted_files': 0, 'deleted_bytes': 0, 'kept': 0}
+    for path in candidates:
+        try:
+            st = path.stat()
+        except OSError:
+            continue
+        if st.st_mtime > cutoff or path.resolve() in referenced:
+            report['kept'] += 1
+            continue
+        report['deleted_files'] += 1
+        report['deleted_bytes'] += st.st_size
+        if not dry_run:
+            path.unlink(missing_ok=True)
+
+    # PDF page folders left by older versions of the processor
+    page_dirs = [p for p in config.UPLOADS_DIR.rglob(f"{TEMP_PDF_PAGES_PREFIX}*") if p.is_dir()]
+    report['deleted_page_dirs'] = 0
+    for page_dir in page_dirs:
+        if page_dir.stat().st_mtime > cutoff:
+            continue
+        report['deleted_page_dirs'] += 1
+        report['deleted_bytes'] += sum(f.stat().st_size for f in page_dir.rglob("*") if f.is_file())
+        if not dry_run:
+            shutil.rmtree(page_dir, ignore_errors=True)
+
+    # Resumable uploads abandoned past config.RESUMABLE_TTL
+    report['expired_uploads'] = ResumableUploads().expire(dry_run=dry_run)
+
+    if not dry_run:
+        # Empty shard directories
+        for pattern in ("??/??", "??"):
+            for shard in store.blobs_dir.glob(pattern):
+                if shard.is_dir() and not any(shard.iterdir()):
+                    shard.rmdir()
+
+    logger.info(
+        "Image GC%s: %d files / %d page folders, %.1f MB freed, %d kept",
+        " (dry run)" if dry_run else "", report['deleted_files'], report['deleted_page_dirs'],
+        report['deleted_bytes'] / (1024 * 1024), report['kept']
+    )
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Content-addressed image store maintenance")
+    sub = parser.add_subparsers(dest="command", required=True)
+    gc = sub.add_parser("gc", help="Delete images no result references")
+    gc.add_argument("--dry-run", action="store_true", help="Only report what would be deleted")
+    gc.add_argument("--grace-minutes", type=float, help="Keep files younger than this (default: config)")
+    args = parser.parse_args()
+
+    grace = None if args.grace_minutes is None else args.grace_minutes * 60
+    report = collect_garbage(grace_seconds=grace, dry_run=args.dry_run)
+    action = "Would delete" if args.dry_run else "Deleted"
+    print(f"{action} {report['deleted_files']} files and {report['deleted_page_dirs']} PDF page folders "
+          f"({report['deleted_bytes'] / (1024 * 1024):.1f} MB); kept {report['kept']}")
+
+
+if __name__ == "__main__":
+    main()
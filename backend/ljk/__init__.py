@@ -0,0 +1 @@
+# LJK command-line tools (python -m ljk ...), see ljk/cli.py
@@ -0,0 +1,6 @@
+# python -m ljk - see ljk/cli.py (worker processes import the CLI from there)
+import sys
+
+from ljk.cli import main
+
+sys.exit(main())
@@ -0,0 +1,211 @@
+"""
+Headless batch grader - grade scans offline, without the web server
+
+Grades every sheet in the given files, directories (recursively) and ZIP
+archives - JPG, PNG, PDF and multi-page TIFF, one sheet per page -
+through batch_grading, the same engine as the API (template routing,
+quality gate, per-template thresholds). Files are spread over --jobs
+worker processes. Results are stored like uploaded sheets (unless
+--no-store) and can be written to a CSV or JSONL file as well; a
+throughput summary is printed at the end.
+
+Exits non-zero when a file cannot be read or a page fails to grade
+(rejected sheets are reported, not failures).
+
+Usage (from backend/):
+    python -m ljk grade --exam exam_1234 scans/
+    python -m ljk grade --exam exam_1234 --jobs 4 kelas-9a.pdf kelas-9b.zip
+    python -m ljk grade --exam exam_1234 --no-store --output hasil.csv scans/
+"""
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+os.environ.setdefault("LJK_LOG_LEVEL", "ERROR")  # Rejections are in the progress lines already
+
+import config
+import batch_grading
+from batch_grading import BatchGrader
+from logging_config import setup_logging
+
+CSV_FIELDS = ['file', 'page', 'status', 'reason', 'result_id', 'correct', 'wrong', 'unanswered',
+              'total_points', 'percentage', 'answers']
+
+_grader: Optional[BatchGrader] = None  # One per worker process
+
+
+def _init_worker():
+    global _grader
+    # Parallelism comes from the worker processes; no renderer process per worker
+    config.PDF_RENDER_PROCESSES = 0
+    setup_logging()
+    _grader = BatchGrader()
+
+
+def _grade_file(exam_id: str, path: str, source: str, store: bool) -> Tuple[str, List[Dict], float]:
+    """(source, page lines, seconds) for one file; a file that cannot be read is one failed line"""
+    start = time.perf_counter()
+    compiled, template = _grader.exam_and_template(exam_id)
+    try:
+        lines = list(_grader.grade_file(exam_id, compiled, template, Path(path), store=store, source_file=source))
+    except Exception as e:
+        lines = [{"page": None, "success": False, "reason": "error", "message": str(e)}]
+    return source, lines, time.perf_counter() - start
+
+
+def collect_inputs(paths: List[Path], workdir: Path) -> Iterator[Tuple[Path, str]]:
+    """(file to grade, name it is reported under) for files, directories and ZIPs"""
+    for path in paths:
+        if path.is_dir():
+            files = sorted(p for p in path.rglob("*") if p.is_file() and not p.name.startswith('.'))
+        else:
+            files = [path]
+        for file in files:
+            suffix = file.suffix.lower()
+            if suffix == '.zip':
+                yield from _zip_members(file, workdir)
+            elif suffix in config.ALLOWED_EXTENSIONS:
+                yield file, str(file)
+
+
+def _zip_members(archive: Path, workdir: Path) -> Iterator[Tuple[Path, str]]:
+    """Sheets in a ZIP, extracted under workdir (member paths are never trusted)"""
+    target_dir = workdir / f"{len(list(workdir.iterdir()))}_{archive.stem}"
+    target_dir.mkdir()
+    with zipfile.ZipFile(archive) as zf:
+        for index, info in enumerate(zf.infolist()):
+            name = Path(info.filename.replace('\\', '/')).name
+            if info.is_dir() or name.startswith('.') or Path(name).suffix.lower() not in config.ALLOWED_EXTENSIONS:
+                continue
+            target = target_dir / f"{index}_{name}"
+            with zf.open(info) as src, open(target, 'wb') as dst:
+                while True:
+                    chunk = src.read(1024 * 1024)
+                    if not chunk:
+                        break
+                    dst.write(chunk)
+            yield target, f"{archive}:{info.filename}"
+
+
+class ResultWriter:
+    """Page lines to a CSV or JSONL file (by extension)"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.jsonl = path.suffix.lower() in ('.jsonl', '.ndjson', '.json')
+        self.file = open(path, 'w', encoding='utf-8', newline='')
+        self.csv = None if self.jsonl else csv.DictWriter(self.file, fieldnames=CSV_FIELDS)
+        if self.csv:
+            self.csv.writeheader()
+
+    def write(self, source: str, line: Dict):
+        if self.jsonl:
+            self.file.write(json.dumps({"file": source, **line}, ensure_ascii=False) + "\n")
+            return
+        score = line.get('score') or {}
+        self.csv.writerow({
+            'file': source,
+            'page': line.get('page'),
+            'status': batch_grading.outcome(line),
+            'reason': line.get('reason'),
+            'result_id': line.get('result_id'),
+            'correct': score.get('correct'),
+            'wrong': score.get('wrong'),
+            'unanswered': score.get('unanswered'),
+            'total_points': score.get('total_points'),
+            'percentage': score.get('percentage'),
+            'answers': "".join(d['student_answer'] for d in line.get('details', [])) or None,
+        })
+
+    def close(self):
+        self.file.close()
+
+
+def grade(args) -> int:
+    setup_logging()
+    try:
+        BatchGrader().exam_and_template(args.exam)
+    except LookupError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+    missing = [str(p) for p in args.paths if not p.exists()]
+    if missing:
+        print(f"error: not found: {', '.join(missing)}", file=sys.stderr)
+        return 2
+
+    writer = ResultWriter(args.output) if args.output else None
+    counts = {batch_grading.GRADED: 0, batch_grading.REJECTED: 0, batch_grading.FAILED: 0}
+    files = 0
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory(prefix="ljk-grade-") as workdir:
+        inputs = list(collect_inputs(args.paths, Path(workdir)))
+        if not inputs:
+            print("error: no JPG, PNG, PDF, TIFF or ZIP files found", file=sys.stderr)
+            return 2
+
+        executor = ProcessPoolExecutor(
+            max_workers=args.jobs, mp_context=multiprocessing.get_context("spawn"), initializer=_init_worker
+        ) if args.jobs > 1 else None
+        if executor is None:
+            _init_worker()
+            outcomes = (_grade_file(args.exam, str(path), source, not args.no_store) for path, source in inputs)
+        else:
+            futures = [executor.submit(_grade_file, args.exam, str(path), source, not args.no_store)
+                       for path, source in inputs]
+            outcomes = (future.result() for future in as_completed(futures))
+        try:
+            for source, lines, seconds in outcomes:
+                files += 1
+                file_counts = {key: 0 for key in counts}
+                for line in lines:
+                    file_counts[batch_grading.outcome(line)] += 1
+                    if writer:
+                        writer.write(source, line)
+                for key, value in file_counts.items():
+                    counts[key] += value
+                problems = [f"p{line['page']}: {line['reason']}" if line['page'] else line['message']
+                            for line in lines if not line['success']]
+                print(f"[{files}/{len(inputs)}] {source}: {file_counts[batch_grading.GRADED]} graded"
+                      f"{' - ' + ', '.join(problems) if problems else ''} ({seconds:.1f} s)", file=sys.stderr)
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=True, cancel_futures=True)
+            if writer:
+                writer.close()
+
+    elapsed = time.perf_counter() - start
+    sheets = sum(counts.values())
+    print(
+        f"{sheets} sheets from {files} files in {elapsed:.1f} s - "
+        f"{sheets / elapsed:.1f} sheets/s ({elapsed * 1000 / max(sheets, 1):.0f} ms/sheet, {args.jobs} jobs)\n"
+        f"  graded {counts[batch_grading.GRADED]}, rejected {counts[batch_grading.REJECTED]}, "
+        f"failed {counts[batch_grading.FAILED]}"
+        + (f"\n  results written to {args.output}" if args.output else "")
+    )
+    return 1 if counts[batch_grading.FAILED] else 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m ljk", description="LJK command-line tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+    grade_parser = sub.add_parser("grade", help="Grade scans (files, directories, ZIPs) for an exam")
+    grade_parser.add_argument("paths", nargs="+", type=Path, help="JPG / PNG / PDF / TIFF files, directories or ZIPs")
+    grade_parser.add_argument("--exam", required=True, help="Exam ID (answer key and template)")
+    grade_parser.add_argument("--jobs", "-j", type=int, default=1, help="Worker processes, one file each at a time")
+    grade_parser.add_argument("--output", "-o", type=Path, help="Also write page results to .csv or .jsonl")
+    grade_parser.add_argument("--no-store", action="store_true", help="Do not save results / images in storage")
+    args = parser.parse_args(argv)
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    return grade(args)
@@ -3,9 +3,10 @@
 import cv2
 import numpy as np
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, List, Optional, Tuple, Union
 import sys
 import json
+import logging
 import os
 
 # Add core directory to path
@@ -18,23 +19,46 @@ from core.ljk_manual_roi import (
     load_roi_config
 )
 import config
-from pdf_utils import pdf_to_images, is_pdf_file, get_pdf_page_count
+from column_parallel import detect_bubbles_parallel, configure_opencv_threads
+from grading import (
+    sample_intensities, decide_answers, sheet_confidence, to_uint8, MISSING_INTENSITY
+)
+from scoring import compile_answer_key, score_sheet
+from pdf_utils import is_pdf_file
+from render_cache import render_page
+from tiff_pages import is_tiff_file, read_page as read_tiff_page
+import metrics
+import quality
+from templates import Template, TemplateRegistry
+
+logger = logging.getLogger("ljk.processor")
 
 class LJKProcessor:
     """Process LJK images using ljk_manual_roi.py core"""
     
-    def __init__(self):
-        # Load ROI configuration
-        roi_path = config.TEMPLATES_DIR / "roi_config.json"
-        print(f"🔍 Loading ROI from: {roi_path}")
-        print(f"🔍 ROI path exists: {roi_path.exists()}")
-        self.roi_config = self.load_roi_config(roi_path)
+    def __init__(self, templates: Optional[TemplateRegistry] = None):
+        # Sheet layouts by template ID (reloaded when the template files change)
+        self.templates = templates or TemplateRegistry()
         
-        if self.roi_config:
-            print(f"✓ ROI loaded: x1={self.roi_config['x1']}, y1={self.roi_config['y1']}, x2={self.roi_config['x2']}, y2={self.roi_config['y2']}")
-            print(f"✓ ROI size: {self.roi_config.get('width', 0)}x{self.roi_config.get('height', 0)}")
+        default = self.templates.find()
+        if default:
+            roi = default.roi
+            logger.info(
+                "Default template ROI: x1=%d, y1=%d, x2=%d, y2=%d (%dx%d)",
+                roi['x1'], roi['y1'], roi['x2'], roi['y2'], roi.get('width', 0), roi.get('height', 0)
+            )
         else:
-            print("⚠️  Warning: ROI config not found. Please setup template first.")
+            logger.warning(
+                "ROI config not found in %s. Please setup template first.", self.templates.templates_dir
+            )
+        
+        configure_opencv_threads()
+    
+    @property
+    def roi_config(self) -> Optional[Dict]:
+        """ROI of the default template (None if not configured)"""
+        default = self.templates.find()
+        return default.roi if default else None
     
     def load_roi_config(self, config_path: Path) -> Optional[Dict]:
         """Load ROI configuration from JSON"""
@@ -45,202 +69,239 @@ class LJKProcessor:
             with open(config_path, 'r') as f:
                 return json.load(f)
         except Exception as e:
-            print(f"Error loading ROI config: {e}")
+            logger.error("Error loading ROI config: %s", e)
             return None
     
     def process_ljk(
         self, 
         image_path: str, 
-        answer_key: Dict[int, int], 
-        active_questions: int
+        answer_key: Union[Dict[int, int], np.ndarray], 
+        active_questions: int,
+        parallel: Optional[bool] = None,
+        filled_threshold: Optional[float] = None,
+        scoring: Optional[Dict[str, float]] = None,
+        template: Optional[Template] = None,
+        image: Optional[np.ndarray] = None
     ) -> Dict:
         """
         Process single LJK image or PDF
         
         Args:
             image_path: Path to LJK image or PDF file
-            answer_key: Dict of {question_num: answer_index (0-4)}
+            answer_key: Dict of {question_num: answer_index (0-4)}, or the
+                        key compiled to an int8 vector (ExamCache)
             active_questions: Number of questions to grade
+            parallel: Detect per column strip on a thread pool
+                      (default: config.PARALLEL_COLUMNS)
+            filled_threshold: Darkest bubble below this counts as filled
+                              (default: config.FILLED_THRESHOLD)
+            scoring: Points for correct / wrong / unanswered (ExamCreate.scoring)
+            template: Preferred sheet layout (default: the "default" template);
+                      the page is routed to the best matching template
+            image: Page already decoded / rendered (BGR or grayscale);
+                   image_path is then only used for debug output
         
         Returns:
-            Dict with answers, score, and marked image
+            Dict with answers, score, per-question confidence, the template
+            used, marked image and the (rows x 5) uint8 intensity matrix
+        
+        Raises:
+            SheetRejected: quality gate failed (blank, unknown layout,
+                           cropped, blurry, bubbles missing)
         """
-        if not self.roi_config:
+        if template is None:
+            template = self.templates.find()
+        if template is None:
             raise Exception("ROI configuration not found")
         
-        # Convert answer_key keys to integers (JSON loads them as strings)
-        answer_key = {int(k): v for k, v in answer_key.items()}
-        
-        # Check if PDF - convert to images
-        if is_pdf_file(image_path):
-            print(f"📄 PDF detected: {image_path}")
-            page_count = get_pdf_page_count(image_path)
-            print(f"   Pages: {page_count}")
-            
-            # Convert PDF to images
-            temp_dir = Path(image_path).parent / "temp_pdf_pages"
-            image_paths = pdf_to_images(image_path, output_dir=str(temp_dir))
-            
-            print(f"✓ Extracted {len(image_paths)} pages from PDF")
-            
-            # Process first page (or you can process all pages and combine)
-            # For now, we'll process the first page only
-            if image_paths:
-                image_path = image_paths[0]
-                print(f"   Processing first page: {image_path}")
-            else:
-                raise Exception("Failed to extract images from PDF")
+        # Answer key as int8 vector over the active questions (-1 = no key)
+        if isinstance(answer_key, np.ndarray):
+            key_vec = answer_key
+        else:
+            key_vec = compile_answer_key(answer_key, active_questions)
         
-        # Read image
-        image = cv2.imread(image_path)
+        if image is not None:
+            if image.ndim == 2:
+                image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+        elif is_pdf_file(image_path):
+            # First page, rendered at the templates' DPI (cached by PDF hash)
+            logger.info("PDF detected: %s", image_path)
+            with metrics.stage('render'):
+                image = cv2.cvtColor(render_page(image_path, 0), cv2.COLOR_GRAY2BGR)
+        elif is_tiff_file(image_path):
+            # First page, scaled to the templates' DPI
+            with metrics.stage('decode'):
+                image = cv2.cvtColor(read_tiff_page(image_path, 0), cv2.COLOR_GRAY2BGR)
+        else:
+            # Read image
+            with metrics.stage('decode'):
+                image = cv2.imread(image_path)
         if image is None:
             raise Exception(f"Cannot read image: {image_path}")
         
+        # Quality gate + layout match before detection (mixed batches,
+        # unreadable or unknown sheets); may turn the page upright
+        with metrics.stage('quality'):
+            if config.QUALITY_GATE:
+                image, template, sheet_quality = quality.inspect(image, self.templates, template)
+            else:
+                template, template_match = self.templates.identify(image, template)
+                sheet_quality = {'template_match': template_match}
+        roi = template.roi
+        
+        if parallel is None:
+            parallel = config.PARALLEL_COLUMNS
+        
         # Detect bubbles in ROI
-        result = find_answer_bubbles_manual_roi(image_path, self.roi_config)
+        with metrics.stage('detect'):
+            if parallel:
+                result = detect_bubbles_parallel(image, roi)
+            else:
+                result = find_answer_bubbles_manual_roi(
+                    image_path, roi, save_debug=config.DEBUG_IMAGES, image=image
+                )
         if result is None:
             raise Exception("Failed to detect bubbles")
         
         bubbles, img, thresh, roi_info = result
+        metrics.BUBBLES_DETECTED.observe(len(bubbles))
+        if config.QUALITY_GATE:
+            quality.check_bubbles(len(bubbles), template, sheet_quality)
         
         if len(bubbles) == 0:
             raise Exception("No bubbles detected")
         
         # Organize into columns
-        column_rows = organize_bubbles_into_columns(bubbles)
+        with metrics.stage('organize'):
+            column_rows = organize_bubbles_into_columns(bubbles)
+        
+        if filled_threshold is None:
+            filled_threshold = template.filled_threshold
+        if filled_threshold is None:
+            filled_threshold = config.FILLED_THRESHOLD
         
         # Log detection summary
-        print(f"✓ Bubble detected: {len(bubbles)} total")
-        print(f"✓ Organized into {len(column_rows)} columns")
-        print(f"✓ Using FILLED_THRESHOLD: {config.FILLED_THRESHOLD}")
-        for col_idx, rows in enumerate(column_rows):
-            rows_with_5 = sum(1 for row in rows if len(row) == 5)
-            rows_with_4 = sum(1 for row in rows if len(row) == 4)
-            rows_with_less = sum(1 for row in rows if len(row) < 4)
-            print(f"  Kolom {col_idx+1}: {len(rows)} rows total (5-bubble: {rows_with_5}, 4-bubble: {rows_with_4}, <4: {rows_with_less})")
+        logger.info(
+            "Bubbles detected: %d in %d columns (threshold %s)",
+            len(bubbles), len(column_rows), filled_threshold,
+            extra={'bubbles': len(bubbles), 'columns': len(column_rows)}
+        )
+        if logger.isEnabledFor(logging.DEBUG):
+            for col_idx, rows in enumerate(column_rows):
+                rows_with_5 = sum(1 for row in rows if len(row) == 5)
+                rows_with_4 = sum(1 for row in rows if len(row) == 4)
+                rows_with_less = sum(1 for row in rows if len(row) < 4)
+                logger.debug(
+                    "Kolom %d: %d rows total (5-bubble: %d, 4-bubble: %d, <4: %d)",
+                    col_idx + 1, len(rows), rows_with_5, rows_with_4, rows_with_less
+                )
         
-        # Extract answers
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        student_answers = {}
-        unanswered = []
+        rows = self.collect_rows(column_rows)
         
-        question_num = 0
-        for col_idx, rows in enumerate(column_rows):
-            for row_idx, row in enumerate(rows):
-                if question_num >= active_questions:
-                    break
-                
-                # Skip rows with less than 4 bubbles (likely detection error)
-                if len(row) < 4:
-                    continue
-                
-                # Pad row to 5 bubbles if needed (add dummy bubbles for missing ones)
-                while len(row) < 5:
-                    row.append({'x': 0, 'y': 0, 'w': 0, 'h': 0})  # Dummy bubble
-                
-                # Find filled bubble (lowest intensity = darkest)
-                min_intensity = 255
-                max_intensity = 0
-                bubbled_idx = 0
-                intensities = []
-                
-                for j, bubble in enumerate(row):
-                    x, y, w, h = bubble['x'], bubble['y'], bubble['w'], bubble['h']
-                    roi_bubble = gray[y:y+h, x:x+w]
-                    
-                    if roi_bubble.size == 0:
-                        continue
-                    
-                    intensity = np.mean(roi_bubble)
-                    intensities.append(intensity)
-                    
-                    if intensity < min_intensity:
-                        min_intensity = intensity
-                        bubbled_idx = j
-                    
-                    if intensity > max_intensity:
-                        max_intensity = intensity
-                
-                # Check if actually filled
-                # Bubble yang benar-benar diisi pensil punya intensity < 150
-                # Bubble kosong (tidak diisi) punya intensity 203-208
-                # Jadi cek: min_intensity < 150 untuk memastikan benar-benar diisi
-                intensity_diff = max_intensity - min_intensity
-                
-                if min_intensity < 150:  # Benar-benar diisi pensil
-                    student_answers[question_num] = bubbled_idx
-                    # Debug logging
-                    if question_num < 5 or question_num >= 50:
-                        print(f"  Q{question_num+1}: FILLED (min={min_intensity:.1f}, max={max_intensity:.1f}, diff={intensity_diff:.1f}, answer={chr(65+bubbled_idx)})")
-                else:  # Tidak diisi (intensity terlalu tinggi)
-                    unanswered.append(question_num)
-                    # Debug logging
-                    if question_num < 5 or question_num >= 50:
-                        print(f"  Q{question_num+1}: UNANSWERED (min={min_intensity:.1f}, max={max_intensity:.1f}, diff={intensity_diff:.1f})")
-                
-                question_num += 1
+        # Sample intensity of every bubble (lowest intensity = darkest = filled)
+        with metrics.stage('sample'):
+            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+            intensities = sample_intensities(gray, rows)
+        
+        # Bubble yang benar-benar diisi pensil punya intensity < threshold (150)
+        # Bubble kosong (tidak diisi) punya intensity 203-208
+        decided = decide_answers(intensities, filled_threshold)
+        
+        # Answers as int8 vector over active questions (-1 = unanswered / not read)
+        n_read = min(len(rows), active_questions)
+        answer_vector = np.full(active_questions, -1, dtype=np.int8)
+        answer_vector[:n_read] = decided[:n_read]
+        read_mask = np.arange(active_questions) < n_read
         
         # Calculate score
-        correct = 0
-        wrong = 0
-        details = []
+        with metrics.stage('score'):
+            fields = score_sheet(
+                answer_vector,
+                read_mask,
+                key_vec,
+                scoring
+            )
+        student_answers, unanswered = fields['answers'], fields['unanswered']
         
-        for q_num in range(active_questions):
-            key = answer_key.get(q_num, -1)
-            student_ans = student_answers.get(q_num, -1)
-            
-            is_correct = (student_ans == key and student_ans != -1)
-            
-            if is_correct:
-                correct += 1
-            elif student_ans != -1:
-                wrong += 1
-            
-            details.append({
-                'question_num': q_num + 1,
-                'answer_key': chr(65 + key) if key >= 0 else '?',
-                'student_answer': chr(65 + student_ans) if student_ans >= 0 else '-',
-                'is_correct': is_correct,
-                'points': 1.0 if is_correct else 0.0
-            })
+        # Per-question intensity trace (debug only - skipped entirely otherwise)
+        if logger.isEnabledFor(logging.DEBUG):
+            for q in range(n_read):
+                row_values = intensities[q][intensities[q] < MISSING_INTENSITY]
+                if row_values.size == 0:
+                    continue
+                min_intensity, max_intensity = row_values.min(), row_values.max()
+                answer = chr(65 + student_answers[q]) if q in student_answers else '-'
+                logger.debug(
+                    "Q%d: %s (min=%.1f, max=%.1f, diff=%.1f, answer=%s)",
+                    q + 1, 'FILLED' if q in student_answers else 'UNANSWERED',
+                    min_intensity, max_intensity, max_intensity - min_intensity, answer
+                )
         
         # Mark image
-        output_image = self.mark_image(
-            img, 
-            column_rows, 
-            student_answers, 
-            unanswered, 
-            answer_key, 
-            active_questions,
-            gray
-        )
+        with metrics.stage('mark'):
+            output_image = self.mark_image(
+                img, 
+                column_rows, 
+                student_answers, 
+                unanswered, 
+                key_vec, 
+                active_questions,
+                gray
+            )
         
         return {
             'answers': student_answers,
             'unanswered': unanswered,
-            'score': {
-                'correct': correct,
-                'wrong': wrong,
-                'unanswered': len(unanswered),
-                'total': active_questions,
-                'percentage': (correct / active_questions * 100) if active_questions > 0 else 0
-            },
-            'details': details,
+            'score': fields['score'],
+            'details': fields['details'],
+            'confidence': sheet_confidence(intensities, filled_threshold, active_questions),
+            'intensities': to_uint8(intensities),
+            'filled_threshold': filled_threshold,
+            'template_id': template.template_id,
+            'template_version': template.version,
+            'template_match': sheet_quality['template_match'],
+            'quality': sheet_quality,
             'marked_image': output_image
         }
     
+    def collect_rows(self, column_rows: List) -> List[List[Dict]]:
+        """
+        Flatten column rows into question order, padded to 5 bubbles.
+        
+        All rows are kept (up to MAX_QUESTIONS), so the stored intensity
+        matrix still covers questions if active_questions is raised later.
+        """
+        rows = []
+        for col_rows in column_rows:
+            for row in col_rows:
+                if len(rows) >= config.MAX_QUESTIONS:
+                    break
+                
+                # Skip rows with less than 4 bubbles (likely detection error)
+                if len(row) < 4:
+                    continue
+                
+                # Pad row to 5 bubbles if needed (add dummy bubbles for missing ones)
+                while len(row) < 5:
+                    row.append({'x': 0, 'y': 0, 'w': 0, 'h': 0})  # Dummy bubble
+                
+                rows.append(row)
+        
+        return rows
+    
     def mark_image(
         self,
         image: np.ndarray,
         column_rows: List,
         student_answers: Dict,
         unanswered: List,
-        answer_key: Dict,
+        key_vec: np.ndarray,
         active_questions: int,
         gray: np.ndarray
     ) -> np.ndarray:
         """Mark image with colored rectangles"""
         output = image.copy()
+        keys = key_vec.tolist()
         question_num = 0
         
         for col_idx, rows in enumerate(column_rows):
@@ -267,7 +328,7 @@ class LJKProcessor:
                 else:
                     # Mark answered bubble
                     ans_idx = student_answers[question_num]
-                    key = answer_key.get(question_num, -1)
+                    key = keys[question_num]
                     is_correct = (ans_idx == key)
                     
                     color = (0, 255, 0) if is_correct else (0, 0, 255)
@@ -0,0 +1,104 @@
+# Logging - leveled, structured (JSON lines) and non-blocking
+#
+# Modules log through logging.getLogger("ljk.<module>"). setup_logging()
+# puts a QueueHandler on the "ljk" logger, so the grading thread only
+# enqueues the record; formatting and console I/O happen on the
+# QueueListener thread. Every record carries the correlation ID of the
+# request it was logged in.
+
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Optional
+
+import config
+
+correlation_id: ContextVar[str] = ContextVar("correlation_id", default="-")
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+# LogRecord attributes that are not user supplied `extra` fields
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "correlation_id"}
+
+
+class CorrelationFilter(logging.Filter):
+    """Stamp the record with the current correlation ID (runs in the logging thread of the caller)"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.correlation_id = correlation_id.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; `extra={...}` fields are included as keys"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'correlation_id': getattr(record, 'correlation_id', '-'),
+            'msg': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # In-process queue: no need to pre-format / pickle, the message is
+        # built lazily on the listener thread
+        return record
+
+
+def setup_logging(level: Optional[str] = None, fmt: Optional[str] = None) -> logging.Logger:
+    """
+    Configure the "ljk" logger once (idempotent).
+
+    level: LJK_LOG_LEVEL (default INFO); fmt: "json" or "text" (LJK_LOG_FORMAT)
+    """
+    global _listener
+    logger = logging.getLogger("ljk")
+    if _listener is not None:
+        return logger
+
+    level = (level or config.LOG_LEVEL).upper()
+    fmt = fmt or config.LOG_FORMAT
+
+    console = logging.StreamHandler(sys.stderr)
+    if fmt == "json":
+        console.setFormatter(JsonFormatter())
+    else:
+        console.setFormatter(logging.Formatter(
+            "%(asctime)s %(levelname)-7s [%(correlation_id)s] %(name)s: %(message)s"
+        ))
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    handler = _QueueHandler(log_queue)
+    handler.addFilter(CorrelationFilter())
+
+    logger.setLevel(level)
+    logger.addHandler(handler)
+    logger.propagate = False
+
+    _listener = logging.handlers.QueueListener(log_queue, console, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+    return logger
+
+
+def stop_logging():
+    """Flush and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -1,24 +1,41 @@
 # FastAPI Main Application
 
-from fastapi import FastAPI, File, UploadFile, HTTPException, Form, Query
+from fastapi import FastAPI, File, UploadFile, HTTPException, Form, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from pathlib import Path
-from typing import List, Optional
+from typing import Dict, List, Optional
 import uuid
-import shutil
-import cv2
 import zipfile
 import json
+import logging
 import os
+import time
 from datetime import datetime
 
-from models import ExamCreate, ExamResponse, ProcessLJKRequest, ResultResponse
+from models import ExamCreate, ExamResponse, ProcessLJKRequest, ResultResponse, ResumableUploadCreate
 from storage import StorageService
+from exam_cache import ExamCache
 from ljk_processor import LJKProcessor
-from pdf_converter import convert_pdf_to_jpg
+from render_cache import render_page
+from rethreshold import rethreshold_exam
+from regrade import regrade_exam, needs_regrade, rescore_result
+from review import build_review_queue
+from templates import TemplateRegistry
+from quality import SheetRejected
 import config
+import metrics
+import profiling
+import uploads
+import grading_cache
+import image_store
+import batch_grading
+import tiff_pages
+from logging_config import setup_logging, correlation_id
+
+setup_logging()
+logger = logging.getLogger("ljk.api")
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -36,13 +53,65 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Upload size - refuse oversized bodies from Content-Length before the form is parsed
+@app.middleware("http")
+async def limit_upload_size(request: Request, call_next):
+    content_length = request.headers.get("content-length")
+    if (
+        request.method == "POST"
+        and request.headers.get("content-type", "").startswith("multipart/form-data")
+        and content_length and content_length.isdigit()
+        and int(content_length) > config.MAX_UPLOAD_SIZE + uploads.FORM_OVERHEAD
+    ):
+        error = uploads.too_large()
+        return JSONResponse(status_code=413, content={"detail": {"reason": error.reason, "message": str(error)}})
+    return await call_next(request)
+
+# Request metrics - route template as label so /api/results/{result_id} is one series
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    start = time.perf_counter()
+    status = 500
+    metrics.HTTP_IN_PROGRESS.inc()
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        metrics.HTTP_IN_PROGRESS.dec()
+        route = request.scope.get("route")
+        route_path = getattr(route, "path", "unmatched")
+        metrics.HTTP_REQUESTS.inc(method=request.method, route=route_path, status=status)
+        metrics.HTTP_DURATION.observe(time.perf_counter() - start, method=request.method, route=route_path)
+
+# Correlation ID - taken from X-Request-ID or generated, attached to every log line
+@app.middleware("http")
+async def assign_correlation_id(request: Request, call_next):
+    request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex[:12]
+    token = correlation_id.set(request_id)
+    try:
+        response = await call_next(request)
+        response.headers["X-Request-ID"] = request_id
+        return response
+    finally:
+        correlation_id.reset(token)
+
 # Initialize services
 storage = StorageService()
-processor = LJKProcessor()
+templates = TemplateRegistry()
+processor = LJKProcessor(templates)
+profile_store = profiling.ProfileStore()
+result_cache = grading_cache.GradingCache()
+images = image_store.ImageStore()
+resumable_uploads = uploads.ResumableUploads()
+exam_cache = ExamCache(storage)
+grader = batch_grading.BatchGrader(storage, templates, processor, images, exam_cache)
+metrics.GRADING_WORKERS.set(config.PROCESS_WORKERS)
 
 # Mount static files
 app.mount("/uploads", StaticFiles(directory=str(config.UPLOADS_DIR)), name="uploads")
 app.mount("/processed", StaticFiles(directory=str(config.PROCESSED_DIR)), name="processed")
+app.mount(image_store.BLOB_URL_PREFIX, StaticFiles(directory=str(config.BLOBS_DIR)), name="blobs")
 
 # ============ HEALTH CHECK ============
 
@@ -61,17 +130,27 @@ async def health_check():
         "roi_configured": processor.roi_config is not None
     }
 
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus text exposition of request, grading, storage and export metrics"""
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
 # ============ EXAM ENDPOINTS ============
 
 @app.post("/api/exams", response_model=ExamResponse)
 async def create_exam(exam: ExamCreate):
     """Create new exam configuration"""
     try:
+        if not templates.exists(exam.template_id):
+            raise HTTPException(status_code=400, detail=f"Unknown template: {exam.template_id}")
+        
         exam_data = exam.model_dump(by_alias=True)
         exam_id = storage.save_exam(exam_data)
         
         saved_exam = storage.load_exam(exam_id)
         return saved_exam
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -96,6 +175,7 @@ async def get_exam(exam_id: str):
 async def delete_exam(exam_id: str):
     """Delete exam and all associated results"""
     success = storage.delete_exam(exam_id)
+    exam_cache.invalidate(exam_id)
     if not success:
         raise HTTPException(status_code=404, detail="Exam not found")
     return {"message": "Exam deleted successfully"}
@@ -107,15 +187,34 @@ async def update_exam(exam_id: str, exam: ExamCreate):
         existing_exam = storage.load_exam(exam_id)
         if not existing_exam:
             raise HTTPException(status_code=404, detail="Exam not found")
+        if not templates.exists(exam.template_id):
+            raise HTTPException(status_code=400, detail=f"Unknown template: {exam.template_id}")
         
         exam_data = exam.model_dump(by_alias=True)
         exam_data['exam_id'] = exam_id
         exam_data['created_at'] = existing_exam.get('created_at')
+        if 'filled_threshold' in existing_exam:
+            exam_data['filled_threshold'] = existing_exam['filled_threshold']
         
         success = storage.update_exam(exam_id, exam_data)
+        exam_cache.invalidate(exam_id)
         if not success:
             raise HTTPException(status_code=500, detail="Failed to update exam")
         
+        # Rescore stored results if the key, active questions or weights changed;
+        # if that fails the old exam is put back, so key and scores stay consistent
+        if needs_regrade(existing_exam, exam_data):
+            try:
+                regrade_exam(storage, exam_id)
+            except Exception as e:
+                logger.exception("Regrade failed for exam %s; update rolled back", exam_id)
+                storage.update_exam(exam_id, existing_exam)
+                exam_cache.invalidate(exam_id)
+                raise HTTPException(
+                    status_code=500,
+                    detail={"reason": "regrade_failed", "message": f"Exam not updated: regrade failed ({e})"}
+                )
+        
         updated_exam = storage.load_exam(exam_id)
         return updated_exam
     except HTTPException:
@@ -125,14 +224,62 @@ async def update_exam(exam_id: str, exam: ExamCreate):
 
 # ============ UPLOAD & PROCESS ============
 
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+
+def _idempotent_replay(idempotency_key: Optional[str], exam_id: str) -> Optional[Dict]:
+    """Stored response for a retried Idempotency-Key (409 if reused for another exam)"""
+    if not idempotency_key:
+        return None
+    entry = result_cache.lookup_idempotency(idempotency_key)
+    if not entry:
+        return None
+    if entry['exam_id'] != exam_id:
+        raise HTTPException(status_code=409, detail="Idempotency-Key already used for another exam")
+    result = storage.load_result(entry['result_id'])
+    if not result:
+        return None
+    metrics.GRADING_CACHE.inc(outcome='replay')
+    return batch_grading.result_response(result, cached=True)
+
+def _find_graded(exam_id: str, sha256: str, exam_key_version: str):
+    """(stored result, freshness) of an earlier upload of the same image, or (None, None)"""
+    if not config.GRADING_CACHE:
+        return None, None
+    result_id = result_cache.lookup(exam_id, sha256)
+    result = storage.load_result(result_id) if result_id else None
+    if result is None:
+        if result_id:
+            result_cache.forget(exam_id, sha256)
+        metrics.GRADING_CACHE.inc(outcome='miss')
+        return None, None
+    state = grading_cache.freshness(result, exam_key_version, templates)
+    metrics.GRADING_CACHE.inc(outcome=state)
+    return result, state
+
+def _exam_and_template(exam_id: str):
+    """(exam, template) for grading; 404 / 400 when either is missing"""
+    try:
+        return grader.exam_and_template(exam_id)
+    except batch_grading.ExamNotFound:
+        raise HTTPException(status_code=404, detail="Exam not found")
+    except batch_grading.TemplateUnavailable as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def _upload_error(e: uploads.UploadError) -> HTTPException:
+    if e.status_code in (400, 413):
+        metrics.SHEETS_REJECTED.inc(reason=e.reason)
+    return HTTPException(status_code=e.status_code, detail={"reason": e.reason, "message": str(e), **e.details})
+
 @app.post("/api/process-ljk")
 async def process_ljk(
+    request: Request,
     exam_id: str = Form(...),
     file: UploadFile = File(...),
     student_name: Optional[str] = Form(None),
     student_number: Optional[str] = Form(None)
 ):
     """Upload and process LJK image or PDF"""
+    grading_start = None
     try:
         # Validate file
         if not file.filename:
@@ -146,29 +293,59 @@ async def process_ljk(
             )
         
         # Load exam
-        exam = storage.load_exam(exam_id)
-        if not exam:
-            raise HTTPException(status_code=404, detail="Exam not found")
+        compiled, template = _exam_and_template(exam_id)
+        exam = compiled.exam
+        
+        # Client retry: replay the first response without reading the upload
+        idempotency_key = request.headers.get(IDEMPOTENCY_HEADER)
+        replay = _idempotent_replay(idempotency_key, exam_id)
+        if replay:
+            return replay
+        
+        metrics.GRADING_QUEUE.inc()
+        grading_start = time.perf_counter()
         
-        # Save uploaded file
+        # Stream uploaded file to disk (size limit, SHA-256, content sniffing)
         upload_id = uuid.uuid4().hex[:12]
-        file_path = config.UPLOADS_DIR / f"{upload_id}_{file.filename}"
+        upload = await uploads.save_upload(
+            file, config.UPLOADS_DIR, f"{upload_id}_{uploads.safe_filename(file.filename)}"
+        )
+        file_path = upload.path
         
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        # Same scan graded before for this exam: reuse it (re-scored if only
+        # the key changed) without decoding; a stale one is graded again in place
+        cached, cache_state = _find_graded(exam_id, upload.sha256, compiled.key_version)
+        replace_result_id = None
+        if cache_state == grading_cache.STALE:
+            replace_result_id = cached['result_id']
+        elif cached is not None:
+            file_path.unlink(missing_ok=True)
+            renamed = False
+            for field, value in (('student_name', student_name), ('student_number', student_number)):
+                if value is not None and cached.get(field) != value:
+                    cached[field] = value
+                    renamed = True
+            if cache_state == grading_cache.RESCORE:
+                cached = rescore_result(storage, exam, cached)
+            elif renamed:
+                storage.update_result(cached['result_id'], cached)
+            if idempotency_key:
+                result_cache.store_idempotency(idempotency_key, exam_id, cached['result_id'])
+            metrics.SHEETS_GRADED.inc(outcome='cached')
+            return batch_grading.result_response(cached, cached=True)
         
-        # Convert PDF to JPG if needed
-        processing_image_path = str(file_path)
-        if file_ext == '.pdf':
+        # Render the first PDF page at the templates' DPI (cached by PDF hash);
+        # the first TIFF page is decoded and scaled to it
+        page_image = None
+        if file_ext in tiff_pages.TIFF_EXTENSIONS:
             try:
-                print(f"📄 Converting PDF to JPG: {file.filename}")
-                jpg_path = convert_pdf_to_jpg(
-                    str(file_path),
-                    output_dir=str(config.UPLOADS_DIR),
-                    dpi=300
-                )
-                processing_image_path = jpg_path
-                print(f"✅ PDF converted successfully")
+                page_image = tiff_pages.read_page(file_path, 0)
+            except Exception as tiff_error:
+                raise HTTPException(status_code=400, detail=f"Failed to read TIFF: {tiff_error}")
+        elif file_ext == '.pdf':
+            try:
+                logger.info("Rendering PDF: %s", file.filename)
+                page_image = render_page(file_path, 0, sha256=upload.sha256)
             except Exception as pdf_error:
                 raise HTTPException(
                     status_code=500,
@@ -176,46 +353,235 @@ async def process_ljk(
                 )
         
         # Process LJK
-        result = processor.process_ljk(
-            processing_image_path,
-            exam['answer_key'],
-            exam['active_questions']
-        )
+        with profiling.maybe_profile(request.headers, 'process-ljk', file.filename, profile_store) as profile:
+            result = processor.process_ljk(
+                str(file_path),
+                compiled.key_vec,
+                exam['active_questions'],
+                filled_threshold=exam.get('filled_threshold'),
+                scoring=exam.get('scoring'),
+                template=template,
+                image=page_image
+            )
         
-        # Save marked image
-        marked_path = config.PROCESSED_DIR / f"marked_{upload_id}.jpg"
-        cv2.imwrite(str(marked_path), result['marked_image'])
+        persist_start = time.perf_counter()
         
-        # Determine display paths
-        if file_ext == '.pdf':
-            # Use converted JPG for display
-            display_image_path = f"/uploads/{Path(processing_image_path).name}"
+        # Scan and marked image go to the content-addressed store; the
+        # upload (and, for a PDF, the page render) is consumed or dropped
+        if page_image is not None:
+            # Rendered page as JPG for display
+            image_blob = grader.put_image(page_image)
+            file_path.unlink(missing_ok=True)
         else:
-            display_image_path = f"/uploads/{file_path.name}"
+            image_blob = images.put_file(file_path, file_ext, upload.sha256)
         
         # Save result
-        result_data = {
-            'exam_id': exam_id,
-            'student_name': student_name,
-            'student_number': student_number,
-            'answers': result['answers'],
-            'unanswered': result['unanswered'],
-            'score': result['score'],
-            'details': result['details'],
-            'image_path': display_image_path,
-            'processed_image_path': f"/processed/{marked_path.name}"
-        }
+        result_data = grader.result_record(
+            exam_id, result, image_blob, grader.put_image(result['marked_image']),
+            image_sha256=upload.sha256,
+            key_version=compiled.key_version,
+            student_name=student_name,
+            student_number=student_number
+        )
         
-        result_id = storage.save_result(result_data)
+        result_id = storage.save_result(
+            result_data, intensities=result['intensities'], result_id=replace_result_id
+        )
+        if config.GRADING_CACHE:
+            result_cache.store(exam_id, upload.sha256, result_id)
+        if idempotency_key:
+            result_cache.store_idempotency(idempotency_key, exam_id, result_id)
+        metrics.STAGE_DURATION.observe(time.perf_counter() - persist_start, stage='persist')
+        metrics.SHEETS_GRADED.inc(outcome='success')
+        logger.info(
+            "Graded %s: %s%%", result_id, round(result['score']['percentage'], 2),
+            extra={'exam_id': exam_id, 'result_id': result_id,
+                   'duration_ms': round((time.perf_counter() - grading_start) * 1000, 1)}
+        )
         
-        return {
-            "success": True,
-            "result_id": result_id,
-            "score": result['score'],
-            "details": result['details'],
-            "marked_image_url": result_data['processed_image_path']
-        }
+        response = batch_grading.result_response(result_data)
+        if profile.profile_id:
+            response["profile_id"] = profile.profile_id
+        return response
         
+    except HTTPException:
+        raise
+    except uploads.UploadError as e:
+        metrics.SHEETS_GRADED.inc(outcome='rejected')
+        raise _upload_error(e)
+    except SheetRejected as e:
+        # Rejected sheets leave no upload behind
+        file_path.unlink(missing_ok=True)
+        metrics.SHEETS_GRADED.inc(outcome='rejected')
+        metrics.SHEETS_REJECTED.inc(reason=e.reason)
+        logger.warning("Sheet rejected for exam %s: %s", exam_id, e, extra={'reason': e.reason})
+        raise HTTPException(
+            status_code=422,
+            detail={"reason": e.reason, "message": str(e), **e.details}
+        )
+    except Exception as e:
+        if grading_start is not None:
+            metrics.SHEETS_GRADED.inc(outcome='error')
+            logger.exception("Grading failed for exam %s", exam_id)
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if grading_start is not None:
+            metrics.GRADING_QUEUE.dec()
+            metrics.GRADING_BUSY.inc(time.perf_counter() - grading_start)
+
+BATCH_EXTENSIONS = {'.pdf', *tiff_pages.TIFF_EXTENSIONS}  # Multi-page documents, one sheet per page
+
+@app.post("/api/process-ljk/batch")
+async def process_ljk_batch(
+    exam_id: str = Form(...),
+    file: UploadFile = File(...)
+):
+    """
+    Grade every page of a multi-page PDF or TIFF (one sheet per page).
+    
+    Streams NDJSON: one line per page as soon as it is graded - the
+    process-ljk response plus "page", or {"page", "success": false,
+    "reason", "message"} for a rejected page - then a summary line
+    {"done": true, "pages", "graded", "rejected", "failed"}.
+    """
+    if not file.filename:
+        raise HTTPException(status_code=400, detail="No file provided")
+    if Path(file.filename).suffix.lower() not in BATCH_EXTENSIONS:
+        raise HTTPException(status_code=400, detail="Batch grading expects a PDF or TIFF")
+    
+    compiled, template = _exam_and_template(exam_id)
+    try:
+        upload = await uploads.save_upload(
+            file, config.UPLOADS_DIR, f"{uuid.uuid4().hex[:12]}_{uploads.safe_filename(file.filename)}"
+        )
+    except uploads.UploadError as e:
+        raise _upload_error(e)
+    return _grade_document(exam_id, compiled, template, upload, file.filename)
+
+def _grade_document(exam_id: str, compiled, template, upload: uploads.StoredUpload, filename: str) -> StreamingResponse:
+    """NDJSON stream grading every page of a stored PDF / TIFF upload (consumed)"""
+    try:
+        page_count = batch_grading.page_count(upload.path)
+    except Exception as e:
+        upload.path.unlink(missing_ok=True)
+        raise HTTPException(status_code=400, detail=f"Failed to open {upload.kind.upper()}: {e}")
+    
+    logger.info("Batch grading %s: %d pages", filename, page_count, extra={'exam_id': exam_id})
+    
+    def stream():
+        counts = {batch_grading.GRADED: 0, batch_grading.REJECTED: 0, batch_grading.FAILED: 0}
+        try:
+            for line in grader.grade_file(
+                exam_id, compiled, template, upload.path, sha256=upload.sha256, source_file=filename
+            ):
+                counts[batch_grading.outcome(line)] += 1
+                yield json.dumps(line) + "\n"
+        except Exception as e:
+            logger.exception("Batch grading failed for exam %s", exam_id)
+            yield json.dumps({"done": False, "error": str(e), **counts}) + "\n"
+            return
+        finally:
+            upload.path.unlink(missing_ok=True)
+        yield json.dumps({"done": True, "pages": page_count, **counts}) + "\n"
+    
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+# ============ RESUMABLE UPLOADS ============
+
+CHUNK_SHA256_HEADER = "X-Chunk-SHA256"
+
+@app.post("/api/uploads", status_code=201)
+async def create_resumable_upload(upload: ResumableUploadCreate):
+    """Start a resumable upload of a PDF / TIFF; PUT its chunks, then finalize it"""
+    try:
+        if Path(upload.filename).suffix.lower() not in BATCH_EXTENSIONS:
+            raise uploads.UploadError('unsupported_content', "Resumable uploads are graded as PDF or TIFF batches")
+        return resumable_uploads.create(upload.filename, upload.size, upload.sha256)
+    except uploads.UploadError as e:
+        raise _upload_error(e)
+
+@app.get("/api/uploads/{upload_id}")
+async def get_resumable_upload(upload_id: str):
+    """Bytes received so far ("offset"): where an interrupted upload resumes"""
+    try:
+        return resumable_uploads.status(upload_id)
+    except uploads.UploadError as e:
+        raise _upload_error(e)
+
+@app.put("/api/uploads/{upload_id}")
+async def put_upload_chunk(
+    upload_id: str,
+    request: Request,
+    offset: int = Query(..., ge=0, description="Byte offset of this chunk; must equal the stored offset")
+):
+    """Append the raw request body at `offset` (409 with the stored offset otherwise)"""
+    try:
+        return await resumable_uploads.write_chunk(
+            upload_id, offset, request.stream(), request.headers.get(CHUNK_SHA256_HEADER)
+        )
+    except uploads.UploadError as e:
+        raise _upload_error(e)
+
+@app.post("/api/uploads/{upload_id}/finalize")
+async def finalize_upload(upload_id: str, exam_id: str = Form(...)):
+    """
+    Verify the complete upload and grade it right away: a PDF or TIFF
+    streams NDJSON like /api/process-ljk/batch
+    """
+    compiled, template = _exam_and_template(exam_id)
+    try:
+        status = resumable_uploads.status(upload_id)
+        upload = resumable_uploads.finalize(
+            upload_id, config.UPLOADS_DIR, f"{uuid.uuid4().hex[:12]}_{status['filename']}"
+        )
+    except uploads.UploadError as e:
+        raise _upload_error(e)
+    return _grade_document(exam_id, compiled, template, upload, status['filename'])
+
+@app.delete("/api/uploads/{upload_id}")
+async def cancel_upload(upload_id: str):
+    """Discard an unfinished upload"""
+    try:
+        resumable_uploads.status(upload_id)
+    except uploads.UploadError as e:
+        raise _upload_error(e)
+    resumable_uploads.discard(upload_id)
+    return {"message": "Upload discarded"}
+
+@app.post("/api/exams/{exam_id}/rethreshold")
+async def rethreshold_exam_results(
+    exam_id: str,
+    threshold: float = Query(..., ge=0, le=255, description="Darkest bubble below this = filled"),
+    dry_run: bool = Query(False)
+):
+    """Re-decide all stored answers of an exam under a new filled threshold"""
+    try:
+        return rethreshold_exam(storage, exam_id, threshold, dry_run)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/exams/{exam_id}/regrade")
+async def regrade_exam_results(exam_id: str):
+    """Rescore all stored results of an exam against its current answer key"""
+    try:
+        return regrade_exam(storage, exam_id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/exams/{exam_id}/review")
+async def get_review_queue(
+    exam_id: str,
+    max_confidence: float = Query(config.REVIEW_CONFIDENCE, ge=0, le=1)
+):
+    """List only the low-confidence / flagged questions of an exam for manual review"""
+    try:
+        return build_review_queue(storage, exam_id, max_confidence)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -258,13 +624,15 @@ async def delete_result(result_id: str):
 # ============ EXPORT ============
 
 @app.get("/api/exams/{exam_id}/export/excel")
-async def export_to_excel(exam_id: str):
+async def export_to_excel(exam_id: str, request: Request):
     """Export exam results to Excel"""
     try:
         from export_service import ExportService
         
-        export_service = ExportService(storage)
-        file_path = export_service.export_to_excel(exam_id)
+        export_service = ExportService(storage, exam_cache)
+        with metrics.EXPORT_DURATION.time(format='excel'), \
+                profiling.maybe_profile(request.headers, 'export-excel', exam_id, profile_store) as profile:
+            file_path = export_service.export_to_excel(exam_id)
         
         # Ensure file exists
         if not file_path.exists():
@@ -276,13 +644,59 @@ async def export_to_excel(exam_id: str):
             media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
             headers={
                 "Content-Disposition": f"attachment; filename={file_path.name}",
-                "Cache-Control": "no-cache"
+                "Cache-Control": "no-cache",
+                **({"X-LJK-Profile-Id": profile.profile_id} if profile.profile_id else {})
             }
         )
     except Exception as e:
-        print(f"Export error: {e}")
+        logger.exception("Export error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
+# ============ PROFILING ============
+
+def require_admin(request: Request):
+    if not config.PROFILE_ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Profiling API disabled (LJK_ADMIN_TOKEN not set)")
+    if not profiling.is_admin(request.headers):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+@app.get("/api/profiles")
+async def list_profiles(request: Request):
+    """List stored request profiles, newest first"""
+    require_admin(request)
+    return profile_store.list()
+
+@app.get("/api/profiles/{profile_id}")
+async def get_profile(profile_id: str, request: Request):
+    """Profile report: top functions, peak memory and allocation sites"""
+    require_admin(request)
+    report = profile_store.load(profile_id)
+    if not report:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return report
+
+@app.get("/api/profiles/{profile_id}/pstats")
+async def download_profile_pstats(profile_id: str, request: Request):
+    """Raw cProfile stats (pstats / snakeviz)"""
+    require_admin(request)
+    file_path = profile_store.pstats_path(profile_id)
+    if not file_path:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path=str(file_path), filename=file_path.name, media_type="application/octet-stream")
+
+# ============ IMAGE STORE ============
+
+@app.post("/api/images/gc")
+async def collect_image_garbage(
+    request: Request,
+    dry_run: bool = Query(False),
+    grace_minutes: Optional[float] = Query(None, ge=0, description="Keep images younger than this")
+):
+    """Delete stored images no result references"""
+    require_admin(request)
+    grace = None if grace_minutes is None else grace_minutes * 60
+    return image_store.collect_garbage(images, grace_seconds=grace, dry_run=dry_run)
+
 # ============ TEMPLATE/ROI ============
 
 @app.get("/api/template/status")
@@ -294,13 +708,28 @@ async def get_template_status():
     return {
         "roi_configured": roi_path.exists(),
         "template_exists": template_path.exists(),
-        "roi_config": processor.roi_config
+        "roi_config": processor.roi_config,
+        "templates": [t['template_id'] for t in templates.list()]
     }
 
+@app.get("/api/templates")
+async def list_templates():
+    """Registered sheet templates (ID, name, version, ROI)"""
+    return templates.list()
+
+@app.get("/api/templates/{template_id}")
+async def get_template(template_id: str):
+    """Template summary with the expected bubble count of its reference grid"""
+    template = templates.find(template_id)
+    if not template:
+        raise HTTPException(status_code=404, detail="Template not found")
+    return {**template.summary(), "bubble_count": template.bubble_count}
+
 # ============ ARCHIVE ============
 
 @app.post("/api/archive")
 async def archive_exams(
+    request: Request,
     start_date: str = Query(..., description="Format: YYYY-MM-DD"),
     end_date: str = Query(..., description="Format: YYYY-MM-DD")
 ):
@@ -339,58 +768,51 @@ async def archive_exams(
         zip_path = archive_dir / zip_filename
         
         # Create ZIP file
-        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            # Prepare archive data
-            exam_ids = [exam['exam_id'] for exam in exams_to_archive]
+        with profiling.maybe_profile(request.headers, 'archive', zip_filename, profile_store) as profile:
+            with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
+                # Prepare archive data
+                exam_ids = [exam['exam_id'] for exam in exams_to_archive]
             
-            # Add exam JSON files
-            for exam_id in exam_ids:
-                exam_file = config.EXAMS_DIR / f"{exam_id}.json"
-                if exam_file.exists():
-                    zipf.write(exam_file, f"data/exams/{exam_id}.json")
+                # Add exam JSON files
+                for exam_id in exam_ids:
+                    exam_file = config.EXAMS_DIR / f"{exam_id}.json"
+                    if exam_file.exists():
+                        zipf.write(exam_file, f"data/exams/{exam_id}.json")
             
-            # Add result JSON files
-            result_count = 0
-            for exam_id in exam_ids:
-                results = storage.list_results_by_exam(exam_id)
-                for result in results:
-                    result_id = result['result_id']
-                    result_file = config.RESULTS_DIR / f"{result_id}.json"
-                    if result_file.exists():
-                        zipf.write(result_file, f"data/results/{result_id}.json")
-                        result_count += 1
+                # Add result JSON files
+                result_count = 0
+                for exam_id in exam_ids:
+                    results = storage.list_results_by_exam(exam_id)
+                    for result in results:
+                        result_id = result['result_id']
+                        result_file = config.RESULTS_DIR / f"{result_id}.json"
+                        if result_file.exists():
+                            zipf.write(result_file, f"data/results/{result_id}.json")
+                            result_count += 1
             
-            # Add images
-            for exam_id in exam_ids:
-                upload_dir = config.UPLOADS_DIR / exam_id
-                processed_dir = config.PROCESSED_DIR / exam_id
-                
-                # Add uploaded images
-                if upload_dir.exists():
-                    for img_file in upload_dir.rglob("*"):
-                        if img_file.is_file():
-                            arcname = f"data/images/uploads/{exam_id}/{img_file.relative_to(upload_dir)}"
-                            zipf.write(img_file, arcname)
-                
-                # Add processed images
-                if processed_dir.exists():
-                    for img_file in processed_dir.rglob("*"):
-                        if img_file.is_file():
-                            arcname = f"data/images/processed/{exam_id}/{img_file.relative_to(processed_dir)}"
+                # Add images referenced by the results (shared blobs once)
+                archived_images = set()
+                for exam_id in exam_ids:
+                    for result in storage.list_results_by_exam(exam_id):
+                        for img_file in image_store.result_files(result, images):
+                            if img_file in archived_images:
+                                continue
+                            archived_images.add(img_file)
+                            arcname = f"data/{img_file.relative_to(config.DATA_DIR).as_posix()}"
                             zipf.write(img_file, arcname)
             
-            # Add archive info file
-            archive_info = {
-                "archived_date": datetime.now().isoformat(),
-                "date_range": {
-                    "start": start_date,
-                    "end": end_date
-                },
-                "exam_count": len(exams_to_archive),
-                "result_count": result_count,
-                "exam_ids": exam_ids
-            }
-            zipf.writestr("archive_info.json", json.dumps(archive_info, indent=2, ensure_ascii=False))
+                # Add archive info file
+                archive_info = {
+                    "archived_date": datetime.now().isoformat(),
+                    "date_range": {
+                        "start": start_date,
+                        "end": end_date
+                    },
+                    "exam_count": len(exams_to_archive),
+                    "result_count": result_count,
+                    "exam_ids": exam_ids
+                }
+                zipf.writestr("archive_info.json", json.dumps(archive_info, indent=2, ensure_ascii=False))
         
         file_size = os.path.getsize(zip_path)
         
@@ -401,13 +823,14 @@ async def archive_exams(
             "zip_file": zip_filename,
             "zip_path": str(zip_path),
             "file_size": file_size,
-            "file_size_mb": round(file_size / (1024 * 1024), 2)
+            "file_size_mb": round(file_size / (1024 * 1024), 2),
+            **({"profile_id": profile.profile_id} if profile.profile_id else {})
         }
     
     except ValueError as e:
         raise HTTPException(status_code=400, detail="Format tanggal salah. Gunakan YYYY-MM-DD")
     except Exception as e:
-        print(f"Archive error: {e}")
+        logger.exception("Archive error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -437,26 +860,22 @@ async def cleanup_archived_exams(
                     # Delete exam from storage
                     storage.delete_exam(exam_id)
                     
-                    # Delete image folders
-                    upload_dir = config.UPLOADS_DIR / exam_id
-                    processed_dir = config.PROCESSED_DIR / exam_id
-                    
-                    if upload_dir.exists():
-                        shutil.rmtree(upload_dir)
-                    if processed_dir.exists():
-                        shutil.rmtree(processed_dir)
-                    
                     deleted_count += 1
             except ValueError:
                 continue
         
+        # Images of the deleted results are no longer referenced (blobs
+        # shared with other exams stay; recent uploads wait for the grace period)
+        gc_report = image_store.collect_garbage(images) if deleted_count else None
+        
         return {
             "message": f"Berhasil menghapus {deleted_count} ujian yang sudah diarsipkan",
-            "deleted_count": deleted_count
+            "deleted_count": deleted_count,
+            "images_deleted": gc_report['deleted_files'] if gc_report else 0
         }
     
     except Exception as e:
-        print(f"Cleanup error: {e}")
+        logger.exception("Cleanup error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
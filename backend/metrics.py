@@ -0,0 +1,219 @@
+# Metrics - in-process counters / gauges / histograms
+#
+# Minimal Prometheus-compatible registry (text exposition format 0.0.4)
+# so /metrics works with a local Prometheus or a plain scraping script
+# without an extra dependency. Observing a value is one lock + one bisect,
+# cheap enough for the grading hot path.
+
+import bisect
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Dict, List, Sequence, Tuple
+
+# Seconds; grading stages run from ~0.1 ms (decide) to ~100 ms (PDF render)
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+BUBBLE_BUCKETS = (0, 50, 100, 150, 200, 250, 300, 400, 600, 900)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric(ABC):
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(n, "")) for n in self.labels)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+
+    @abstractmethod
+    def _samples(self) -> List[str]:
+        """Exposition lines of this metric's values"""
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, help_text, labels=()):
+        super().__init__(name, help_text, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labels, k)} {_format_value(v)}" for k, v in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    @contextmanager
+    def track(self, **labels):
+        """Increment while the block runs (in-progress / queue depth)"""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets: Sequence[float] = STAGE_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+        # per label set: [bucket counts..., +Inf count], sum
+        self._values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            entry[0][idx] += 1
+            entry[1][0] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels) -> int:
+        entry = self._values.get(self._key(labels))
+        return sum(entry[0]) if entry else 0
+
+    def total(self, **labels) -> float:
+        """Sum of observed values"""
+        entry = self._values.get(self._key(labels))
+        return entry[1][0] if entry else 0.0
+
+    def _samples(self):
+        with self._lock:
+            items = [(k, list(counts), total[0]) for k, (counts, total) in self._values.items()]
+
+        lines = []
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# HTTP
+HTTP_REQUESTS = REGISTRY.register(Counter(
+    "ljk_http_requests_total", "HTTP requests by route and status", ("method", "route", "status")))
+HTTP_DURATION = REGISTRY.register(Histogram(
+    "ljk_http_request_duration_seconds", "HTTP request latency by route", ("method", "route"), REQUEST_BUCKETS))
+HTTP_IN_PROGRESS = REGISTRY.register(Gauge(
+    "ljk_http_requests_in_progress", "HTTP requests currently being served"))
+
+# Grading
+STAGE_DURATION = REGISTRY.register(Histogram(
+    "ljk_grading_stage_seconds", "Duration of one grading stage for one sheet", ("stage",), STAGE_BUCKETS))
+SHEETS_GRADED = REGISTRY.register(Counter(
+    "ljk_sheets_graded_total", "Sheets graded by outcome", ("outcome",)))
+SHEETS_REJECTED = REGISTRY.register(Counter(
+    "ljk_sheets_rejected_total", "Sheets rejected by the quality gate by reason", ("reason",)))
+GRADING_CACHE = REGISTRY.register(Counter(
+    "ljk_grading_cache_total", "Uploads answered from stored results: hit / rescore / stale / miss / replay", ("outcome",)))
+PDF_RENDER_CACHE = REGISTRY.register(Counter(
+    "ljk_pdf_render_cache_total", "PDF page renders served from the render cache: hit / miss", ("outcome",)))
+BUBBLES_DETECTED = REGISTRY.register(Histogram(
+    "ljk_bubbles_detected", "Bubbles detected per sheet", (), BUBBLE_BUCKETS))
+GRADING_QUEUE = REGISTRY.register(Gauge(
+    "ljk_grading_queue_depth", "Sheets accepted and waiting for or in grading"))
+GRADING_BUSY = REGISTRY.register(Counter(
+    "ljk_grading_busy_seconds_total", "Time the grader spent grading; rate() / workers = utilization"))
+GRADING_WORKERS = REGISTRY.register(Gauge(
+    "ljk_grading_workers", "Grading workers (processes) sharing this host"))
+WATCH_FILES = REGISTRY.register(Counter(
+    "ljk_watch_files_total", "Files graded from watch folders: done / failed", ("outcome",)))
+
+# Storage / export
+STORAGE_DURATION = REGISTRY.register(Histogram(
+    "ljk_storage_seconds", "JSON storage operation latency", ("op",), STAGE_BUCKETS))
+EXPORT_DURATION = REGISTRY.register(Histogram(
+    "ljk_export_seconds", "Export file generation time", ("format",), REQUEST_BUCKETS))
+
+
+@contextmanager
+def stage(name: str):
+    """Time one grading stage: `with metrics.stage('detect'): ...`"""
+    with STAGE_DURATION.time(stage=name):
+        yield
+
+
+def render() -> str:
+    return REGISTRY.render()
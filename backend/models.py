@@ -17,6 +17,7 @@ class ExamCreate(BaseModel):
         "unanswered": 0.0
     })
     answer_key: Dict[int, int]  # {question_num: answer_index (0-4 for A-E)}
+    template_id: Optional[str] = None  # Sheet layout (templates.py); None = "default"
 
 class ExamResponse(ExamCreate):
     exam_id: str
@@ -32,6 +33,11 @@ class ProcessLJKRequest(BaseModel):
     student_name: Optional[str] = None
     student_number: Optional[str] = None
 
+class ResumableUploadCreate(BaseModel):
+    filename: str = Field(..., min_length=1)
+    size: int = Field(..., gt=0)  # Bytes
+    sha256: Optional[str] = Field(default=None, pattern=r"^[0-9a-fA-F]{64}$")  # Verified on finalize
+
 class AnswerDetail(BaseModel):
     question_num: int
     answer_key: str
@@ -3,9 +3,12 @@ PDF Converter Utility
 Converts PDF files to JPG images using PyMuPDF (fitz)
 """
 import fitz  # PyMuPDF
+import logging
 import os
 from pathlib import Path
 
+logger = logging.getLogger("ljk.pdf")
+
 
 def convert_pdf_to_jpg(pdf_path: str, output_dir: str = None, dpi: int = 300) -> str:
     """
@@ -58,9 +61,7 @@ def convert_pdf_to_jpg(pdf_path: str, output_dir: str = None, dpi: int = 300) ->
     
     doc.close()
     
-    print(f"✅ PDF converted: {pdf_path}")
-    print(f"   → JPG: {jpg_path}")
-    print(f"   Size: {pix.width} x {pix.height} pixels ({dpi} DPI)")
+    logger.info("PDF converted: %s -> %s (%dx%d px, %d DPI)", pdf_path, jpg_path, pix.width, pix.height, dpi)
     
     return jpg_path
 
@@ -111,8 +112,6 @@ def convert_pdf_multipage(pdf_path: str, output_dir: str = None, dpi: int = 300)
     
     doc.close()
     
-    print(f"✅ PDF converted: {pdf_path}")
-    print(f"   Pages: {len(jpg_paths)}")
-    print(f"   Output: {output_dir}")
+    logger.info("PDF converted: %s (%d pages) -> %s", pdf_path, len(jpg_paths), output_dir)
     
     return jpg_paths
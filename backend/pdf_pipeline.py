@@ -0,0 +1,137 @@
+# PDF Pipeline - grade multi-page class PDFs page by page
+#
+# Multi-page TIFFs from scanners go through the same pipeline, their
+# pages decoded lazily by tiff_pages instead of rendered; a JPG / PNG is
+# a one-page document.
+#
+# A renderer thread rasterizes page i+1 (render_cache.iter_pages, so
+# cached pages are only decoded) while page i is detected and scored.
+# PyMuPDF holds the GIL while rasterizing, so the thread hands misses to
+# the shared renderer process (config.PDF_RENDER_PROCESSES) and only
+# waits for them.
+#
+# Rendered pages wait in a bounded queue: when grading falls behind the
+# renderer blocks, so only a few pages (queue, render-ahead and pages
+# being graded) are in memory whatever the length of the document.
+# Results are yielded in page order as soon as each page is done; a
+# rejected or failed page does not stop the rest of the document.
+
+import logging
+import queue
+import threading
+from collections import deque
+from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, Optional
+
+import cv2
+import numpy as np
+
+import config
+from pdf_utils import is_pdf_file
+from render_cache import iter_pages
+from tiff_pages import is_tiff_file, iter_pages as iter_tiff_pages
+
+logger = logging.getLogger("ljk.pdf")
+
+_DONE = object()
+
+
+class PageResult:
+    """Outcome of one page: result dict, or the exception that stopped it"""
+
+    def __init__(self, page: int, image: np.ndarray, result: Optional[Dict] = None,
+                 error: Optional[Exception] = None):
+        self.page = page
+        self.image = image
+        self.result = result
+        self.error = error
+
+
+def _read_image(image_path) -> Iterator:
+    """A single image file as a one-page document"""
+    image = cv2.imread(str(image_path))
+    if image is None:
+        raise ValueError(f"Cannot read image: {image_path}")
+    yield 0, image
+
+
+def _render(pdf_path, sha256: Optional[str], pages: queue.Queue, stop: threading.Event):
+    """Producer: rendered pages into the bounded queue until done or stopped"""
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                pages.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    try:
+        if is_tiff_file(pdf_path):
+            source = iter_tiff_pages(pdf_path)
+        elif not is_pdf_file(pdf_path):
+            source = _read_image(pdf_path)
+        else:
+            render_ahead = config.PDF_PIPELINE_QUEUE if config.PDF_RENDER_PROCESSES > 0 else 0
+            source = iter_pages(pdf_path, sha256=sha256, render_ahead=render_ahead)
+        with closing(source) as rendered:
+            for page_num, raster in rendered:
+                if not put((page_num, raster)):
+                    return
+    except Exception as e:
+        put(e)
+        return
+    put(_DONE)
+
+
+def grade_pages(
+    pdf_path,
+    grade: Callable[[int, np.ndarray], Dict],
+    sha256: Optional[str] = None,
+    workers: Optional[int] = None,
+    queue_size: Optional[int] = None
+) -> Iterator[PageResult]:
+    """
+    Render (or decode, for a TIFF or image) and grade every page of a
+    document, overlapping the two.
+
+    grade(page_number, raster) runs on the calling thread (workers=1) or
+    on a pool of `workers` threads. Yields a PageResult per page, in page
+    order. Raises if the document itself cannot be opened or rendered;
+    closing the generator early stops the renderer.
+    """
+    workers = workers or config.PDF_PIPELINE_WORKERS
+    pages = queue.Queue(maxsize=queue_size or config.PDF_PIPELINE_QUEUE)
+    stop = threading.Event()
+    renderer = threading.Thread(target=_render, args=(pdf_path, sha256, pages, stop), name="ljk-pdf-render", daemon=True)
+    renderer.start()
+
+    def run(page_num: int, raster: np.ndarray) -> PageResult:
+        try:
+            return PageResult(page_num, raster, result=grade(page_num, raster))
+        except Exception as e:
+            return PageResult(page_num, raster, error=e)
+
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ljk-pdf-grade") if workers > 1 else None
+    in_flight = deque()
+    try:
+        while True:
+            item = pages.get()
+            if item is _DONE:
+                break
+            if isinstance(item, Exception):
+                raise item
+            if executor is None:
+                yield run(*item)
+                continue
+            in_flight.append(executor.submit(run, *item))
+            if len(in_flight) >= workers:
+                yield in_flight.popleft().result()
+        while in_flight:
+            yield in_flight.popleft().result()
+    finally:
+        stop.set()
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+        renderer.join()
@@ -2,11 +2,14 @@
 # Convert PDF pages to images for LJK processing
 
 import fitz  # PyMuPDF
+import logging
 from pathlib import Path
 from typing import List
 import cv2
 import numpy as np
 
+logger = logging.getLogger("ljk.pdf")
+
 
 def pdf_to_images(pdf_path: str, output_dir: str = None, dpi: int = 200) -> List[str]:
     """
@@ -59,7 +62,7 @@ def pdf_to_images(pdf_path: str, output_dir: str = None, dpi: int = 200) -> List
     
     doc.close()
     
-    print(f"✓ Converted PDF to {len(image_paths)} images")
+    logger.debug("Converted PDF to %d images", len(image_paths))
     return image_paths
 
 
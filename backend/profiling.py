@@ -0,0 +1,183 @@
+# Profiling - opt-in cProfile + tracemalloc for slow requests
+#
+# A request is profiled when it carries the admin token in the
+# X-LJK-Profile header, or by random sampling (config.PROFILE_SAMPLE_RATE).
+# The report (top functions, peak memory, top allocation sites) is stored
+# as JSON next to the raw .prof file (pstats / snakeviz) under a profile ID.
+
+import cProfile
+import io
+import json
+import logging
+import pstats
+import random
+import threading
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import config
+
+logger = logging.getLogger("ljk.profiling")
+
+PROFILE_HEADER = "X-LJK-Profile"
+TOKEN_HEADER = "X-LJK-Admin-Token"
+TOP_FUNCTIONS = 40
+TOP_ALLOCATIONS = 20
+
+# cProfile hooks the thread and tracemalloc is process-wide:
+# only one request is profiled at a time, others run unprofiled
+_profile_lock = threading.Lock()
+
+
+class ProfileHandle:
+    """Yielded by maybe_profile; profile_id is None when not profiled"""
+
+    def __init__(self, profile_id: Optional[str] = None):
+        self.profile_id = profile_id
+
+
+class ProfileStore:
+    """Profile reports as JSON + raw pstats files in config.PROFILES_DIR"""
+
+    def __init__(self, profiles_dir: Optional[Path] = None):
+        self.profiles_dir = Path(profiles_dir or config.PROFILES_DIR)
+
+    def save(self, report: Dict, profiler: cProfile.Profile):
+        profile_id = report['profile_id']
+        self.profiles_dir.mkdir(parents=True, exist_ok=True)
+        profiler.dump_stats(str(self.profiles_dir / f"{profile_id}.prof"))
+        with open(self.profiles_dir / f"{profile_id}.json", 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        self.prune()
+
+    def load(self, profile_id: str) -> Optional[Dict]:
+        file_path = self.profiles_dir / f"{Path(profile_id).name}.json"
+        if not file_path.exists():
+            return None
+        with open(file_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def pstats_path(self, profile_id: str) -> Optional[Path]:
+        file_path = self.profiles_dir / f"{Path(profile_id).name}.prof"
+        return file_path if file_path.exists() else None
+
+    def list(self) -> List[Dict]:
+        """Summaries, newest first"""
+        summaries = []
+        for file_path in self.profiles_dir.glob("prof_*.json"):
+            with open(file_path, 'r', encoding='utf-8') as f:
+                report = json.load(f)
+            summaries.append({k: report.get(k) for k in (
+                'profile_id', 'kind', 'label', 'trigger', 'created_at', 'wall_ms', 'peak_memory_kb'
+            )})
+        summaries.sort(key=lambda x: x.get('created_at') or '', reverse=True)
+        return summaries
+
+    def prune(self, keep: Optional[int] = None):
+        """Keep only the newest PROFILE_KEEP profiles"""
+        keep = config.PROFILE_KEEP if keep is None else keep
+        reports = sorted(self.profiles_dir.glob("prof_*.json"), key=lambda p: p.stat().st_mtime, reverse=True)
+        for old in reports[keep:]:
+            old.unlink(missing_ok=True)
+            old.with_suffix(".prof").unlink(missing_ok=True)
+
+
+def is_admin(headers) -> bool:
+    """Admin token configured and presented"""
+    token = config.PROFILE_ADMIN_TOKEN
+    return bool(token) and headers.get(TOKEN_HEADER) == token
+
+
+def profile_trigger(headers) -> Optional[str]:
+    """'requested' (admin header), 'sampled' or None"""
+    if headers.get(PROFILE_HEADER) and is_admin(headers):
+        return 'requested'
+    if config.PROFILE_SAMPLE_RATE > 0 and random.random() < config.PROFILE_SAMPLE_RATE:
+        return 'sampled'
+    return None
+
+
+def _function_stats(profiler: cProfile.Profile) -> List[Dict]:
+    stats = pstats.Stats(profiler)
+    rows = []
+    for (filename, line, func), (cc, nc, tt, ct, _) in stats.stats.items():
+        rows.append({
+            'function': f"{Path(filename).name}:{line}({func})",
+            'calls': nc,
+            'tottime_ms': round(tt * 1000, 3),
+            'cumtime_ms': round(ct * 1000, 3),
+        })
+    rows.sort(key=lambda r: r['cumtime_ms'], reverse=True)
+    return rows[:TOP_FUNCTIONS]
+
+
+def _pstats_text(profiler: cProfile.Profile) -> str:
+    out = io.StringIO()
+    pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(TOP_FUNCTIONS)
+    return out.getvalue()
+
+
+@contextmanager
+def maybe_profile(headers, kind: str, label: str = "", store: Optional[ProfileStore] = None):
+    """
+    Run the block under cProfile + tracemalloc if the request asks for it
+    (or is sampled) and no other profile is running.
+
+        with profiling.maybe_profile(request.headers, 'export', exam_id) as prof:
+            ...
+        prof.profile_id  # None if not profiled
+    """
+    trigger = profile_trigger(headers)
+    if trigger is None or not _profile_lock.acquire(blocking=False):
+        yield ProfileHandle()
+        return
+
+    handle = ProfileHandle(f"prof_{datetime.now():%Y%m%d_%H%M%S}_{uuid.uuid4().hex[:6]}")
+    started_tracing = not tracemalloc.is_tracing()
+    profiler = cProfile.Profile()
+    try:
+        if started_tracing:
+            tracemalloc.start(10)
+        tracemalloc.reset_peak()
+        start_mem = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+
+        profiler.enable()
+        try:
+            yield handle
+        finally:
+            profiler.disable()
+            wall_ms = (time.perf_counter() - start) * 1000
+            current, peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot().filter_traces((
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            ))
+
+            report = {
+                'profile_id': handle.profile_id,
+                'kind': kind,
+                'label': label,
+                'trigger': trigger,
+                'created_at': datetime.now().isoformat(),
+                'wall_ms': round(wall_ms, 2),
+                'peak_memory_kb': round((peak - start_mem) / 1024, 1),
+                'retained_memory_kb': round((current - start_mem) / 1024, 1),
+                'top_functions': _function_stats(profiler),
+                'top_allocations': [
+                    {'site': str(stat.traceback[0]), 'size_kb': round(stat.size / 1024, 1), 'count': stat.count}
+                    for stat in snapshot.statistics('lineno')[:TOP_ALLOCATIONS]
+                ],
+                'pstats': _pstats_text(profiler),
+            }
+            (store or ProfileStore()).save(report, profiler)
+            logger.info("Profile %s (%s): %.1f ms, peak +%s KB", handle.profile_id, kind, wall_ms, report['peak_memory_kb'])
+    finally:
+        if started_tracing:
+            tracemalloc.stop()
+        _profile_lock.release()
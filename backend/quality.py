@@ -0,0 +1,155 @@
+# Quality Gate - cheap pre-checks before the grading pipeline
+#
+# Runs on the decoded page in a few milliseconds and rejects sheets that
+# cannot be graded reliably (blank, unknown layout, cropped, too blurry,
+# bubbles missing) with a machine-readable reason, instead of failing deep
+# in detection or producing a silently wrong score. Upside-down and
+# sideways scans are turned upright using the template fingerprint. The
+# measured values are stored with each result.
+
+import logging
+from typing import Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+import config
+
+logger = logging.getLogger("ljk.quality")
+
+# (quarter turns of the fingerprint with np.rot90 (counter-clockwise),
+#  cv2 rotation that turns the page the same way); upright is tried first
+ROTATIONS = (
+    (0, None),
+    (2, cv2.ROTATE_180),
+    (1, cv2.ROTATE_90_COUNTERCLOCKWISE),
+    (3, cv2.ROTATE_90_CLOCKWISE),
+)
+
+
+class SheetRejected(ValueError):
+    """Sheet fails a quality check; `reason` is machine-readable"""
+
+    def __init__(self, reason: str, message: str, details: Optional[Dict] = None):
+        super().__init__(message)
+        self.reason = reason
+        self.details = details or {}
+
+
+def ink_ratio(image: np.ndarray) -> float:
+    """Fraction of dark pixels (1/4 resolution); a printed form is ~6-8 %, a blank page 0"""
+    small = image[::4, ::4]
+    if small.ndim == 3:
+        small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    return float(np.count_nonzero(small < 128)) / small.size
+
+
+def sharpness(image: np.ndarray, roi: Dict) -> float:
+    """Variance of the Laplacian over the answer area (1/2 resolution)"""
+    crop = image[roi['y1']:roi['y2']:2, roi['x1']:roi['x2']:2]
+    if crop.size == 0:
+        return 0.0
+    if crop.ndim == 3:
+        crop = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
+    return float(cv2.Laplacian(crop, cv2.CV_32F).var())
+
+
+def orient(image: np.ndarray, registry, preferred=None) -> Tuple[np.ndarray, object, Optional[float], int]:
+    """
+    Identify the template, turning the page upright if needed.
+
+    Returns (upright image, template, match score, rotation in degrees
+    counter-clockwise). Raises UnknownLayout when no orientation matches.
+    """
+    from templates import alignment_thumbnail, unknown_layout, log_routing
+
+    candidates = registry.candidates(preferred)
+    if not candidates:
+        return image, preferred or registry.get(), None, 0
+
+    thumbnail = alignment_thumbnail(image)
+    upright = None
+    best = None
+    for turns, rotate_code in ROTATIONS:
+        template, score, scores = registry.match(np.rot90(thumbnail, turns), candidates, preferred)
+        if upright is None:
+            upright = (template, score, scores)
+        if best is None or score > best[3]:
+            best = (turns, rotate_code, template, score)
+        if score >= config.TEMPLATE_MATCH_MIN:
+            break
+
+    turns, rotate_code, template, score = best
+    if score < config.TEMPLATE_MATCH_MIN:
+        # A page shaped unlike any template (either way up) is cut off,
+        # not a foreign layout
+        height, width = image.shape[:2]
+        deltas = []
+        for candidate in candidates:
+            ref_width, ref_height = (int(v) for v in candidate.features['page_size'])
+            ref_aspect = ref_width / ref_height
+            deltas += [abs((width / height) / ref_aspect - 1), abs((height / width) / ref_aspect - 1)]
+        if min(deltas) > config.QUALITY_MAX_ASPECT_DELTA:
+            raise SheetRejected(
+                'cropped', f"Sheet is cropped or mis-sized ({width}x{height})",
+                {'size': [width, height], 'aspect_delta': round(min(deltas), 4)}
+            )
+        raise unknown_layout(*upright)
+
+    log_routing(template, score, preferred, upright[2] if turns == 0 else {})
+    if rotate_code is not None:
+        logger.info("Page rotated %d degrees to match template %s (%.2f)", turns * 90, template.template_id, score)
+        image = cv2.rotate(image, rotate_code)
+    return image, template, score, turns * 90
+
+
+def inspect(image: np.ndarray, registry, preferred=None) -> Tuple[np.ndarray, object, Dict]:
+    """
+    Pre-checks on a decoded page, before bubble detection.
+
+    Returns (upright image, template, quality report); raises
+    SheetRejected with reason blank / unknown_layout / cropped / blurry.
+    """
+    report = {'ink_ratio': round(ink_ratio(image), 4)}
+    if report['ink_ratio'] < config.QUALITY_MIN_INK:
+        raise SheetRejected('blank', "Sheet appears blank", report)
+
+    image, template, match, rotation = orient(image, registry, preferred)
+    report['template_match'] = None if match is None else round(match, 3)
+    report['rotation'] = rotation
+
+    # The ROI is in page pixels: it must lie on the page, with the page
+    # shaped like the template's reference scan
+    height, width = image.shape[:2]
+    roi = template.roi
+    features = template.features
+    aspect_delta = None
+    if features is not None:
+        ref_width, ref_height = (int(v) for v in features['page_size'])
+        aspect_delta = abs((width / height) / (ref_width / ref_height) - 1)
+        report['aspect_delta'] = round(aspect_delta, 4)
+    if roi['x2'] > width or roi['y2'] > height or (
+        aspect_delta is not None and aspect_delta > config.QUALITY_MAX_ASPECT_DELTA
+    ):
+        raise SheetRejected(
+            'cropped', f"Sheet is cropped or mis-sized ({width}x{height})", {**report, 'size': [width, height]}
+        )
+
+    report['sharpness'] = round(sharpness(image, roi), 1)
+    if report['sharpness'] < config.QUALITY_MIN_SHARPNESS:
+        raise SheetRejected('blurry', "Sheet is too blurry to read", report)
+
+    return image, template, report
+
+
+def check_bubbles(count: int, template, report: Dict):
+    """After detection: reject when too few of the template's bubbles were found"""
+    expected = template.bubble_count
+    if expected is None and template.questions:
+        expected = template.questions * 5
+    report['bubbles'] = count
+    report['expected_bubbles'] = expected
+    if expected and count < expected * config.QUALITY_MIN_BUBBLE_RATIO:
+        raise SheetRejected(
+            'missing_bubbles', f"Only {count} of {expected} bubbles detected", report
+        )
@@ -0,0 +1,133 @@
+# Bulk regrade - rescore stored results when the answer key changes
+#
+# Loads every stored answer vector of an exam as one (N, Q) int8 matrix,
+# scores it against the new key in a single NumPy pass and rewrites all
+# results together. No image is decoded.
+
+import hashlib
+import json
+import time
+import logging
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from grading import stack_matrices, answer_matrix, sheet_confidence
+from scoring import compile_answer_key, score_matrix, result_fields
+from storage import StorageService
+import config
+
+logger = logging.getLogger("ljk.regrade")
+
+
+def _scoring_inputs(exam: Dict) -> Tuple:
+    """The parts of an exam that stored scores depend on"""
+    return (
+        {str(k): v for k, v in exam.get('answer_key', {}).items()},
+        exam.get('active_questions'),
+        exam.get('scoring'),
+    )
+
+
+def needs_regrade(old_exam: Dict, new_exam: Dict) -> bool:
+    """True if a change to the exam affects stored scores"""
+    return _scoring_inputs(old_exam) != _scoring_inputs(new_exam)
+
+
+def key_version(exam: Dict) -> str:
+    """Short hash of the answer key, active questions and scoring (stored on results)"""
+    payload = json.dumps(_scoring_inputs(exam), sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+def _load_answer_matrix(storage: StorageService, results: List[Dict], active_questions: int) -> Tuple[np.ndarray, np.ndarray, List]:
+    """
+    Build (N, Q) answers and read-mask matrices for all results.
+
+    Results with an intensity sidecar are re-decided from it, so questions
+    added by raising active_questions are filled in too. Older results fall
+    back to their stored answers. Also returns the (index, matrix, threshold)
+    of sidecar results.
+    """
+    n = len(results)
+    answers = np.full((n, active_questions), -1, dtype=np.int8)
+    read_mask = np.zeros((n, active_questions), dtype=bool)
+
+    with_matrix = []
+    for i, result in enumerate(results):
+        matrix = storage.load_intensities(result['result_id'])
+        if matrix is not None:
+            with_matrix.append((i, matrix, result.get('filled_threshold', config.FILLED_THRESHOLD)))
+            continue
+
+        for q, ans in result['answers'].items():
+            q = int(q)
+            if q < active_questions:
+                answers[i, q] = ans
+                read_mask[i, q] = True
+        for q in result['unanswered']:
+            if q < active_questions:
+                read_mask[i, q] = True
+
+    if with_matrix:
+        stacked, rows_read = stack_matrices([m for _, m, _ in with_matrix])
+        thresholds = [t for _, _, t in with_matrix]
+        rows = [i for i, _, _ in with_matrix]
+        answers[rows], read_mask[rows] = answer_matrix(stacked, rows_read, thresholds, active_questions)
+
+    return answers, read_mask, with_matrix
+
+
+def regrade_exam(storage: StorageService, exam_id: str) -> Dict:
+    """Rescore every stored result of an exam against its current answer key"""
+    start = time.perf_counter()
+
+    exam = storage.load_exam(exam_id)
+    if not exam:
+        raise ValueError("Exam not found")
+
+    results = storage.list_results_by_exam(exam_id)
+    if not results:
+        return {'exam_id': exam_id, 'regraded': 0, 'duration_ms': 0.0}
+
+    active_questions = exam['active_questions']
+    key_vec = compile_answer_key(exam['answer_key'], active_questions)
+    answers, read_mask, with_matrix = _load_answer_matrix(storage, results, active_questions)
+
+    scored = score_matrix(answers, read_mask, key_vec, exam.get('scoring'))
+
+    regraded_at = datetime.now().isoformat()
+    version = key_version(exam)
+    for i, result in enumerate(results):
+        result.update(result_fields(answers, read_mask, key_vec, scored, i))
+        result['regraded_at'] = regraded_at
+        result['key_version'] = version
+
+    # active_questions may have changed - refresh confidence where possible
+    for i, matrix, threshold in with_matrix:
+        results[i]['confidence'] = sheet_confidence(matrix, threshold, active_questions)
+
+    storage.update_results(results)
+
+    duration_ms = (time.perf_counter() - start) * 1000
+    logger.info("Regraded %d results for %s in %.1f ms", len(results), exam_id, duration_ms)
+
+    return {'exam_id': exam_id, 'regraded': len(results), 'duration_ms': round(duration_ms, 1)}
+
+
+def rescore_result(storage: StorageService, exam: Dict, result: Dict) -> Dict:
+    """Rescore one stored result against the exam's current key (no image decode); saves and returns it"""
+    active_questions = exam['active_questions']
+    key_vec = compile_answer_key(exam['answer_key'], active_questions)
+    answers, read_mask, with_matrix = _load_answer_matrix(storage, [result], active_questions)
+    scored = score_matrix(answers, read_mask, key_vec, exam.get('scoring'))
+
+    result.update(result_fields(answers, read_mask, key_vec, scored, 0))
+    result['regraded_at'] = datetime.now().isoformat()
+    result['key_version'] = key_version(exam)
+    for _, matrix, threshold in with_matrix:
+        result['confidence'] = sheet_confidence(matrix, threshold, active_questions)
+
+    storage.update_result(result['result_id'], result)
+    return result
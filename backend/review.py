@@ -0,0 +1,63 @@
+# Manual review queue - only doubtful questions, not whole sheets
+
+from typing import Dict
+
+import config
+from grading import sheet_confidence
+from storage import StorageService
+
+
+def build_review_queue(storage: StorageService, exam_id: str, max_confidence: float = None) -> Dict:
+    """
+    Collect low-confidence / flagged questions of every result of an exam.
+
+    Results with an intensity sidecar are re-evaluated at max_confidence;
+    older results use the review list stored when they were graded.
+    """
+    if max_confidence is None:
+        max_confidence = config.REVIEW_CONFIDENCE
+
+    exam = storage.load_exam(exam_id)
+    if not exam:
+        raise ValueError("Exam not found")
+
+    items = []
+    without_confidence = 0
+    for result in storage.list_results_by_exam(exam_id):
+        matrix = storage.load_intensities(result['result_id'])
+        if matrix is not None:
+            threshold = result.get('filled_threshold', config.FILLED_THRESHOLD)
+            confidence = sheet_confidence(matrix, threshold, exam['active_questions'], max_confidence)
+        else:
+            confidence = result.get('confidence')
+            if confidence is None:
+                without_confidence += 1
+                continue
+
+        questions = [
+            q for q in confidence['review']
+            if q['confidence'] < max_confidence or q['flags']
+        ]
+        if not questions:
+            continue
+
+        items.append({
+            'result_id': result['result_id'],
+            'student_name': result.get('student_name'),
+            'student_number': result.get('student_number'),
+            'sheet_confidence': confidence['score'],
+            'processed_image_path': result.get('processed_image_path'),
+            'questions': questions
+        })
+
+    # Least confident sheets first
+    items.sort(key=lambda item: item['sheet_confidence'])
+
+    return {
+        'exam_id': exam_id,
+        'max_confidence': max_confidence,
+        'results_needing_review': len(items),
+        'questions_to_review': sum(len(item['questions']) for item in items),
+        'results_without_confidence': without_confidence,
+        'items': items
+    }
@@ -0,0 +1,161 @@
+# Scoring - compare student answers with the answer key
+#
+# Key and answers are int8 vectors (answer index 0-4, -1 = none), so one
+# sheet (Q,) and a whole exam (N, Q) are scored with the same array code.
+# Weights come from ExamCreate.scoring: points for correct, wrong and
+# unanswered questions (wrong may be negative for negative marking).
+
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+DEFAULT_WEIGHTS = {
+    "correct": 1.0,
+    "wrong": 0.0,
+    "unanswered": 0.0
+}
+
+
+def resolve_weights(scoring: Optional[Dict[str, float]]) -> Dict[str, float]:
+    """Exam scoring weights with defaults for missing entries"""
+    weights = dict(DEFAULT_WEIGHTS)
+    if scoring:
+        weights.update({k: float(v) for k, v in scoring.items() if k in DEFAULT_WEIGHTS})
+    return weights
+
+
+def compile_answer_key(answer_key: Dict, active_questions: int) -> np.ndarray:
+    """Answer key as int8 vector of length active_questions (-1 = no key)"""
+    key_vec = np.full(active_questions, -1, dtype=np.int8)
+    for q, ans in answer_key.items():
+        q = int(q)
+        if 0 <= q < active_questions:
+            key_vec[q] = ans
+    return key_vec
+
+
+def answers_to_vector(answers: Dict, active_questions: int) -> np.ndarray:
+    """Stored answers dict as int8 vector (-1 = not answered / not read)"""
+    return compile_answer_key(answers, active_questions)
+
+
+def score_matrix(
+    answer_matrix: np.ndarray,
+    read_mask: np.ndarray,
+    key_vec: np.ndarray,
+    scoring: Optional[Dict[str, float]] = None
+) -> Dict[str, np.ndarray]:
+    """
+    Score many sheets at once.
+
+    answer_matrix: (N, Q) int8, -1 = unanswered
+    read_mask:     (N, Q) bool, question was read from the sheet
+    key_vec:       (Q,) int8
+
+    Returns is_correct and points (N, Q), plus per-sheet correct, wrong,
+    unanswered, total_points and percentage (N,). Unread questions count as
+    neither answered nor unanswered and earn 0 points. Percentage is measured
+    against the weighted maximum (all questions correct) and floored at 0.
+    """
+    weights = resolve_weights(scoring)
+    active_questions = key_vec.shape[0]
+
+    answered = answer_matrix >= 0
+    is_correct = answered & (answer_matrix == key_vec)
+    is_wrong = answered & ~is_correct
+
+    # Questions never read from the sheet (row not detected) score nothing,
+    # matching the unanswered count below
+    points = np.where(
+        is_correct, weights['correct'],
+        np.where(is_wrong, weights['wrong'], np.where(read_mask, weights['unanswered'], 0.0))
+    ).astype(np.float64)
+    total_points = points.sum(axis=1, dtype=np.float64)
+
+    max_points = weights['correct'] * active_questions
+    if max_points > 0:
+        percentage = np.maximum(total_points / max_points * 100, 0.0)
+    else:
+        percentage = np.zeros(len(total_points))
+
+    return {
+        'is_correct': is_correct,
+        'points': points,
+        'correct': is_correct.sum(axis=1),
+        'wrong': is_wrong.sum(axis=1),
+        'unanswered': (read_mask & ~answered).sum(axis=1),
+        'total_points': total_points,
+        'max_points': max_points,
+        'percentage': percentage
+    }
+
+
+def build_details(answers: np.ndarray, key_vec: np.ndarray, is_correct: np.ndarray, points: np.ndarray) -> List[Dict]:
+    """Per-question details list for one sheet"""
+    letters = 'ABCDE'
+    return [
+        {
+            'question_num': q + 1,
+            'answer_key': letters[key] if key >= 0 else '?',
+            'student_answer': letters[ans] if ans >= 0 else '-',
+            'is_correct': ok,
+            'points': pts
+        }
+        for q, (key, ans, ok, pts) in enumerate(zip(
+            key_vec.tolist(), answers.tolist(), is_correct.tolist(), points.tolist()
+        ))
+    ]
+
+
+def result_fields(answer_matrix: np.ndarray, read_mask: np.ndarray, key_vec: np.ndarray, scored: Dict, i: int) -> Dict:
+    """answers / unanswered / score / details of sheet i in the stored result format"""
+    row = answer_matrix[i]
+    active_questions = key_vec.shape[0]
+
+    return {
+        'answers': {int(q): int(row[q]) for q in np.flatnonzero(row >= 0)},
+        'unanswered': np.flatnonzero(read_mask[i] & (row < 0)).tolist(),
+        'score': {
+            'correct': int(scored['correct'][i]),
+            'wrong': int(scored['wrong'][i]),
+            'unanswered': int(scored['unanswered'][i]),
+            'total': active_questions,
+            'total_points': float(scored['total_points'][i]),
+            'max_points': float(scored['max_points']),
+            'percentage': float(scored['percentage'][i])
+        },
+        'details': build_details(row, key_vec, scored['is_correct'][i], scored['points'][i])
+    }
+
+
+def score_sheet(
+    answers: np.ndarray,
+    read_mask: np.ndarray,
+    key_vec: np.ndarray,
+    scoring: Optional[Dict[str, float]] = None
+) -> Dict:
+    """Score one sheet given as (Q,) vectors; returns result fields"""
+    answer_matrix = answers[None, :]
+    read_matrix = read_mask[None, :]
+    scored = score_matrix(answer_matrix, read_matrix, key_vec, scoring)
+    return result_fields(answer_matrix, read_matrix, key_vec, scored, 0)
+
+
+def score_answers(
+    student_answers: Dict[int, int],
+    unanswered: List[int],
+    answer_key: Dict[int, int],
+    active_questions: int,
+    scoring: Optional[Dict[str, float]] = None
+) -> Tuple[Dict, List[Dict]]:
+    """
+    Score one sheet from the dict form used in stored results
+
+    Returns (score, details).
+    """
+    answers = answers_to_vector(student_answers, active_questions)
+    read_mask = answers >= 0
+    read_mask[[q for q in unanswered if q < active_questions]] = True
+
+    fields = score_sheet(answers, read_mask, compile_answer_key(answer_key, active_questions), scoring)
+    return fields['score'], fields['details']
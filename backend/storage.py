@@ -1,11 +1,15 @@
 # Storage service untuk menyimpan dan membaca JSON files
 
 import json
+import os
+import tempfile
 import uuid
 from datetime import datetime
 from pathlib import Path
 from typing import Dict, List, Optional
+import numpy as np
 import config
+import metrics
 
 class StorageService:
     """Handle JSON file storage for exams and results"""
@@ -14,6 +18,21 @@ class StorageService:
         self.exams_dir = config.EXAMS_DIR
         self.results_dir = config.RESULTS_DIR
     
+    def _write_temp(self, file_path: Path, data: Dict) -> str:
+        """Write JSON to a temp file next to file_path, return temp path"""
+        fd, tmp_path = tempfile.mkstemp(dir=file_path.parent, prefix=f".{file_path.stem}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=2, ensure_ascii=False)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+        return tmp_path
+    
+    def _write_json(self, file_path: Path, data: Dict):
+        """Atomic JSON write (temp file + rename) so readers never see half a file"""
+        os.replace(self._write_temp(file_path, data), file_path)
+    
     # ============ EXAM OPERATIONS ============
     
     def save_exam(self, exam_data: Dict) -> str:
@@ -23,8 +42,7 @@ class StorageService:
         exam_data['created_at'] = datetime.now().isoformat()
         
         file_path = self.exams_dir / f"{exam_id}.json"
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(exam_data, f, indent=2, ensure_ascii=False)
+        self._write_json(file_path, exam_data)
         
         return exam_id
     
@@ -34,7 +52,7 @@ class StorageService:
         if not file_path.exists():
             return None
         
-        with open(file_path, 'r', encoding='utf-8') as f:
+        with metrics.STORAGE_DURATION.time(op='load_exam'), open(file_path, 'r', encoding='utf-8') as f:
             return json.load(f)
     
     def list_exams(self) -> List[Dict]:
@@ -54,9 +72,11 @@ class StorageService:
         if file_path.exists():
             file_path.unlink()
             
-            # Delete associated results
+            # Delete associated results (and intensity sidecars)
             for result_file in self.results_dir.glob(f"{exam_id}_*.json"):
                 result_file.unlink()
+            for sidecar in self.results_dir.glob(f"{exam_id}_*.npy"):
+                sidecar.unlink()
             
             return True
         return False
@@ -67,54 +87,110 @@ class StorageService:
         if not file_path.exists():
             return False
         
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(exam_data, f, indent=2, ensure_ascii=False)
+        self._write_json(file_path, exam_data)
         
         return True
     
     # ============ RESULT OPERATIONS ============
     
-    def save_result(self, result_data: Dict) -> str:
-        """Save processing result to JSON"""
+    def save_result(
+        self,
+        result_data: Dict,
+        intensities: Optional[np.ndarray] = None,
+        result_id: Optional[str] = None
+    ) -> str:
+        """
+        Save processing result to JSON (+ optional intensity matrix sidecar).
+        An existing result_id is overwritten (re-graded sheet).
+        """
         exam_id = result_data['exam_id']
-        result_id = f"{exam_id}_{uuid.uuid4().hex[:8]}"
+        result_id = result_id or f"{exam_id}_{uuid.uuid4().hex[:8]}"
         result_data['result_id'] = result_id
         result_data['processed_at'] = datetime.now().isoformat()
         
+        if intensities is not None:
+            self.save_intensities(result_id, intensities)
+        
         file_path = self.results_dir / f"{result_id}.json"
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(result_data, f, indent=2, ensure_ascii=False)
+        self._write_json(file_path, result_data)
         
         return result_id
     
+    def update_result(self, result_id: str, result_data: Dict) -> bool:
+        """Overwrite an existing result"""
+        file_path = self.results_dir / f"{result_id}.json"
+        if not file_path.exists():
+            return False
+        
+        self._write_json(file_path, result_data)
+        
+        return True
+    
     def load_result(self, result_id: str) -> Optional[Dict]:
         """Load result by ID"""
         file_path = self.results_dir / f"{result_id}.json"
         if not file_path.exists():
             return None
         
-        with open(file_path, 'r', encoding='utf-8') as f:
+        with metrics.STORAGE_DURATION.time(op='load_result'), open(file_path, 'r', encoding='utf-8') as f:
             return json.load(f)
     
     def list_results_by_exam(self, exam_id: str) -> List[Dict]:
         """List all results for an exam"""
         results = []
-        for file_path in self.results_dir.glob(f"{exam_id}_*.json"):
-            with open(file_path, 'r', encoding='utf-8') as f:
-                results.append(json.load(f))
+        with metrics.STORAGE_DURATION.time(op='list_results'):
+            for file_path in self.results_dir.glob(f"{exam_id}_*.json"):
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    results.append(json.load(f))
         
         # Sort by processed_at descending
         results.sort(key=lambda x: x.get('processed_at', ''), reverse=True)
         return results
     
+    def update_results(self, results: List[Dict]):
+        """
+        Overwrite many results. All files are written to temp files first and
+        only then renamed into place, so a failure midway leaves every
+        result at its previous version.
+        """
+        pending = []
+        try:
+            for result in results:
+                file_path = self.results_dir / f"{result['result_id']}.json"
+                pending.append((self._write_temp(file_path, result), file_path))
+        except Exception:
+            for tmp_path, _ in pending:
+                os.unlink(tmp_path)
+            raise
+        
+        for tmp_path, file_path in pending:
+            os.replace(tmp_path, file_path)
+    
     def delete_result(self, result_id: str) -> bool:
         """Delete a result"""
         file_path = self.results_dir / f"{result_id}.json"
         if file_path.exists():
             file_path.unlink()
+            sidecar = self.results_dir / f"{result_id}.npy"
+            if sidecar.exists():
+                sidecar.unlink()
             return True
         return False
     
+    # ============ INTENSITY MATRICES ============
+    
+    def save_intensities(self, result_id: str, intensities: np.ndarray):
+        """Save (questions x 5) uint8 bubble intensity matrix as .npy sidecar"""
+        file_path = self.results_dir / f"{result_id}.npy"
+        np.save(file_path, np.asarray(intensities, dtype=np.uint8), allow_pickle=False)
+    
+    def load_intensities(self, result_id: str) -> Optional[np.ndarray]:
+        """Load intensity matrix for a result (None for results stored before sidecars)"""
+        file_path = self.results_dir / f"{result_id}.npy"
+        if not file_path.exists():
+            return None
+        return np.load(file_path, allow_pickle=False)
+    
     # ============ STATISTICS ============
     
     def get_exam_statistics(self, exam_id: str) -> Dict:
@@ -0,0 +1,392 @@
+# Template Registry - sheet layouts by template ID
+#
+# Each exam references a template (ExamCreate.template_id, None = "default").
+# A template lives in config.TEMPLATES_DIR as <template_id>.template.json:
+#
+#   {
+#     "name": "LJK SMP 60 soal",
+#     "roi_file": "roi_config.json",       (or an inline "roi": {x1, y1, x2, y2})
+#     "questions": 60,
+#     "filled_threshold": null,            (null = config.FILLED_THRESHOLD)
+#     "reference": "ljk_smp1_blank.png"    (blank scan at grading DPI, optional)
+#   }
+#
+# Without default.template.json the plain roi_config.json is the "default"
+# template, as before. Templates are loaded on first use and cached; a cheap
+# stat() per lookup reloads them when a file changes, so edits need no
+# restart. Features derived from the reference scan (bubble grid, layout
+# fingerprint) are computed once per template version and persisted under
+# .cache/, so every grading process loads them instead of recomputing.
+#
+# identify() matches the fingerprint of an incoming page against every
+# template with a reference scan (~1 ms), routing mixed-layout batches to
+# the right grid and rejecting unknown layouts before bubble detection.
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+import config
+from quality import SheetRejected
+
+logger = logging.getLogger("ljk.templates")
+
+DEFAULT_TEMPLATE_ID = "default"
+TEMPLATE_SUFFIX = ".template.json"
+LEGACY_ROI_FILE = "roi_config.json"
+CACHE_DIR_NAME = ".cache"
+FEATURES_FORMAT = 3  # Bump when compute_features changes: cached .npz files are keyed by it
+THUMBNAIL_WIDTH = 64  # Layout fingerprint width (px); height keeps the page aspect
+THUMBNAIL_BLUR = 1.0  # Gaussian sigma (thumbnail px): tolerates scan shifts of ~40 px at 200 DPI
+
+# File stat signature: (path, mtime_ns, size) per file a template depends on
+Signature = Tuple[Tuple[str, int, int], ...]
+
+
+class TemplateNotFound(ValueError):
+    """Unknown template ID or template without a usable ROI"""
+
+
+class UnknownLayout(SheetRejected):
+    """Page matches none of the registered templates"""
+
+    def __init__(self, message: str, scores: Dict[str, float]):
+        super().__init__('unknown_layout', message, {'scores': scores})
+        self.scores = scores
+
+
+class Template:
+    """One sheet layout: ROI, expected grid, threshold and alignment features"""
+
+    def __init__(self, template_id: str, definition: Dict, roi: Dict, base_dir: Path, version: str):
+        self.template_id = template_id
+        self.name = definition.get('name') or template_id
+        self.roi = roi
+        self.questions = definition.get('questions')
+        self.filled_threshold = definition.get('filled_threshold')
+        self.version = version
+        reference = definition.get('reference')
+        self.reference_path = base_dir / reference if reference else None
+        self._cache_dir = base_dir / CACHE_DIR_NAME
+        self._features = None
+        self._features_lock = threading.Lock()
+
+    @property
+    def features(self) -> Optional[Dict[str, np.ndarray]]:
+        """
+        Precomputed reference features (lazy, shared on disk):
+            grid       (rows x 5 x 4) int32 bubble boxes x, y, w, h in question order
+            thumbnail  (h x THUMBNAIL_WIDTH) float32 layout fingerprint (alignment_thumbnail)
+            page_size  (2,) int32 reference width, height
+
+        None when the template has no reference scan.
+        """
+        if self._features is None and self.reference_path is not None:
+            with self._features_lock:
+                if self._features is None:
+                    self._features = self._load_features()
+        return self._features
+
+    @property
+    def bubble_count(self) -> Optional[int]:
+        """Bubbles expected on a sheet (from the reference grid)"""
+        features = self.features
+        if features is None:
+            return None
+        return int((features['grid'][:, :, 2] > 0).sum())
+
+    def summary(self) -> Dict:
+        return {
+            'template_id': self.template_id,
+            'name': self.name,
+            'version': self.version,
+            'questions': self.questions,
+            'filled_threshold': self.filled_threshold,
+            'roi': self.roi,
+            'has_reference': self.reference_path is not None,
+        }
+
+    def _features_path(self) -> Path:
+        return self._cache_dir / f"{self.template_id}-{self.version[:16]}-f{FEATURES_FORMAT}.npz"
+
+    def _load_features(self) -> Optional[Dict[str, np.ndarray]]:
+        cache_path = self._features_path()
+        if cache_path.exists():
+            try:
+                with np.load(cache_path) as data:
+                    return {key: data[key] for key in data.files}
+            except (OSError, ValueError) as e:
+                logger.warning("Ignoring unreadable template cache %s: %s", cache_path, e)
+
+        features = compute_features(self.reference_path, self.roi)
+        if features is None:
+            return None
+
+        # Atomic write: concurrent workers may compute the same file
+        self._cache_dir.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self._cache_dir, suffix=".npz")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, **features)
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            logger.warning("Cannot persist template features %s: %s", cache_path, e)
+            Path(tmp_path).unlink(missing_ok=True)
+        logger.info(
+            "Template %s features computed: %d rows",
+            self.template_id, len(features['grid']),
+            extra={'template_id': self.template_id, 'template_version': self.version}
+        )
+        return features
+
+
+def compute_features(reference_path: Path, roi: Dict) -> Optional[Dict[str, np.ndarray]]:
+    """Bubble grid and alignment thumbnail of a blank reference scan"""
+    # Imported here: column_parallel / core pull in the detection stack
+    from column_parallel import detect_bubbles_parallel
+    from core.ljk_manual_roi import organize_bubbles_into_columns
+
+    gray = cv2.imread(str(reference_path), cv2.IMREAD_GRAYSCALE)
+    if gray is None:
+        logger.warning("Cannot read template reference: %s", reference_path)
+        return None
+
+    bubbles = detect_bubbles_parallel(cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR), roi)[0]
+    grid = []
+    for col_rows in organize_bubbles_into_columns(bubbles):
+        for row in col_rows:
+            if len(row) < 4 or len(grid) >= config.MAX_QUESTIONS:
+                continue
+            boxes = [[b['x'], b['y'], b['w'], b['h']] for b in row[:5]]
+            boxes += [[0, 0, 0, 0]] * (5 - len(boxes))
+            grid.append(boxes)
+
+    return {
+        'grid': np.asarray(grid, dtype=np.int32).reshape(-1, 5, 4),
+        'thumbnail': alignment_thumbnail(gray),
+        'page_size': np.asarray(gray.shape[::-1], dtype=np.int32),
+    }
+
+
+def alignment_thumbnail(image: np.ndarray, width: int = THUMBNAIL_WIDTH) -> np.ndarray:
+    """
+    Layout fingerprint: page downscaled to `width`, blurred and normalized
+    to zero mean / unit variance. Accepts BGR or grayscale; a 200 DPI page
+    takes ~2 ms: pixels are strided down to ~4 per thumbnail pixel before
+    the area resize (the blur absorbs the aliasing), and the color
+    conversion runs on the small image.
+    """
+    h, w = image.shape[:2]
+    step = max(1, w // (width * 4))
+    small = cv2.resize(image[::step, ::step], (width, max(1, round(h * width / w))), interpolation=cv2.INTER_AREA)
+    if small.ndim == 3:
+        small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    small = cv2.GaussianBlur(small.astype(np.float32), (0, 0), THUMBNAIL_BLUR)
+    small -= small.mean()
+    std = small.std()
+    return small / std if std > 0 else small
+
+
+def match_score(thumbnail: np.ndarray, reference: np.ndarray) -> float:
+    """Normalized cross-correlation of two fingerprints (1 = same layout, ~0 = unrelated)"""
+    if thumbnail.shape != reference.shape:
+        # Different page aspect: compare on the reference grid
+        thumbnail = cv2.resize(thumbnail, (reference.shape[1], reference.shape[0]), interpolation=cv2.INTER_AREA)
+        thumbnail = thumbnail - thumbnail.mean()
+        std = thumbnail.std()
+        if std > 0:
+            thumbnail = thumbnail / std
+    return float((thumbnail * reference).mean())
+
+
+def unknown_layout(best: Template, best_score: float, scores: Dict[str, float]) -> UnknownLayout:
+    return UnknownLayout(
+        f"Sheet layout not recognized (best match {best.template_id}: {best_score:.2f})",
+        {k: round(v, 3) for k, v in scores.items()}
+    )
+
+
+def log_routing(best: Template, best_score: float, preferred: Optional[Template], scores: Dict[str, float]):
+    if preferred is not None and best is not preferred:
+        logger.info(
+            "Page routed to template %s (%.2f) instead of %s (%.2f)",
+            best.template_id, best_score, preferred.template_id, scores.get(preferred.template_id, 0.0)
+        )
+
+
+def _read_json(path: Path) -> Dict:
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+class TemplateRegistry:
+    """Template ID -> Template, loaded lazily and reloaded when files change"""
+
+    def __init__(self, templates_dir: Optional[Path] = None):
+        self.templates_dir = Path(templates_dir or config.TEMPLATES_DIR)
+        self._cache: Dict[str, Tuple[Signature, Template]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, template_id: Optional[str] = None) -> Template:
+        """Template by ID (None = default); raises TemplateNotFound"""
+        template_id = template_id or DEFAULT_TEMPLATE_ID
+
+        # Hot path: only stat() the files the cached template was built from
+        cached = self._cache.get(template_id)
+        if cached and self._signature([Path(entry[0]) for entry in cached[0]]) == cached[0]:
+            return cached[1]
+
+        with self._lock:
+            files = self._files(template_id)
+            if files is None:
+                self._cache.pop(template_id, None)
+                raise TemplateNotFound(f"Template not found: {template_id}")
+            signature = self._signature(files)
+            cached = self._cache.get(template_id)
+            if cached and cached[0] == signature:
+                return cached[1]
+            template = self._load(template_id, files)
+            self._cache[template_id] = (signature, template)
+            if cached:
+                logger.info("Template %s reloaded (version %s)", template_id, template.version[:12])
+            return template
+
+    def find(self, template_id: Optional[str] = None) -> Optional[Template]:
+        """Like get(), but None for an unknown or broken template"""
+        try:
+            return self.get(template_id)
+        except TemplateNotFound:
+            return None
+
+    def exists(self, template_id: Optional[str]) -> bool:
+        return self._files(template_id or DEFAULT_TEMPLATE_ID) is not None
+
+    def list(self) -> List[Dict]:
+        """Summaries of every loadable template"""
+        ids = {p.name[:-len(TEMPLATE_SUFFIX)] for p in self.templates_dir.glob(f"*{TEMPLATE_SUFFIX}")}
+        if (self.templates_dir / LEGACY_ROI_FILE).exists():
+            ids.add(DEFAULT_TEMPLATE_ID)
+        summaries = []
+        for template_id in sorted(ids):
+            template = self.find(template_id)
+            if template:
+                summaries.append(template.summary())
+        return summaries
+
+    def candidates(self, preferred: Optional[Template] = None) -> List[Template]:
+        """
+        Templates that take part in identification: those with a reference
+        scan. Empty when the preferred template has none (it is used as is).
+        """
+        if preferred is not None and preferred.reference_path is None:
+            return []
+        candidates = [t for t in (self.find(s['template_id']) for s in self.list()) if t and t.features]
+        if preferred is not None and preferred.features and preferred.template_id not in {
+            t.template_id for t in candidates
+        }:
+            candidates.append(preferred)
+        return candidates
+
+    @staticmethod
+    def match(
+        thumbnail: np.ndarray,
+        candidates: List[Template],
+        preferred: Optional[Template] = None
+    ) -> Tuple[Template, float, Dict[str, float]]:
+        """Best candidate for a page fingerprint: (template, score, all scores)"""
+        scores = {t.template_id: match_score(thumbnail, t.features['thumbnail']) for t in candidates}
+        # Ties go to the exam's own template
+        best = max(candidates, key=lambda t: (scores[t.template_id], preferred is not None and t is preferred))
+        return best, scores[best.template_id], scores
+
+    def identify(self, image: np.ndarray, preferred: Optional[Template] = None) -> Tuple[Template, Optional[float]]:
+        """
+        Route a decoded page to the best matching template.
+
+        A preferred template without a reference scan (or no referenced
+        templates at all) is used as is, with score None. Raises
+        UnknownLayout when no template scores config.TEMPLATE_MATCH_MIN,
+        before any bubble detection runs.
+        """
+        candidates = self.candidates(preferred)
+        if not candidates:
+            if preferred is None:
+                raise TemplateNotFound("No template configured")
+            return preferred, None
+
+        best, best_score, scores = self.match(alignment_thumbnail(image), candidates, preferred)
+        if best_score < config.TEMPLATE_MATCH_MIN:
+            raise unknown_layout(best, best_score, scores)
+        log_routing(best, best_score, preferred, scores)
+        return best, best_score
+
+    def _definition_path(self, template_id: str) -> Path:
+        # Path(...).name: IDs come from the API, keep them inside templates_dir
+        return self.templates_dir / f"{Path(template_id).name}{TEMPLATE_SUFFIX}"
+
+    def _files(self, template_id: str) -> Optional[List[Path]]:
+        """Files the template depends on (definition first), None if undefined"""
+        definition_path = self._definition_path(template_id)
+        if definition_path.exists():
+            try:
+                definition = _read_json(definition_path)
+            except (OSError, ValueError):
+                return [definition_path]
+            files = [definition_path]
+            for key in ('roi_file', 'reference'):
+                if definition.get(key):
+                    files.append(self.templates_dir / definition[key])
+            return files
+        if template_id == DEFAULT_TEMPLATE_ID and (self.templates_dir / LEGACY_ROI_FILE).exists():
+            # The missing definition stays in the signature: adding it reloads
+            return [self.templates_dir / LEGACY_ROI_FILE, definition_path]
+        return None
+
+    @staticmethod
+    def _signature(files: List[Path]) -> Signature:
+        signature = []
+        for path in files:
+            try:
+                st = path.stat()
+                signature.append((str(path), st.st_mtime_ns, st.st_size))
+            except OSError:
+                signature.append((str(path), 0, -1))
+        return tuple(signature)
+
+    def _load(self, template_id: str, files: List[Path]) -> Template:
+        definition_path = files[0]
+        try:
+            if definition_path.name == LEGACY_ROI_FILE:
+                definition = {'roi_file': LEGACY_ROI_FILE}
+            else:
+                definition = _read_json(definition_path)
+            roi = definition.get('roi')
+            if roi is None and definition.get('roi_file'):
+                roi = _read_json(self.templates_dir / definition['roi_file'])
+        except (OSError, ValueError) as e:
+            raise TemplateNotFound(f"Template {template_id} cannot be loaded: {e}")
+
+        if not roi or not all(k in roi for k in ('x1', 'y1', 'x2', 'y2')):
+            raise TemplateNotFound(f"Template {template_id} has no ROI (x1, y1, x2, y2)")
+        roi = {'width': roi['x2'] - roi['x1'], 'height': roi['y2'] - roi['y1'], **roi}
+
+        # Content hash of every file: the version changes only on a real edit
+        digest = hashlib.sha256()
+        for path in files:
+            if path.exists():
+                digest.update(path.read_bytes())
+        template = Template(template_id, definition, roi, self.templates_dir, digest.hexdigest())
+        logger.info(
+            "Template %s loaded: x1=%d, y1=%d, x2=%d, y2=%d",
+            template_id, roi['x1'], roi['y1'], roi['x2'], roi['y2'],
+            extra={'template_id': template_id, 'template_version': template.version}
+        )
+        return template
@@ -0,0 +1,76 @@
+"""
+In-process exam cache - compiled answer keys and stat() revalidation
+
+Run from backend/:
+    python -m pytest -q tests
+"""
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from exam_cache import ExamCache
+from regrade import key_version
+from storage import StorageService
+
+QUESTIONS = 5
+
+
+@pytest.fixture
+def storage(tmp_path):
+    storage = StorageService()
+    storage.exams_dir = tmp_path / "exams"
+    storage.results_dir = tmp_path / "results"
+    storage.exams_dir.mkdir()
+    storage.results_dir.mkdir()
+    return storage
+
+
+@pytest.fixture
+def exam_id(storage):
+    return storage.save_exam({
+        'title': 'Cache', 'active_questions': QUESTIONS,
+        'answer_key': {str(q): q for q in range(QUESTIONS)},
+    })
+
+
+def test_get_compiles_and_reuses(storage, exam_id):
+    cache = ExamCache(storage)
+
+    compiled = cache.get(exam_id)
+
+    assert compiled.key_vec.tolist() == [0, 1, 2, 3, 4]
+    assert not compiled.key_vec.flags.writeable
+    assert compiled.key_letters() == ['A', 'B', 'C', 'D', 'E']
+    assert compiled.key_version == key_version(storage.load_exam(exam_id))
+    assert cache.get(exam_id) is compiled
+
+
+def test_rewritten_exam_file_reloads(storage, exam_id):
+    cache = ExamCache(storage)
+    old = cache.get(exam_id)
+
+    # Written by another process: no invalidate() call, only the file changes
+    exam = storage.load_exam(exam_id)
+    exam['answer_key'] = {'0': 4, '2': 1}
+    storage.update_exam(exam_id, exam)
+    new = cache.get(exam_id)
+
+    assert new is not old
+    assert new.key_vec.tolist() == [4, -1, 1, -1, -1]
+    assert new.key_letters() == ['E', '?', 'B', '?', '?']
+    assert new.key_version == key_version(exam) != old.key_version
+
+
+def test_invalidate_and_delete(storage, exam_id):
+    cache = ExamCache(storage)
+    first = cache.get(exam_id)
+
+    cache.invalidate(exam_id)
+    assert cache.get(exam_id) is not first
+
+    storage.delete_exam(exam_id)
+    assert cache.get(exam_id) is None
+    assert cache.get("exam_missing") is None
@@ -0,0 +1,85 @@
+"""
+Excel export of exam results
+
+Run from backend/:
+    python -m pytest -q tests
+"""
+import sys
+from pathlib import Path
+
+import pytest
+from openpyxl import load_workbook
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import config
+from export_service import ExportService
+from storage import StorageService
+
+QUESTIONS = 5
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'EXPORTS_DIR', tmp_path / "exports")
+    storage = StorageService()
+    storage.exams_dir = tmp_path / "exams"
+    storage.results_dir = tmp_path / "results"
+    storage.exams_dir.mkdir()
+    storage.results_dir.mkdir()
+    return storage
+
+
+def save_sheet(storage, exam_id, answers, **fields):
+    """Store a result with the given answers (question index -> choice)"""
+    return storage.save_result({
+        'exam_id': exam_id,
+        'answers': {str(q): a for q, a in answers.items()},
+        'unanswered': [q for q in range(QUESTIONS) if q not in answers],
+        'score': {'correct': 0, 'wrong': 0, 'unanswered': 0, 'percentage': 0.0},
+        **fields,
+    })
+
+
+def test_export_unnamed_batch_results(storage):
+    exam_id = storage.save_exam({
+        'title': 'Batch', 'active_questions': QUESTIONS,
+        'answer_key': {str(q): 0 for q in range(QUESTIONS)},
+    })
+    # As stored by the batch paths: the name key is present but None
+    save_sheet(storage, exam_id, {0: 0}, student_name=None, student_number=None,
+               source_file='kelas-9a.pdf', source_page=2)
+    save_sheet(storage, exam_id, {1: 1}, student_name=None, student_number=None)
+
+    wb = load_workbook(ExportService(storage).export_to_excel(exam_id))
+
+    rows = list(wb["Nilai Siswa"].iter_rows(min_row=2, max_col=3, values_only=True))
+    names = {name for _, name, _ in rows}
+    assert names == {'kelas-9a.pdf hlm. 2', f"Siswa {next(no for no, name, _ in rows if name.startswith('Siswa'))}"}
+    assert {number for _, _, number in rows} == {'N/A'}
+    headers = [c.value for c in wb["Detail Per Soal"][1]][2:]
+    assert sorted(headers) == sorted(name[:15] for name in names)
+
+
+def test_export_details_key_letters_and_answers(storage):
+    # Question 4 has no key
+    exam_id = storage.save_exam({
+        'title': 'Details', 'active_questions': QUESTIONS,
+        'answer_key': {'0': 0, '1': 1, '2': 2, '3': 3},
+    })
+    save_sheet(storage, exam_id, {0: 0, 1: 2, 4: 4}, student_name='Ani Lestari', student_number='0012')
+    save_sheet(storage, exam_id, {0: 1, 2: 2, 3: 3}, student_name=None, source_file='scan.tif', source_page=1)
+
+    ws = load_workbook(ExportService(storage).export_to_excel(exam_id))["Detail Per Soal"]
+
+    assert [ws.cell(row=q + 2, column=2).value for q in range(QUESTIONS)] == ['A', 'B', 'C', 'D', '?']
+    columns = {ws.cell(row=1, column=col).value: col for col in (3, 4)}
+    assert set(columns) == {'Ani Lestari', 'scan.tif hlm. 1'}
+
+    def answers(name):
+        cells = [ws.cell(row=q + 2, column=columns[name]) for q in range(QUESTIONS)]
+        return [(c.value, c.fill.start_color.rgb[-6:] if c.fill.fill_type else None) for c in cells]
+
+    green, red = 'C6EFCE', 'FFC7CE'
+    assert answers('Ani Lestari') == [('A', green), ('C', red), ('-', None), ('-', None), ('E', red)]
+    assert answers('scan.tif hlm. 1') == [('B', red), ('-', None), ('C', green), ('D', green), ('-', None)]
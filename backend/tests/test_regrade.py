@@ -0,0 +1,100 @@
+"""
+Regression tests - bulk regrade of results with intensity sidecars
+
+Run from backend/:
+    python -m pytest -q tests
+"""
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from grading import answer_matrix, decide_answers, stack_matrices
+from regrade import regrade_exam
+from scoring import score_matrix
+from storage import StorageService
+
+QUESTIONS = 60
+EMPTY, FILLED = 205, 100
+
+
+def sheet(answers, rows=QUESTIONS):
+    """(rows, 5) uint8 intensity matrix with the given bubbles filled (-1 = blank)"""
+    matrix = np.full((rows, 5), EMPTY, dtype=np.uint8)
+    for q, ans in enumerate(answers[:rows]):
+        if ans >= 0:
+            matrix[q, ans] = FILLED
+    return matrix
+
+
+@pytest.fixture
+def storage(tmp_path):
+    storage = StorageService()
+    storage.exams_dir = tmp_path / "exams"
+    storage.results_dir = tmp_path / "results"
+    storage.exams_dir.mkdir()
+    storage.results_dir.mkdir()
+    return storage
+
+
+def test_answer_matrix_per_sheet_thresholds():
+    rng = np.random.default_rng(0)
+    matrices = [sheet(rng.integers(-1, 5, QUESTIONS).tolist(), rows) for rows in (60, 58, 60)]
+    matrices[1][3] = EMPTY
+    matrices[1][3, 2] = 160  # Light mark: filled at 170, blank at 150
+    thresholds = [150, 170, 150]
+
+    stacked, rows_read = stack_matrices(matrices)
+    answers, read_mask = answer_matrix(stacked, rows_read, thresholds, QUESTIONS)
+
+    assert answers.shape == read_mask.shape == (3, QUESTIONS)
+    for i, (matrix, threshold) in enumerate(zip(matrices, thresholds)):
+        expected = decide_answers(matrix, threshold)
+        assert answers[i, :len(expected)].tolist() == expected.tolist()
+        assert read_mask[i].sum() == len(matrix)
+    assert answers[1, 3] == 2
+
+
+def test_score_matrix_unread_questions():
+    key = np.array([0, 1, 2, 3], dtype=np.int8)
+    answers = np.array([[0, 2, -1, -1]], dtype=np.int8)
+    read_mask = np.array([[True, True, True, False]])  # Row of question 4 not detected
+
+    scored = score_matrix(answers, read_mask, key, {'correct': 4, 'wrong': -1, 'unanswered': 0.5})
+
+    assert scored['points'][0].tolist() == [4.0, -1.0, 0.5, 0.0]
+    assert scored['unanswered'][0] == 1
+    assert scored['total_points'][0] == 4 - 1 + 0.5 * scored['unanswered'][0]
+
+
+def test_regrade_exam_with_sidecars(storage):
+    key = [q % 5 for q in range(QUESTIONS)]
+    exam_id = storage.save_exam({
+        'title': 'Regrade', 'active_questions': QUESTIONS,
+        'answer_key': {str(q): k for q, k in enumerate(key)},
+    })
+    # Two sheets with sidecars (different thresholds), one stored before sidecars
+    sheets = [(key, 150), ([(k + 1) % 5 for k in key], 170)]
+    for answers, threshold in sheets:
+        storage.save_result(
+            {'exam_id': exam_id, 'answers': {}, 'unanswered': [], 'filled_threshold': threshold},
+            intensities=sheet(answers)
+        )
+    storage.save_result({
+        'exam_id': exam_id,
+        'answers': {str(q): k for q, k in enumerate(key)},
+        'unanswered': [],
+    })
+
+    exam = storage.load_exam(exam_id)
+    exam['answer_key'] = {str(q): (k + 1) % 5 for q, k in enumerate(key)}
+    storage.update_exam(exam_id, exam)
+
+    summary = regrade_exam(storage, exam_id)
+
+    assert summary['regraded'] == 3
+    correct = sorted(r['score']['correct'] for r in storage.list_results_by_exam(exam_id))
+    assert correct == [0, 0, QUESTIONS]
@@ -0,0 +1,322 @@
+# Upload Service - streaming ingestion of LJK scans
+#
+# The upload is copied in chunks into a temp file next to its final
+# location: the size limit aborts the copy as soon as it is exceeded, the
+# SHA-256 is computed on the way (no second read), and the magic bytes of
+# the first chunk reject non-images before anything is decoded. The temp
+# file is moved into place with os.replace, so a half-written upload is
+# never visible under its final name.
+#
+# Resumable uploads (large class PDFs over flaky Wi-Fi): the client
+# creates an upload with the file's size (and optionally SHA-256), PUTs
+# chunks at byte offsets and finalizes it. Chunks are appended to one
+# file on disk whose length is the resume offset, so an interrupted
+# upload - or a server restart - continues where it stopped.
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, Optional
+
+import config
+
+CHUNK_SIZE = 1024 * 1024
+FORM_OVERHEAD = 64 * 1024  # Multipart boundaries + form fields on top of the file
+SNIFF_BYTES = 1024  # "%PDF-" may follow a few junk bytes
+
+# Sniffed content kind -> file extensions it may arrive with
+KIND_EXTENSIONS = {
+    'jpeg': {'.jpg', '.jpeg'},
+    'png': {'.png'},
+    'pdf': {'.pdf'},
+    'tiff': {'.tif', '.tiff'},
+}
+
+
+class UploadError(ValueError):
+    """Rejected upload; status_code / reason (+ details) for the API response"""
+    status_code = 400
+
+    def __init__(self, reason: str, message: str, details: Optional[Dict] = None):
+        super().__init__(message)
+        self.reason = reason
+        self.details = details or {}
+
+
+class UploadTooLarge(UploadError):
+    status_code = 413
+
+
+class UploadNotFound(UploadError):
+    status_code = 404
+
+
+class UploadConflict(UploadError):
+    """Chunk does not start at the stored offset; details carry the offset to resume from"""
+    status_code = 409
+
+
+class StoredUpload:
+    """Upload moved into place: path, content kind, size and SHA-256"""
+
+    def __init__(self, path: Path, kind: str, size: int, sha256: str):
+        self.path = path
+        self.kind = kind
+        self.size = size
+        self.sha256 = sha256
+
+
+def sniff_kind(head: bytes) -> Optional[str]:
+    """Content kind from the leading bytes, None if not an allowed format"""
+    if head.startswith(b'\xff\xd8\xff'):
+        return 'jpeg'
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'png'
+    if head.startswith((b'II*\x00', b'MM\x00*')):
+        return 'tiff'
+    if b'%PDF-' in head[:SNIFF_BYTES]:
+        return 'pdf'
+    return None
+
+
+def safe_filename(filename: str) -> str:
+    """Client file name without any directory part"""
+    return Path(filename.replace('\\', '/')).name or "upload"
+
+
+def too_large(max_size: Optional[int] = None) -> UploadTooLarge:
+    max_size = config.MAX_UPLOAD_SIZE if max_size is None else max_size
+    return UploadTooLarge('too_large', f"File exceeds the {max_size / (1024 * 1024):.3g}MB upload limit")
+
+
+async def save_upload(
+    file,
+    dest_dir: Path,
+    name: str,
+    max_size: Optional[int] = None
+) -> StoredUpload:
+    """
+    Stream an UploadFile to dest_dir/name.
+
+    Raises UploadTooLarge past max_size (default config.MAX_UPLOAD_SIZE)
+    and UploadError when the content is empty, not a JPEG/PNG/PDF/TIFF or does
+    not match the file extension. Nothing is left on disk on failure.
+    """
+    max_size = config.MAX_UPLOAD_SIZE if max_size is None else max_size
+    extension = Path(name).suffix.lower()
+
+    # Size known from the parsed form: reject without copying
+    if getattr(file, 'size', None) and file.size > max_size:
+        raise too_large(max_size)
+
+    dest_dir = Path(dest_dir)
+    digest = hashlib.sha256()
+    size = 0
+    head = b''
+    kind = None
+
+    fd, tmp_name = tempfile.mkstemp(dir=dest_dir, prefix=".upload_", suffix=".part")
+    tmp_path = Path(tmp_name)
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            while True:
+                chunk = await file.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_size:
+                    raise too_large(max_size)
+
+                if kind is None and len(head) < SNIFF_BYTES:
+                    head += chunk[:SNIFF_BYTES - len(head)]
+                    kind = sniff_kind(head)
+                    if kind is None and (len(head) >= SNIFF_BYTES or len(chunk) < CHUNK_SIZE):
+                        raise UploadError('unsupported_content', "File is not a JPEG, PNG, PDF or TIFF")
+
+                digest.update(chunk)
+                out.write(chunk)
+
+        if size == 0:
+            raise UploadError('empty', "Empty file")
+        if kind is None:
+            raise UploadError('unsupported_content', "File is not a JPEG, PNG, PDF or TIFF")
+        if extension not in KIND_EXTENSIONS[kind]:
+            raise UploadError('extension_mismatch', f"File content is {kind.upper()}, not {extension}")
+
+        final_path = dest_dir / name
+        os.replace(tmp_path, final_path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+    return StoredUpload(final_path, kind, size, digest.hexdigest())
+
+
+class ResumableUploads:
+    """Resumable upload sessions under config.RESUMABLE_DIR/<upload_id>/"""
+
+    META_FILE = "meta.json"
+    DATA_FILE = "data.part"
+
+    def __init__(self, root: Optional[Path] = None):
+        self.root = Path(root or config.RESUMABLE_DIR)
+        self._writing = set()  # Upload IDs with a chunk in flight (this process)
+
+    def _dir(self, upload_id: str) -> Path:
+        session_dir = self.root / Path(upload_id).name
+        if not (session_dir / self.META_FILE).exists():
+            raise UploadNotFound('unknown_upload', "Upload not found or expired")
+        return session_dir
+
+    def _meta(self, session_dir: Path) -> Dict:
+        with open(session_dir / self.META_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def create(self, filename: str, size: int, sha256: Optional[str] = None) -> Dict:
+        filename = safe_filename(filename)
+        extension = Path(filename).suffix.lower()
+        if extension not in config.ALLOWED_EXTENSIONS:
+            raise UploadError('unsupported_content', f"Invalid file type. Allowed: {sorted(config.ALLOWED_EXTENSIONS)}")
+        if size <= 0:
+            raise UploadError('empty', "Empty file")
+        if size > config.MAX_RESUMABLE_SIZE:
+            raise too_large(config.MAX_RESUMABLE_SIZE)
+
+        upload_id = uuid.uuid4().hex
+        session_dir = self.root / upload_id
+        session_dir.mkdir(parents=True)
+        (session_dir / self.DATA_FILE).touch()
+        meta = {
+            'upload_id': upload_id,
+            'filename': filename,
+            'size': size,
+            'sha256': sha256.lower() if sha256 else None,
+            'created': time.time(),
+        }
+        with open(session_dir / self.META_FILE, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        return self.status(upload_id)
+
+    def status(self, upload_id: str) -> Dict:
+        session_dir = self._dir(upload_id)
+        meta = self._meta(session_dir)
+        offset = (session_dir / self.DATA_FILE).stat().st_size
+        return {
+            'upload_id': meta['upload_id'],
+            'filename': meta['filename'],
+            'size': meta['size'],
+            'offset': offset,
+            'complete': offset == meta['size'],
+            'chunk_size': config.RESUMABLE_CHUNK_SIZE,
+        }
+
+    async def write_chunk(self, upload_id: str, offset: int, chunks, chunk_sha256: Optional[str] = None) -> Dict:
+        """
+        Append a chunk (async iterable of bytes) at `offset`.
+
+        Raises UploadConflict unless offset is the current length. With
+        chunk_sha256 the chunk is verified and rolled back on mismatch or
+        disconnect; without it, bytes received before a disconnect are
+        kept and the client resumes after them.
+        """
+        session_dir = self._dir(upload_id)
+        meta = self._meta(session_dir)
+        data_path = session_dir / self.DATA_FILE
+        if upload_id in self._writing:
+            raise UploadConflict(
+                'chunk_in_progress', "Another chunk of this upload is being written",
+                {'offset': data_path.stat().st_size}
+            )
+        self._writing.add(upload_id)
+        try:
+            return await self._append(upload_id, meta, data_path, offset, chunks, chunk_sha256)
+        finally:
+            self._writing.discard(upload_id)
+
+    async def _append(self, upload_id: str, meta: Dict, data_path: Path, offset: int, chunks,
+                      chunk_sha256: Optional[str]) -> Dict:
+        with open(data_path, 'r+b') as out:
+            current = out.seek(0, os.SEEK_END)
+            if offset != current:
+                raise UploadConflict(
+                    'offset_mismatch', f"Upload is at byte {current}, not {offset}", {'offset': current}
+                )
+            digest = hashlib.sha256()
+            written = 0
+            try:
+                async for piece in chunks:
+                    if offset + written + len(piece) > meta['size']:
+                        raise UploadError('size_mismatch', f"Chunk runs past the declared size of {meta['size']} bytes")
+                    out.write(piece)
+                    digest.update(piece)
+                    written += len(piece)
+                if chunk_sha256 and digest.hexdigest() != chunk_sha256.lower():
+                    raise UploadError('checksum_mismatch', "Chunk SHA-256 does not match its content")
+            except BaseException as e:
+                if chunk_sha256 or isinstance(e, UploadError):
+                    out.truncate(offset)
+                raise
+        return self.status(upload_id)
+
+    def finalize(self, upload_id: str, dest_dir: Path, name: str) -> StoredUpload:
+        """
+        Verify a complete upload (size, content kind, extension, SHA-256
+        if declared) and move it to dest_dir/name; the session is removed.
+        """
+        session_dir = self._dir(upload_id)
+        meta = self._meta(session_dir)
+        data_path = session_dir / self.DATA_FILE
+        size = data_path.stat().st_size
+        if size != meta['size']:
+            raise UploadConflict(
+                'incomplete', f"Upload has {size} of {meta['size']} bytes", {'offset': size}
+            )
+
+        digest = hashlib.sha256()
+        with open(data_path, 'rb') as f:
+            head = f.read(SNIFF_BYTES)
+            digest.update(head)
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+        kind = sniff_kind(head)
+        extension = Path(meta['filename']).suffix.lower()
+        try:
+            if kind is None:
+                raise UploadError('unsupported_content', "File is not a JPEG, PNG, PDF or TIFF")
+            if extension not in KIND_EXTENSIONS[kind]:
+                raise UploadError('extension_mismatch', f"File content is {kind.upper()}, not {extension}")
+            if meta['sha256'] and digest.hexdigest() != meta['sha256']:
+                raise UploadError('checksum_mismatch', "File SHA-256 does not match the declared hash")
+        except UploadError:
+            self.discard(upload_id)
+            raise
+
+        final_path = Path(dest_dir) / name
+        os.replace(data_path, final_path)
+        self.discard(upload_id)
+        return StoredUpload(final_path, kind, size, digest.hexdigest())
+
+    def discard(self, upload_id: str):
+        shutil.rmtree(self.root / Path(upload_id).name, ignore_errors=True)
+
+    def expire(self, max_age: Optional[float] = None, dry_run: bool = False) -> int:
+        """Remove sessions not written to for max_age seconds (default config.RESUMABLE_TTL)"""
+        max_age = config.RESUMABLE_TTL if max_age is None else max_age
+        cutoff = time.time() - max_age
+        removed = 0
+        for session_dir in self.root.glob("*"):
+            data_path = session_dir / self.DATA_FILE
+            try:
+                last_write = data_path.stat().st_mtime if data_path.exists() else session_dir.stat().st_mtime
+            except OSError:
+                continue
+            if last_write < cutoff:
+                if not dry_run:
+                    shutil.rmtree(session_dir, ignore_errors=True)
+                removed += 1
+        return removed
@@ -0,0 +1,265 @@
+"""
+Watch folder - grade scans dropped into scanner hot folders
+
+The scanning station writes into a shared folder; every subfolder holds
+the sheets of one exam. The subfolder is named after the exam ID, or
+mapped to one in a folders.json at the root ({"9A Matematika": "<exam_id>"}).
+
+    <watch dir>/
+        folders.json            optional folder name -> exam ID
+        9A Matematika/
+            kelas-9a.pdf        graded once it stops growing
+            done/kelas-9a.pdf   + kelas-9a.pdf.json (one line per page)
+            failed/rusak.pdf    + rusak.pdf.json (reason)
+
+A file is graded once its size and mtime have not changed for
+config.WATCH_SETTLE seconds (scanners and SMB copies write in pieces).
+Every page goes through batch_grading - the same engine as the batch
+upload endpoint - with at most config.WATCH_CONCURRENCY files graded at
+once; the rest wait in the folder. Folders are rescanned every
+config.WATCH_POLL_INTERVAL seconds. With the optional watchdog package,
+inotify events trigger a rescan at once; the poll still runs, as inotify
+does not see files written by other hosts on network mounts.
+
+Usage:
+    python watch_folder.py /srv/scans
+    LJK_WATCH_DIRS=/srv/scans python watch_folder.py
+"""
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:
+    Observer = None
+
+import config
+import metrics
+import uploads
+import batch_grading
+from batch_grading import BatchGrader
+from logging_config import setup_logging
+
+logger = logging.getLogger("ljk.watch")
+
+MAPPING_FILE = "folders.json"
+DONE_DIR = "done"
+FAILED_DIR = "failed"
+IGNORED_PREFIXES = ('.', '~')  # Hidden and in-progress files (e.g. ".scan.pdf.part", "~$x")
+
+
+class _Wake(FileSystemEventHandler if Observer else object):
+    """watchdog handler: any change in a watched tree triggers a rescan"""
+
+    def __init__(self, event: threading.Event):
+        self.event = event
+
+    def on_any_event(self, event):
+        self.event.set()
+
+
+class WatchFolders:
+    """Poll (and optionally inotify-watch) hot folders, grading settled files"""
+
+    def __init__(
+        self,
+        roots: Sequence[Path],
+        grader: Optional[BatchGrader] = None,
+        settle: Optional[float] = None,
+        poll_interval: Optional[float] = None,
+        concurrency: Optional[int] = None
+    ):
+        self.roots = [Path(root) for root in roots]
+        self.grader = grader or BatchGrader()
+        self.settle = config.WATCH_SETTLE if settle is None else settle
+        self.poll_interval = config.WATCH_POLL_INTERVAL if poll_interval is None else poll_interval
+        self.concurrency = concurrency or config.WATCH_CONCURRENCY
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="ljk-watch")
+        self._in_flight: Dict[Path, Future] = {}
+        self._seen: Dict[Path, Tuple[int, int, float]] = {}  # path -> (size, mtime_ns, unchanged since)
+        self._warned = set()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+
+    def folder_exams(self, root: Path) -> Dict[Path, str]:
+        """Exam subfolders of a watch root -> exam ID"""
+        mapping = {}
+        mapping_file = root / MAPPING_FILE
+        if mapping_file.exists():
+            try:
+                with open(mapping_file, 'r', encoding='utf-8') as f:
+                    mapping = json.load(f)
+            except (OSError, ValueError) as e:
+                self._warn_once(mapping_file, "Ignoring unreadable %s: %s", mapping_file, e)
+        return {
+            folder: mapping.get(folder.name, folder.name)
+            for folder in root.iterdir()
+            if folder.is_dir() and not folder.name.startswith(IGNORED_PREFIXES)
+        }
+
+    def _warn_once(self, key, message: str, *args):
+        if key not in self._warned:
+            self._warned.add(key)
+            logger.warning(message, *args)
+
+    def _settled(self, path: Path, now: float) -> bool:
+        """True once the file has kept its size and mtime for self.settle seconds"""
+        try:
+            st = path.stat()
+        except OSError:
+            self._seen.pop(path, None)
+            return False
+        previous = self._seen.get(path)
+        if previous is None or previous[:2] != (st.st_size, st.st_mtime_ns):
+            self._seen[path] = (st.st_size, st.st_mtime_ns, now)
+            return False
+        return st.st_size > 0 and now - previous[2] >= self.settle
+
+    def scan(self) -> int:
+        """Submit every settled file (up to the concurrency limit); returns files submitted"""
+        for path, future in list(self._in_flight.items()):
+            if future.done():
+                del self._in_flight[path]
+                if future.exception() is not None:
+                    logger.error("Watch folder: could not file away %s: %s", path, future.exception())
+        now = time.monotonic()
+        submitted = 0
+        present = set()
+        for root in self.roots:
+            if not root.is_dir():
+                self._warn_once(root, "Watch folder does not exist: %s", root)
+                continue
+            for folder, exam_id in self.folder_exams(root).items():
+                if self.grader.exams.get(exam_id) is None:
+                    # Files stay put until the exam is created (or the folder mapped)
+                    self._warn_once(folder, "Watch folder %s: no exam %s", folder, exam_id)
+                    continue
+                self._warned.discard(folder)
+                for path in sorted(folder.iterdir()):
+                    if not path.is_file() or path.name.startswith(IGNORED_PREFIXES):
+                        continue
+                    if path.suffix.lower() not in config.ALLOWED_EXTENSIONS:
+                        self._warn_once(path, "Ignoring %s: not a JPG, PNG, PDF or TIFF", path)
+                        continue
+                    present.add(path)
+                    if path in self._in_flight or not self._settled(path, now):
+                        continue
+                    if len(self._in_flight) >= self.concurrency:
+                        continue
+                    self._in_flight[path] = self._executor.submit(self.process, path, exam_id)
+                    submitted += 1
+        # Forget files that were moved or deleted by someone else
+        for path in set(self._seen) - present:
+            del self._seen[path]
+        return submitted
+
+    def process(self, path: Path, exam_id: str) -> Dict:
+        """Grade one file and move it to done/ or failed/ with a JSON report"""
+        report = {'file': path.name, 'exam_id': exam_id, 'started_at': datetime.now().isoformat()}
+        start = time.perf_counter()
+        try:
+            report.update(self._grade(path, exam_id))
+        except Exception as e:
+            logger.exception("Watch folder: %s failed", path)
+            report.update({'reason': getattr(e, 'reason', 'error'), 'message': str(e)})
+        report['duration_ms'] = round((time.perf_counter() - start) * 1000, 1)
+
+        outcome = DONE_DIR if report.get(batch_grading.GRADED) else FAILED_DIR
+        metrics.WATCH_FILES.inc(outcome=outcome)
+        target = self._move(path, path.parent / outcome)
+        with open(target.with_name(target.name + ".json"), 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        logger.info(
+            "Watch folder: %s -> %s (%d graded, %d rejected, %d failed)",
+            path, outcome, report.get(batch_grading.GRADED, 0), report.get(batch_grading.REJECTED, 0),
+            report.get(batch_grading.FAILED, 0), extra={'exam_id': exam_id, 'duration_ms': report['duration_ms']}
+        )
+        return report
+
+    def _grade(self, path: Path, exam_id: str) -> Dict:
+        try:
+            compiled, template = self.grader.exam_and_template(exam_id)
+        except LookupError as e:
+            return {'reason': 'exam_not_found', 'message': str(e)}
+
+        with open(path, 'rb') as f:
+            kind = uploads.sniff_kind(f.read(uploads.SNIFF_BYTES))
+        if kind is None or path.suffix.lower() not in uploads.KIND_EXTENSIONS[kind]:
+            return {'reason': 'unsupported_content', 'message': "Content does not match the file extension"}
+
+        counts = {batch_grading.GRADED: 0, batch_grading.REJECTED: 0, batch_grading.FAILED: 0}
+        pages = []
+        for line in self.grader.grade_file(exam_id, compiled, template, path, source_file=path.name):
+            counts[batch_grading.outcome(line)] += 1
+            pages.append({key: line[key] for key in ('page', 'success', 'result_id', 'reason', 'message') if key in line})
+        return {**counts, 'pages': pages}
+
+    @staticmethod
+    def _move(path: Path, directory: Path) -> Path:
+        """Move into directory without overwriting an earlier file of the same name"""
+        directory.mkdir(exist_ok=True)
+        target = directory / path.name
+        if target.exists():
+            target = directory / f"{path.stem}-{datetime.now():%Y%m%d%H%M%S%f}{path.suffix}"
+        os.replace(path, target)
+        return target
+
+    def run(self):
+        """Watch until stop() is called"""
+        observer = None
+        if Observer is not None:
+            observer = Observer()
+            for root in self.roots:
+                if root.is_dir():
+                    observer.schedule(_Wake(self._wake), str(root), recursive=True)
+            observer.start()
+        logger.info(
+            "Watching %s (%s, every %ss, %d at once)", ", ".join(map(str, self.roots)),
+            "inotify + polling" if observer else "polling", self.poll_interval, self.concurrency
+        )
+        try:
+            while not self._stop.is_set():
+                self.scan()
+                # Files waiting to settle are re-checked sooner than the poll interval
+                timeout = min(self.poll_interval, self.settle) if self._seen else self.poll_interval
+                self._wake.wait(timeout)
+                self._wake.clear()
+        finally:
+            if observer is not None:
+                observer.stop()
+                observer.join()
+            self._executor.shutdown(wait=True)
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Grade scans dropped into watched folders")
+    parser.add_argument("dirs", nargs="*", type=Path, help="Watch folders (default: LJK_WATCH_DIRS)")
+    parser.add_argument("--concurrency", type=int, help="Files graded at once (default: config)")
+    args = parser.parse_args()
+
+    roots: List[Path] = args.dirs or config.WATCH_DIRS
+    if not roots:
+        parser.error("no watch folders given (arguments or LJK_WATCH_DIRS)")
+    setup_logging()
+    watcher = WatchFolders(roots, concurrency=args.concurrency)
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        watcher.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -21,6 +21,7 @@ export default function FileUploader({
     'image/jpeg': ['.jpg', '.jpeg'],
     'image/png': ['.png'],
     'application/pdf': ['.pdf'],
+    'image/tiff': ['.tif', '.tiff'],
   },
 }: FileUploaderProps) {
   const [files, setFiles] = useState<FileWithPreview[]>([]);
@@ -78,7 +79,7 @@ export default function FileUploader({
               atau klik untuk browse
             </p>
             <p className="text-xs text-gray-400">
-              Format: JPG, PNG, PDF • Max: 10MB per file • Batch: hingga {maxFiles} file
+              Format: JPG, PNG, PDF, TIFF • Max: 10MB per file • Batch: hingga {maxFiles} file
             </p>
           </>
         )}